@@ -0,0 +1,89 @@
+"""
+Synthetic data for the benchmarks: contact books and note corpora of any
+size, from a thousand entries to millions.
+
+The data is deterministic, so every run and every machine measures the
+same books and notes. Contact i is named contact_name(i) and has the phone
+contact_phone(i), which lets benchmarks look contacts up without keeping
+the generated records around.
+
+Usage:
+    python benchmarks/generators.py DIRECTORY [number_of_contacts] [number_of_notes]
+writes contact_book.snap and notes.json into DIRECTORY.
+"""
+
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from contact_book import AddressBook, Record  # noqa: E402
+
+WORDS = (
+    "meeting project budget report client deadline review design release plan "
+    "invoice travel doctor gym family birthday shopping garden car repair "
+    "python course homework exam book movie music concert recipe dinner "
+    "holiday flight hotel visa bank tax insurance rent contract call email"
+).split()
+TAGS = [f"tag{i}" for i in range(200)]
+SEED = 2024
+
+
+def contact_name(i):
+    return f"Contact{i}"
+
+
+def contact_phone(i):
+    return f"050{i:07d}"
+
+
+def generate_records(count):
+    for i in range(count):
+        yield Record(
+            contact_name(i),
+            [contact_phone(i)],
+            f"{i % 28 + 1:02d}.{i % 12 + 1:02d}.19{i % 100:02d}",
+            f"user{i}@example.com",
+            f"Kyiv, Street {i}",
+        )
+
+
+def build_book(count):
+    book = AddressBook()
+    book.add_addresses(generate_records(count))
+    return book
+
+
+def generate_notes(count, seed=SEED):
+    """Yield note dicts as stored in notes.json; tag popularity is skewed like real use."""
+    rng = random.Random(seed)
+    # Zipf-like weights: the first tags are used far more often than the last
+    weights = [1 / (rank + 1) for rank in range(len(TAGS))]
+    for i in range(count):
+        yield {
+            "title": f"Note {i}",
+            "content": " ".join(rng.choices(WORDS, k=12)),
+            "tags": rng.choices(TAGS, weights, k=rng.randint(0, 3)),
+        }
+
+
+def write_notes(filename, count):
+    with open(filename, "w") as f:
+        json.dump(list(generate_notes(count)), f)
+
+
+def write_book(filename, count):
+    # A snapshot, or a pickle for a .pkl file name
+    build_book(count).save_data(filename)
+
+
+if __name__ == "__main__":
+    directory = sys.argv[1]
+    contacts = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    notes = int(sys.argv[3]) if len(sys.argv) > 3 else contacts
+    os.makedirs(directory, exist_ok=True)
+    write_book(os.path.join(directory, "contact_book.snap"), contacts)
+    write_notes(os.path.join(directory, "notes.json"), notes)
+    print(f"{contacts} contacts and {notes} notes written to {directory}")
@@ -0,0 +1,28 @@
+"""
+Memory benchmark: bytes allocated per contact in an AddressBook.
+
+Usage:
+    python benchmarks/memory.py [number_of_contacts]
+"""
+
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generators import build_book  # noqa: E402
+
+
+def bytes_per_contact(count):
+    tracemalloc.start()
+    book = build_book(count)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del book
+    return current / count
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print(f"{count} contacts: {bytes_per_contact(count):.0f} bytes per contact")
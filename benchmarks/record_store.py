@@ -0,0 +1,61 @@
+"""
+Record store benchmark: time to open a large contact book and answer the
+first lookups, compared with loading the same book from a pickle file.
+
+Usage:
+    python benchmarks/record_store.py [number_of_contacts]
+"""
+
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from contact_book import AddressBook  # noqa: E402
+from record_store import RecordStore, LazyAddressBook, write_store  # noqa: E402
+from generators import contact_name, contact_phone, generate_records  # noqa: E402
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def run(count, directory):
+    store_file = os.path.join(directory, "contact_book.rec")
+    pickle_file = os.path.join(directory, "contact_book.pkl")
+    _, write_time = timed(lambda: write_store(store_file, generate_records(count)))
+
+    book, open_time = timed(lambda: LazyAddressBook(RecordStore(store_file)))
+    _, name_time = timed(lambda: book.find_address(contact_name(count // 2)))
+    _, phone_time = timed(lambda: book.find_address(contact_phone(count // 3)))
+    book.close()
+
+    results = {
+        "write store": write_time,
+        "open store": open_time,
+        "first lookup by name": name_time,
+        "first lookup by phone": phone_time,
+    }
+    if count <= 200_000:
+        # The pickle is loaded whole, so keep it to sizes that fit in memory
+        full = AddressBook()
+        full.add_addresses(generate_records(count))
+        with open(pickle_file, "wb") as f:
+            pickle.dump(full, f)
+        del full
+        results["load pickle"] = timed(lambda: pickle.load(open(pickle_file, "rb")))[1]
+    return results
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as directory:
+        results = run(count, directory)
+    print(f"{count} contacts:")
+    for name, seconds in results.items():
+        print(f"{name:24} {seconds * 1000:10.2f} ms")
@@ -0,0 +1,115 @@
+"""
+JSON-RPC API benchmark: contact lookups per second over one keep-alive
+connection, one request at a time, pipelined, and as batches.
+
+The server runs in a background thread of this process, over a generated
+in-memory book, so no data files are touched.
+
+Usage:
+    python benchmarks/rpc.py [number_of_contacts] [number_of_lookups]
+"""
+
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generators import build_book, contact_name  # noqa: E402
+from rpc_server import Api, serve_http  # noqa: E402
+
+BATCH_SIZE = 100
+
+
+def start_server(book):
+    started = threading.Event()
+    address = []
+
+    def ready(server):
+        address.append(server.sockets[0].getsockname()[:2])
+        started.set()
+
+    api = Api(book, notes=lambda: None)
+    thread = threading.Thread(
+        target=asyncio.run, args=(serve_http(api, "127.0.0.1", 0, ready),), daemon=True
+    )
+    thread.start()
+    started.wait()
+    return address[0]
+
+
+def http_request(payload):
+    body = json.dumps(payload).encode()
+    return (
+        f"POST /rpc HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n"
+    ).encode() + body
+
+
+def read_responses(connection, count):
+    # Reads `count` HTTP responses and returns their decoded bodies
+    reader = connection.makefile("rb")
+    bodies = []
+    for _ in range(count):
+        length = 0
+        while True:
+            line = reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode().partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        bodies.append(json.loads(reader.read(length)))
+    return bodies
+
+
+def lookup(i, contacts):
+    return {"jsonrpc": "2.0", "method": "contacts.find", "params": [contact_name(i % contacts)], "id": i}
+
+
+def run(contacts, lookups):
+    address = start_server(build_book(contacts))
+    results = {}
+
+    with socket.create_connection(address) as connection:
+        start = time.perf_counter()
+        for i in range(lookups):
+            connection.sendall(http_request(lookup(i, contacts)))
+            read_responses(connection, 1)
+        results["sequential"] = time.perf_counter() - start
+
+    with socket.create_connection(address) as connection:
+        start = time.perf_counter()
+        sender = threading.Thread(
+            target=lambda: connection.sendall(
+                b"".join(http_request(lookup(i, contacts)) for i in range(lookups))
+            )
+        )
+        sender.start()
+        responses = read_responses(connection, lookups)
+        sender.join()
+        results["pipelined"] = time.perf_counter() - start
+        assert all(response["result"] for response in responses)
+
+    with socket.create_connection(address) as connection:
+        start = time.perf_counter()
+        batches = range(0, lookups, BATCH_SIZE)
+        for first in batches:
+            batch = [lookup(i, contacts) for i in range(first, min(first + BATCH_SIZE, lookups))]
+            connection.sendall(http_request(batch))
+            read_responses(connection, 1)
+        results[f"batches of {BATCH_SIZE}"] = time.perf_counter() - start
+    return results
+
+
+if __name__ == "__main__":
+    contacts = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 20_000
+    results = run(contacts, lookups)
+    print(f"{lookups} lookups in a book of {contacts} contacts:")
+    for name, seconds in results.items():
+        print(f"{name:16} {lookups / seconds:10.0f} lookups/s")
@@ -0,0 +1,68 @@
+"""
+Startup benchmark: time to import helper and to reach the first prompt with
+large data files in the working directory.
+
+Every measurement runs in a fresh interpreter, so nothing is cached between
+runs. The data files are generated once in a temporary directory.
+
+Usage:
+    python benchmarks/startup.py [number_of_contacts] [number_of_notes] [runs]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generators import write_book, write_notes  # noqa: E402
+
+# Runs in the child process; prints the two timings in seconds
+PROBE = """
+import time
+start = time.perf_counter()
+import helper
+imported = time.perf_counter()
+helper.start_session()
+ready = time.perf_counter()
+print(imported - start, ready - start, file=STDERR)
+"""
+
+
+def write_data(directory, contacts, notes):
+    write_book(os.path.join(directory, "contact_book.snap"), contacts)
+    write_notes(os.path.join(directory, "notes.json"), notes)
+
+
+def measure(directory):
+    # The welcome text goes to stdout, the timings to stderr
+    probe = "import os\nimport sys\nSTDERR = sys.__stderr__\nsys.stderr = open(os.devnull, 'w')\n" + PROBE
+    result = subprocess.run(
+        [sys.executable, "-c", probe],
+        cwd=directory,
+        env=dict(os.environ, PYTHONPATH=SRC),
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    imported, ready = result.stderr.split()
+    return float(imported), float(ready)
+
+
+if __name__ == "__main__":
+    contacts = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    notes = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    runs = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    with tempfile.TemporaryDirectory() as directory:
+        write_data(directory, contacts, notes)
+        timings = [measure(directory) for _ in range(runs)]
+
+    print(f"{contacts} contacts, {notes} notes, best of {runs} runs:")
+    print(f"import helper: {min(t[0] for t in timings) * 1000:8.1f} ms")
+    print(f"first prompt:  {min(t[1] for t in timings) * 1000:8.1f} ms")
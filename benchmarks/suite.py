@@ -0,0 +1,469 @@
+"""
+Benchmark suite for the hot paths of the contact book and the notes, with a
+stored JSON baseline so performance regressions show up in review.
+
+Every benchmark runs against synthetic data from generators.py at each of
+the requested sizes. A benchmark is timed in rounds of at least MIN_TIME
+seconds and the best round is kept, reported as time per operation.
+
+Without --save the results are compared with the baseline and every change
+larger than the threshold is listed; the exit status is 1 if anything got
+slower, so the suite can gate a CI job. Baselines are machine specific:
+record one on the machine that compares against it.
+
+Usage:
+    python benchmarks/suite.py [--sizes 1000,10000,100000] [--only NAME]
+                               [--baseline FILE] [--save] [--output FILE]
+                               [--threshold 0.25]
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC)
+
+import helper  # noqa: E402
+import validators  # noqa: E402
+from birthday import Birthday  # noqa: E402
+from notes_manager import NotesManager  # noqa: E402
+from storage import Storage  # noqa: E402
+from contact_journal import ContactJournal  # noqa: E402
+from contact_book import record_fields  # noqa: E402
+from sharded_store import ShardedAddressBook, write_shards  # noqa: E402
+from generators import build_book, contact_name, contact_phone, write_notes  # noqa: E402
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+DEFAULT_THRESHOLD = 0.25  # relative change reported as a regression or a speed-up
+MIN_TIME = 0.1  # seconds per timing round
+ROUNDS = 3
+LOOKUPS = 1000  # queries per lookup round
+# Birthdays are counted from a fixed day, so every run sees the same window
+TODAY = datetime.date(2024, 6, 1)
+# Key used for benchmarks that do not depend on the data size
+ANY_SIZE = "any"
+
+BENCHMARKS = {}
+
+
+def benchmark(name, sized=True):
+    """
+    Register a benchmark. The decorated function gets the Fixture and returns
+    (function, operations): one call of `function` performs `operations`
+    operations of the measured kind.
+    """
+
+    def register(setup):
+        BENCHMARKS[name] = (setup, sized)
+        return setup
+
+    return register
+
+
+class Fixture:
+    """Synthetic book and notes of one size, built on first use."""
+
+    def __init__(self, size, directory):
+        self.size = size
+        self.directory = directory
+        self._book = None
+        self._notes = None
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    @property
+    def book(self):
+        if self._book is None:
+            self._book = build_book(self.size)
+            self._book.filename = self.path("contact_book.pkl")
+        return self._book
+
+    @property
+    def notes(self):
+        if self._notes is None:
+            write_notes(self.path("notes.json"), self.size)
+            self._notes = NotesManager(self.path("notes.json"), self.path("notes.journal"))
+        return self._notes
+
+    def sample(self, count=LOOKUPS):
+        # Spread over the whole book rather than its first entries
+        return [i * 7919 % self.size for i in range(count)]
+
+
+@benchmark("find_address by name")
+def find_by_name(fixture):
+    book = fixture.book
+    names = [contact_name(i) for i in fixture.sample()]
+    return lambda: [book.find_address(name) for name in names], len(names)
+
+
+@benchmark("find_address by phone")
+def find_by_phone(fixture):
+    book = fixture.book
+    phones = [contact_phone(i) for i in fixture.sample()]
+    return lambda: [book.find_address(phone) for phone in phones], len(phones)
+
+
+@benchmark("find_address by email")
+def find_by_email(fixture):
+    book = fixture.book
+    book.find_email("warm@up")  # builds the email index
+    emails = [f"User{i}@Example.com" for i in fixture.sample()]
+    return lambda: [book.find_address(email) for email in emails], len(emails)
+
+
+@benchmark("find_similar")
+def find_similar(fixture):
+    book = fixture.book
+    book.find_similar("warm up")  # builds the trigram index
+    # Typos in names, emails and addresses
+    queries = [
+        f"Contcat{fixture.size // 3}",
+        f"user{fixture.size // 5}@exmple",
+        f"Stret {fixture.size // 7}",
+    ]
+    return lambda: [book.find_similar(query) for query in queries], len(queries)
+
+
+@benchmark("build fuzzy index")
+def build_fuzzy_index(fixture):
+    book = fixture.book
+
+    def build():
+        book.fuzzy_index = None
+        book.find_similar("warm up")
+
+    return build, 1
+
+
+@benchmark("complete_names")
+def complete_names(fixture):
+    book = fixture.book
+    book.complete_names("")  # builds the prefix index
+    # One query per keystroke of a name, from the first letter to the last
+    name = contact_name(fixture.size // 2)
+    prefixes = [name[:i] for i in range(1, len(name) + 1)]
+    return lambda: [book.complete_names(prefix) for prefix in prefixes], len(prefixes)
+
+
+@benchmark("change_name")
+def change_name(fixture):
+    # Renames back and forth, so the book is the same after every call.
+    # change_name saves the book, which is part of what is measured.
+    book = fixture.book
+    name = contact_name(fixture.size // 2)
+
+    def rename():
+        book.change_name(name, "Renamed Contact")
+        book.change_name("Renamed Contact", name)
+
+    return rename, 2
+
+
+@benchmark("get_upcoming_birthdays")
+def upcoming_birthdays(fixture):
+    book = fixture.book
+    return lambda: Birthday.get_upcoming_birthdays(book, 7, TODAY), 1
+
+
+@benchmark("find_notes_by_tag")
+def find_notes_by_tag(fixture):
+    notes = fixture.notes
+    # A frequent, a medium and a rare tag
+    tags = ["tag0", "tag20", "tag199"]
+    return lambda: [notes.find_notes_by_tag(tag) for tag in tags], len(tags)
+
+
+@benchmark("sort_notes_by_tag")
+def sort_notes_by_tag(fixture):
+    return fixture.notes.sort_notes_by_tag, 1
+
+
+@benchmark("save contact book (pickle)")
+def save_book(fixture):
+    book = fixture.book
+
+    def save():
+        book.dirty = True
+        book.save_data()
+
+    return save, 1
+
+
+@benchmark("load contact book (pickle)")
+def load_book(fixture):
+    filename = fixture.path("contact_book.pkl")
+    fixture.book.dirty = True
+    fixture.book.save_data(filename)
+    return lambda: helper.load_data(filename), 1
+
+
+@benchmark("save contact book (snapshot)")
+def save_snapshot(fixture):
+    book = fixture.book
+    filename = fixture.path("contact_book.snap")
+
+    def save():
+        book.dirty = True
+        book.save_data(filename)
+
+    return save, 1
+
+
+@benchmark("load contact book (snapshot)")
+def load_snapshot(fixture):
+    filename = fixture.path("contact_book.snap")
+    fixture.book.dirty = True
+    fixture.book.save_data(filename)
+    return lambda: helper.load_data(filename), 1
+
+
+@benchmark("save one change (journal)")
+def save_journal(fixture):
+    # What the autosaver writes after a command that changed one contact
+    record = fixture.book.find_address(contact_name(fixture.size // 2))
+    journal = ContactJournal(fixture.path("contact_book.journal"), fixture.path("contact_book.snap"))
+
+    def save():
+        journal.log(record.name.value, record)
+        journal.flush()
+
+    return save, 1
+
+
+@benchmark("save one change (16 shards)")
+def save_shard(fixture):
+    # A sharded book writes back only the shard of the changed contact
+    directory = fixture.path("contact_book.shards")
+    write_shards(directory, map(record_fields, fixture.book.data.values()), 16)
+    book = ShardedAddressBook(directory)
+    record = book.find_address(contact_name(fixture.size // 2))
+
+    def save():
+        book.record_changed(record)
+        book.save_data()
+
+    return save, 1
+
+
+@benchmark("find_address on a cold sharded book")
+def find_sharded(fixture):
+    # Opening the book and looking up one name loads a single shard
+    directory = fixture.path("contact_book.shards")
+    write_shards(directory, map(record_fields, fixture.book.data.values()), 16)
+    name = contact_name(fixture.size // 2)
+    return lambda: ShardedAddressBook(directory).find_address(name), 1
+
+
+@benchmark("save notes (JSON)")
+def save_notes(fixture):
+    notes = fixture.notes.notes
+    filename = fixture.path("notes.saved.json")
+    return lambda: Storage.save_notes(notes, filename), 1
+
+
+@benchmark("load notes (JSON)")
+def load_notes(fixture):
+    filename = fixture.path("notes.json")
+    fixture.notes  # writes the file
+    return lambda: Storage.load_notes(filename), 1
+
+
+@benchmark("normalize_phone (cold)", sized=False)
+def normalize_phone_cold(fixture):
+    numbers = [contact_phone(i) for i in range(LOOKUPS)]
+
+    def normalize():
+        validators.parse_phone.cache_clear()
+        for number in numbers:
+            validators.normalize_phone(number)
+
+    return normalize, len(numbers)
+
+
+@benchmark("normalize_phone (cached)", sized=False)
+def normalize_phone_cached(fixture):
+    numbers = [contact_phone(i) for i in range(LOOKUPS)]
+    return lambda: [validators.normalize_phone(number) for number in numbers], len(numbers)
+
+
+@benchmark("normalize_phones (batch)", sized=False)
+def normalize_phones_batch(fixture):
+    numbers = [contact_phone(i) for i in range(LOOKUPS)]
+
+    def normalize():
+        validators.parse_phone.cache_clear()
+        validators.normalize_phones(numbers)
+
+    return normalize, len(numbers)
+
+
+@benchmark("is_valid_email", sized=False)
+def is_valid_email(fixture):
+    return lambda: validators.is_valid_email("user.name@example.com"), 1
+
+
+@benchmark("is_valid_birthday", sized=False)
+def is_valid_birthday(fixture):
+    return lambda: validators.is_valid_birthday("29.02.2000"), 1
+
+
+def measure(function, operations, min_time=MIN_TIME, rounds=ROUNDS):
+    """Return the best time per operation, in seconds, over `rounds` rounds."""
+    best = None
+    for _ in range(rounds):
+        calls = 0
+        start = time.perf_counter()
+        while True:
+            function()
+            calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        per_operation = elapsed / (calls * operations)
+        if best is None or per_operation < best:
+            best = per_operation
+    return best
+
+
+def run(sizes, names=None, progress=None):
+    """Run the benchmarks; returns {benchmark name: {size: seconds per operation}}."""
+    names = [name for name in BENCHMARKS if not names or name in names]
+    results = {name: {} for name in names}
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            fixture = Fixture(size, os.path.join(directory, str(size)))
+            os.makedirs(fixture.directory)
+            for name in names:
+                setup, sized = BENCHMARKS[name]
+                key = str(size) if sized else ANY_SIZE
+                if key in results[name]:
+                    continue
+                # The commands print their results; only their cost matters here
+                with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+                    function, operations = setup(fixture)
+                    results[name][key] = measure(function, operations)
+                if progress:
+                    progress(name, key, results[name][key])
+            if fixture._notes is not None:
+                fixture._notes.close()
+    return results
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def load_baseline(filename):
+    try:
+        with open(filename, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_results(results, filename):
+    with open(filename, "w") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2)
+        f.write("\n")
+
+
+def format_time(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("µs", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def compare(baseline, results, threshold=DEFAULT_THRESHOLD):
+    """
+    Return rows (name, size, baseline, current, ratio, verdict) for every
+    measurement present in both; verdict is "slower", "faster" or "".
+    """
+    rows = []
+    for name, sizes in results.items():
+        for size, current in sizes.items():
+            previous = baseline.get(name, {}).get(size)
+            if previous is None:
+                rows.append((name, size, None, current, None, "new"))
+                continue
+            ratio = current / previous
+            if ratio > 1 + threshold:
+                verdict = "slower"
+            elif ratio < 1 / (1 + threshold):
+                verdict = "faster"
+            else:
+                verdict = ""
+            rows.append((name, size, previous, current, ratio, verdict))
+    return rows
+
+
+def print_report(rows):
+    print(f"{'benchmark':30} {'size':>8} {'baseline':>11} {'current':>11} {'change':>8}")
+    for name, size, previous, current, ratio, verdict in rows:
+        previous = format_time(previous) if previous is not None else "-"
+        change = f"{(ratio - 1) * 100:+.0f}%" if ratio is not None else "-"
+        print(f"{name:30} {size:>8} {previous:>11} {format_time(current):>11} {change:>8}  {verdict}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths.")
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(size) for size in DEFAULT_SIZES),
+        help="comma separated numbers of contacts and notes",
+    )
+    parser.add_argument("--only", action="append", help="run only this benchmark (repeatable)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline JSON file")
+    parser.add_argument("--save", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    options = parser.parse_args(argv)
+
+    unknown = [name for name in options.only or () if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark {unknown[0]!r}; choose from {', '.join(BENCHMARKS)}")
+    sizes = [int(size) for size in options.sizes.split(",")]
+
+    def progress(name, size, seconds):
+        print(f"{name:30} {size:>8} {format_time(seconds):>11}", file=sys.stderr)
+
+    results = run(sizes, options.only, progress)
+    if options.output:
+        save_results(results, options.output)
+    if options.save:
+        # Merged, so a run with --only updates just its own entries
+        baseline = load_baseline(options.baseline)
+        merged = baseline["results"] if baseline else {}
+        for name, sizes in results.items():
+            merged.setdefault(name, {}).update(sizes)
+        save_results(merged, options.baseline)
+        print(f"Baseline saved to {options.baseline}")
+        return 0
+
+    baseline = load_baseline(options.baseline)
+    if baseline is None:
+        print(f"No baseline in {options.baseline}; run with --save to record one.")
+        return 0
+    rows = compare(baseline["results"], results, options.threshold)
+    print_report(rows)
+    return 1 if any(row[5] == "slower" for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+"""
+This module contains the assistant server, a long-running process that keeps
+one AddressBook and one NotesManager in memory and serves commands to many
+CLI clients over a Unix domain socket, and the Client used to talk to it.
+
+The data files are loaded once, commands run one at a time against the warm
+indexes, and the autosaver writes the changes of every client, so clients
+no longer overwrite each other's data when they exit.
+
+Protocol: one JSON object per line in each direction.
+    request   {"command": "add_contact", "args": ["Ann", "0501234567"], "answers": []}
+    response  {"status": "ok" | "error", "output": "..."}
+              {"status": "input", "prompt": "..."}
+Completion requests carry "complete" (the kind of value: contact, note or
+tag) and "prefix" instead of a command, and get {"status": "ok",
+"candidates": [...]}.
+A command that needs more input (e.g. add_note without arguments) gets
+status "input" with the question; the client asks the user and sends the
+same request again with the answer appended to "answers". Commands ask
+before they change anything, so the server never waits for a user.
+
+With --http PORT the same process also serves the JSON-RPC API from
+rpc_server.py, sharing the book, the notes and the autosaver.
+
+With --idle-timeout SECONDS the server saves and exits once no client has
+been connected for that long. Servers started by a client use IDLE_TIMEOUT,
+so they do not outlive their clients indefinitely.
+
+Usage:
+    python assistant_server.py [--socket PATH] [--http PORT] [--stats FILE]
+                               [--idle-timeout SECONDS]
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+import helper
+from colorizer import Colorizer
+from persistence import Autosaver
+
+# The socket lives next to the data files it serves
+SOCKET_FILE = os.environ.get("ASSISTANT_SOCKET", "assistant.sock")
+LOG_FILE = "assistant.log"
+# Seconds a client waits for a server it started to accept connections
+START_TIMEOUT = 10.0
+# Seconds without clients after which a server started by a client exits
+IDLE_TIMEOUT = float(os.environ.get("ASSISTANT_IDLE_TIMEOUT", "900"))
+
+
+def answers_from(answers):
+    answers = list(answers)
+
+    def ask(prompt):
+        if not answers:
+            raise helper.NeedsInput(prompt)
+        return answers.pop(0)
+
+    return ask
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.server.client_connected(1)
+
+    def finish(self):
+        try:
+            super().finish()
+        finally:
+            self.server.client_connected(-1)
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.server.execute(json.loads(line))
+            except (ValueError, KeyError, TypeError) as e:
+                response = {"status": "error", "output": f"Bad request: {e}\n"}
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode() + b"\n")
+
+
+class AssistantServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, book):
+        self.book = book
+        # Its lock also serializes the commands of all clients
+        self.autosaver = Autosaver(lambda: helper.save_all(book))
+        self.clients = 0  # open connections
+        self.last_active = time.monotonic()
+        self._activity = threading.Lock()
+        super().__init__(path, RequestHandler)
+
+    def client_connected(self, change):
+        with self._activity:
+            self.clients += change
+            self.last_active = time.monotonic()
+
+    def touch(self):
+        # Activity that does not come through the socket, e.g. JSON-RPC calls
+        self.client_connected(0)
+        self.autosaver.touch()
+
+    def idle_time(self):
+        with self._activity:
+            return 0.0 if self.clients else time.monotonic() - self.last_active
+
+    def stop_when_idle(self, timeout):
+        def watch():
+            while True:
+                remaining = timeout - self.idle_time()
+                if remaining <= 0:
+                    print(Colorizer.info("No clients, shutting down."), flush=True)
+                    self.shutdown()
+                    return
+                time.sleep(remaining)
+
+        threading.Thread(target=watch, name="idle-shutdown", daemon=True).start()
+
+    def execute(self, request):
+        if "complete" in request:
+            with self.autosaver.lock:
+                candidates = helper.complete_argument(
+                    self.book, request["complete"], str(request.get("prefix", ""))
+                )
+            return {"status": "ok", "candidates": candidates}
+        command = request["command"]
+        if command not in helper.COMMANDS:
+            command = None
+        args = [str(arg) for arg in request.get("args", [])]
+        with self.autosaver.lock:
+            _, status, output = helper.execute(
+                self.book, command, args, answers_from(request.get("answers", []))
+            )
+        self.autosaver.touch()
+        if status == "input":
+            return {"status": status, "prompt": output}
+        return {"status": status, "output": output}
+
+
+class Client:
+    def __init__(self, path=SOCKET_FILE):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.socket.connect(path)
+        except OSError:
+            self.socket.close()
+            raise
+        self.file = self.socket.makefile("rwb")
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+    def _send(self, request):
+        self.file.write(json.dumps(request, ensure_ascii=False).encode() + b"\n")
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("The assistant server closed the connection.")
+        return json.loads(line)
+
+    def request(self, command, args=(), answers=()):
+        return self._send({"command": command, "args": list(args), "answers": list(answers)})
+
+    def complete(self, kind, prefix):
+        """Return the server's completions for an argument of `kind` starting with `prefix`."""
+        return self._send({"complete": kind, "prefix": prefix})["candidates"]
+
+    def run(self, command, args=(), ask=input):
+        """Send a command, asking the user for any input it needs; return the response."""
+        answers = []
+        while True:
+            response = self.request(command, args, answers)
+            if response["status"] != "input":
+                return response
+            answers.append(ask(response["prompt"] + " ").strip())
+
+
+def is_running(path=SOCKET_FILE):
+    if not hasattr(socket, "AF_UNIX"):
+        return False
+    try:
+        Client(path).close()
+    except OSError:
+        return False
+    return True
+
+
+def connect(path=SOCKET_FILE, start=True):
+    """
+    Connect to the assistant server, starting one in the background if none
+    is running and `start` is set. Returns None when there is no server.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    try:
+        return Client(path)
+    except OSError:
+        if not start:
+            return None
+
+    with open(LOG_FILE, "a") as log:
+        subprocess.Popen(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--socket",
+                path,
+                "--idle-timeout",
+                str(IDLE_TIMEOUT),
+            ],
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        try:
+            return Client(path)
+        except OSError:
+            pass
+    return None
+
+
+def _serve_api(server, port):
+    # The API runs its own event loop; calls share the command lock
+    import asyncio
+    from rpc_server import Api, serve_http, DEFAULT_HOST
+
+    api = Api(
+        server.book,
+        helper.get_notes_manager,
+        server.autosaver.lock,
+        server.touch,
+    )
+    thread = threading.Thread(
+        target=asyncio.run,
+        args=(serve_http(api, DEFAULT_HOST, port),),
+        name="json-rpc",
+        daemon=True,
+    )
+    thread.start()
+    print(Colorizer.info(f"JSON-RPC API listening on http://{DEFAULT_HOST}:{port}/"))
+
+
+def serve(path=SOCKET_FILE, http_port=None, stats_file=None, idle_timeout=None):
+    if os.path.exists(path):
+        if is_running(path):
+            print(Colorizer.error(f"Error: An assistant server is already running on {path}."))
+            return 1
+        os.remove(path)  # left behind by a server that crashed
+
+    book = helper.load_data()
+    server = AssistantServer(path, book)
+    server.autosaver.start()
+    if http_port:
+        _serve_api(server, http_port)
+    if idle_timeout:
+        server.stop_when_idle(idle_timeout)
+    # SIGTERM stops the server like Ctrl+C, with a final save
+    signal.signal(
+        signal.SIGTERM,
+        lambda signum, frame: threading.Thread(target=server.shutdown).start(),
+    )
+    print(Colorizer.info(f"Assistant server listening on {path}"), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.remove(path)
+        server.autosaver.stop()
+        with server.autosaver.lock:
+            helper.close_session(book)
+        helper.dump_stats(stats_file)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the contact book and notes.")
+    parser.add_argument("--socket", default=SOCKET_FILE, help="Unix socket path")
+    parser.add_argument("--http", type=int, metavar="PORT", help="also serve the JSON-RPC API")
+    parser.add_argument("--stats", metavar="FILE", help="write latency statistics to FILE on exit")
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        metavar="SECONDS",
+        help="exit once no client has been connected for SECONDS",
+    )
+    options = parser.parse_args()
+    sys.exit(serve(options.socket, options.http, options.stats, options.idle_timeout))
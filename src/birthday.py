@@ -1,25 +1,56 @@
 """
-This module contains the Birthday class, which represents a birthday for a contact.
+This module contains the Birthday class, which represents a birthday for a contact,
+and the BirthdayCalendar class, a day-of-year index used to answer
+"upcoming birthdays" queries without scanning the whole address book.
 """
 
-from datetime import datetime, timedelta
+from bisect import bisect_left, bisect_right
+from calendar import isleap
+from datetime import date, datetime, timedelta
 from field import Field
+from validators import parse_birthday
 from errors import input_error
 from colorizer import Colorizer
 
 
+# Days before each month in a leap year, so 29.02 gets its own slot
+_MONTH_OFFSETS = [0, 31, 60, 91, 121, 152, 182, 213, 244, 274, 305, 335]
+FEB_28 = 59
+FEB_29 = 60
+
+
+def day_of_year(month, day):
+    return _MONTH_OFFSETS[month - 1] + day
+
+
 class Birthday(Field):
+    # The date is kept as a proleptic Gregorian ordinal; value is derived from it
+    __slots__ = ("ordinal",)
+    _derived = ("ordinal",)
+
     def __init__(self, value):
-        self.value = self._validate_birthday(value)
+        self.value = value
+
+    @property
+    def value(self):
+        if self.ordinal is None:
+            return None
+        return date.fromordinal(self.ordinal).strftime("%d.%m.%Y")
+
+    @value.setter
+    def value(self, value):
+        self.ordinal = None if value is None else self._validate_birthday(value)
 
     def _validate_birthday(self, value):
         try:
-            # Check if the date is in the correct format
-            datetime.strptime(value, "%d.%m.%Y")
-            return value  # Return the validated date
+            return parse_birthday(value)
         except ValueError:
             raise ValueError(Colorizer.error("Invalid date format. Use DD.MM.YYYY"))
 
+    def month_day(self):
+        birthday = date.fromordinal(self.ordinal)
+        return birthday.month, birthday.day
+
     @input_error
     @staticmethod
     def add_birthday_to_contact(name, birthday):
@@ -35,8 +66,7 @@ class Birthday(Field):
 
     def change_birthday(self, new_birthday):
         try:
-            validate_birthday = self._validate_birthday(new_birthday)
-            self.value = validate_birthday
+            self.value = new_birthday
             return f"Birthday for {self.name.value} changed to {self.value}."
         except ValueError:
             raise ValueError(Colorizer.error("Invalid date format. Use DD.MM.YYYY"))
@@ -45,25 +75,90 @@ class Birthday(Field):
         self.value = None
 
     @staticmethod
-    def get_upcoming_birthdays(book, days_ahead):
+    def get_upcoming_birthdays(book, days_ahead, today=None):
+        today = today or datetime.now().date()
+        return book.birthday_calendar.upcoming(today, days_ahead)
+
+
+class BirthdayCalendar:
+    """
+    Records sorted by the day of year of their birthday.
+
+    Days are numbered on a leap-year calendar (1..366), so an upcoming
+    birthdays query is a bisect range scan and costs O(log n + results).
+    """
+
+    def __init__(self):
+        self.days = []  # sorted day-of-year keys
+        self.records = []  # records aligned with self.days
+
+    def __len__(self):
+        return len(self.days)
+
+    def add(self, record):
+        if not record.birthday:
+            return
+        key = day_of_year(*record.birthday.month_day())
+        index = bisect_right(self.days, key)
+        self.days.insert(index, key)
+        self.records.insert(index, record)
+
+    def extend(self, records):
+        # Bulk insert: one sort instead of a list insert per record
+        entries = list(zip(self.days, self.records))
+        entries.extend(
+            (day_of_year(*record.birthday.month_day()), record)
+            for record in records
+            if record.birthday
+        )
+        entries.sort(key=lambda entry: entry[0])
+        self.days = [key for key, _ in entries]
+        self.records = [record for _, record in entries]
+
+    def remove(self, record):
+        if not record.birthday:
+            return
+        key = day_of_year(*record.birthday.month_day())
+        for index in range(bisect_left(self.days, key), bisect_right(self.days, key)):
+            if self.records[index] is record:
+                del self.days[index]
+                del self.records[index]
+                return
+
+    def _between(self, low, high):
+        # Records whose birthday falls on a day of year in [low, high]
+        for index in range(bisect_left(self.days, low), bisect_right(self.days, high)):
+            yield self.records[index]
+
+    def upcoming(self, today, days_ahead):
         upcoming_birthdays = []
-        today = datetime.now().date()
+        seen = set()  # names are unique in a book, unlike ids of reloaded records
         target_date = today + timedelta(days=days_ahead)
-        for contact in book.values():
-            if contact.birthday:
-                birthday = datetime.strptime(contact.birthday.value, "%d.%m.%Y").date()
-                birthday_this_year = birthday.replace(year=today.year)
-                # If birthday is in this year
-                if birthday_this_year < today:
-                    birthday_this_year = birthday_this_year.replace(year=today.year + 1)
-                # Check if birthday is upcoming
-                if today <= birthday_this_year <= target_date:
-                    upcoming_birthdays.append(
-                        {
-                            "name": contact.name.value,
-                            "congratulation_date": birthday_this_year.strftime(
-                                "%d.%m.%Y"
-                            ),
-                        }
-                    )
+        # Walk the window one calendar year at a time to handle wrap-around
+        start = today
+        while start <= target_date and len(seen) < len(self):
+            year = start.year
+            end = min(target_date, date(year, 12, 31))
+            low = day_of_year(start.month, start.day)
+            high = day_of_year(end.month, end.day)
+            if not isleap(year):
+                # 29.02 is celebrated on 28.02 in common years
+                if high == FEB_28:
+                    high = FEB_29
+            for record in self._between(low, high):
+                if record.name.value in seen:
+                    continue
+                seen.add(record.name.value)
+                month, day = record.birthday.month_day()
+                if month == 2 and day == 29 and not isleap(year):
+                    day = 28
+                upcoming_birthdays.append(
+                    {
+                        "name": record.name.value,
+                        "congratulation_date": date(year, month, day).strftime(
+                            "%d.%m.%Y"
+                        ),
+                    }
+                )
+            start = date(year + 1, 1, 1)
         return upcoming_birthdays
@@ -1,11 +1,14 @@
-from prettytable import PrettyTable
+from functools import lru_cache
 from colorizer import Colorizer
+from pagination import new_table
 
-def command_help():
+
+@lru_cache(maxsize=None)
+def render_help():
     """
-    Displays a table of available commands with their usage and description.
+    Builds the table of available commands with their usage and description.
+    The table is rendered the first time help is requested and then reused.
     """
-
     # List of tuples, each containing command details (command, usage, description)
     headers = ["Command", "Usage", "Description"]
     commands_description = [
@@ -34,8 +37,8 @@ def command_help():
         ),
         (
             "add_note",
-            "add-note [title] [content] [tags]",
-            "Create a new note with title, content, and optional tags.",
+            "add-note [title] | [content] | [tags]",
+            "Create a new note with title, content, and optional tags. Without arguments you are asked for each one.",
         ),
         ("change_name", "change-name [name] | [new_value]", "Modify contact name"),
         ("change_phone", "change_phone", "Modify contact's phone"),
@@ -48,8 +51,8 @@ def command_help():
         ("change_address", "change_address", "Modify contact's address"),
         (
             "change_note",
-            "change-note [title] [new_content] [new_tags]",
-            "Edit the content and/or tags of a note.",
+            "change-note [title] | [field] | [new_value]",
+            "Edit the content and/or tags of a note. Without arguments you are asked for each one.",
         ),
         ("del_phone", "del_phone [name] [phone]", "Remove phone from a contact."),
         (
@@ -69,7 +72,11 @@ def command_help():
             "del-contact [name]",
             "Remove a specific contact from the Address Book.",
         ),
-        ("show_all_contacts", "show_all", "List all contacts in the Address Book."),
+        (
+            "show_all_contacts",
+            "show_all_contacts [page_size] [offset]",
+            "List contacts in the Address Book, page by page.",
+        ),
         ("show_phone", "show-phone [name]", "Display a contact’s phone numbers."),
         (
             "show_birthday",
@@ -91,8 +98,26 @@ def command_help():
             "show-address [name]",
             "View the address associated with a contact.",
         ),
-        ("show_all-notes", "show-all-notes", "Display all notes in the system."),
-        ("find_contact", "find-contact [name]", "View specific details of a contact."),
+        (
+            "show_all-notes",
+            "show-all-notes [page_size] [offset]",
+            "Display notes in the system, page by page.",
+        ),
+        (
+            "find_contact",
+            "find-contact [name | phone | email] [--fuzzy]",
+            "View specific details of a contact. With --fuzzy, list contacts whose name, email or address resemble the query, allowing typos.",
+        ),
+        (
+            "find_by_domain",
+            "find_by_domain [domain] [page_size] [offset]",
+            "List the contacts with an email at a domain, e.g. example.com.",
+        ),
+        (
+            "import_contacts",
+            "import_contacts [file.csv | file.vcf]",
+            "Import contacts in bulk from a CSV or vCard file.",
+        ),
         (
             "find_note_by_title",
             "find-note-by-title [title]",
@@ -103,12 +128,20 @@ def command_help():
             "find-note-by-tag [tag]",
             "Search for notes by a specific tag.",
         ),
+        (
+            "search_notes",
+            "search-notes [words]",
+            "Full-text search over note titles and contents, best matches first.",
+        ),
+        (
+            "stats",
+            "stats [reset]",
+            "Show how long commands and file reads/writes took (count, p50, p95, p99).",
+        ),
     ]
 
     # Create a PrettyTable object to format the command list as a table
-    table = PrettyTable()
-    # Set the headers for the table
-    table.field_names = headers
+    table = new_table(headers)
     
     # Align all columns to the left
     table.align["Command"] = "l"
@@ -119,5 +152,12 @@ def command_help():
     for command in commands_description:
         table.add_row(command)
 
+    return table.get_string()
+
+
+def command_help():
+    """
+    Displays a table of available commands with their usage and description.
+    """
     # Print the table with INFO color styling using the Colorizer class
-    print(Colorizer.info(table))
+    print(Colorizer.info(render_help()))
@@ -0,0 +1,42 @@
+"""
+This module contains ArgumentCompleter, the prompt_toolkit completer of the
+interactive prompt. It completes the command name and then the argument
+under the cursor: contact names, note titles, tags or a fixed choice,
+depending on the command (see completion.ARGUMENTS).
+
+Names, titles and tags come from a `lookup(kind, prefix)` callable: the
+local book and notes in standalone mode, the assistant server otherwise.
+Imported only by the interactive prompt, like prompt_toolkit itself.
+"""
+
+from prompt_toolkit.completion import Completer, Completion
+from completion import STATIC_VALUES, argument_slot, complete_static
+
+
+class ArgumentCompleter(Completer):
+    def __init__(self, commands, lookup=None):
+        self.commands = sorted(commands)
+        self.lookup = lookup
+
+    def candidates(self, kind, prefix):
+        if kind == "command":
+            prefix = prefix.lower()
+            return [command for command in self.commands if command.startswith(prefix)]
+        if kind in STATIC_VALUES:
+            return complete_static(kind, prefix)
+        if self.lookup is None:
+            return []
+        try:
+            return self.lookup(kind, prefix)
+        except Exception:
+            return []  # a failed lookup must never break the prompt
+
+    def get_completions(self, document, complete_event):
+        slot = argument_slot(document.text_before_cursor)
+        if slot is None:
+            return
+        kind, prefix, separator = slot
+        for value in self.candidates(kind, prefix):
+            if separator == " " and " " in value:
+                continue  # would be split into several arguments
+            yield Completion(value, start_position=-len(prefix))
@@ -0,0 +1,153 @@
+"""
+This module contains what the prompt needs to complete command arguments:
+PrefixIndex, a sorted list of keys searched with bisect, and the table of
+which kind of value every argument of a command takes.
+
+A PrefixIndex answers a prefix with one bisect and a slice, so a keystroke
+costs O(log n) however many names, titles or tags there are. It is kept up
+to date entry by entry by AddressBook (contact names) and NotesManager
+(note titles and tags) once the first completion has built it.
+
+The prompt_toolkit completer itself lives in completer.py, so that this
+module can be imported without prompt_toolkit.
+"""
+
+import unicodedata
+from bisect import bisect_left, insort
+from validators import normalize_name
+
+# Most candidates offered for one keystroke
+MAX_COMPLETIONS = 50
+
+# Argument kinds by command: (separator, kinds). Arguments are separated by
+# whitespace, or by "|" for commands that accept spaces in their values.
+CONTACT_ARGUMENT = (" ", ["contact"])
+ARGUMENTS = {
+    "add_contact": CONTACT_ARGUMENT,
+    "add_birthday": CONTACT_ARGUMENT,
+    "add_email": CONTACT_ARGUMENT,
+    "add_address": CONTACT_ARGUMENT,
+    "show_phone": CONTACT_ARGUMENT,
+    "show_birthday": CONTACT_ARGUMENT,
+    "show_email": CONTACT_ARGUMENT,
+    "show_address": CONTACT_ARGUMENT,
+    "change_phone": CONTACT_ARGUMENT,
+    "change_birthday": CONTACT_ARGUMENT,
+    "change_email": CONTACT_ARGUMENT,
+    "change_address": CONTACT_ARGUMENT,
+    "del_contact": CONTACT_ARGUMENT,
+    "del_phone": CONTACT_ARGUMENT,
+    "del_birthday": CONTACT_ARGUMENT,
+    "del_email": CONTACT_ARGUMENT,
+    "del_address": CONTACT_ARGUMENT,
+    "find_contact": CONTACT_ARGUMENT,
+    "change_name": ("|", ["contact"]),
+    "add_note": ("|", [None, None, "tags"]),
+    "change_note": ("|", ["note", "field"]),
+    "del_note": ("|", ["note"]),
+    "find_note_by_title": ("|", ["note"]),
+    "find_note_by_tag": ("|", ["tag"]),
+    "stats": (" ", ["stats"]),
+}
+# Kinds with a fixed set of values
+STATIC_VALUES = {
+    "field": ["title", "content", "tags"],
+    "stats": ["reset"],
+}
+
+
+class PrefixIndex:
+    """
+    Values kept sorted by their normalized form, for prefix lookups.
+
+    With `counted` every add needs its own remove, for values that several
+    notes share (titles, tags); without it adding a value twice is harmless
+    and one remove drops it (contact names, which are unique).
+    """
+
+    def __init__(self, values=(), counted=True):
+        self.counted = counted
+        self.counts = {}  # key -> [value as first added, number of values with this key]
+        for value in values:
+            key = normalize_name(value)
+            if not key:
+                continue
+            entry = self.counts.get(key)
+            if entry is None:
+                self.counts[key] = [value, 1]
+            elif counted:
+                entry[1] += 1
+        self.keys = sorted(self.counts)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, value):
+        key = normalize_name(value)
+        if not key:
+            return
+        entry = self.counts.get(key)
+        if entry is None:
+            self.counts[key] = [value, 1]
+            insort(self.keys, key)
+        elif self.counted:
+            entry[1] += 1
+
+    def remove(self, value):
+        key = normalize_name(value)
+        entry = self.counts.get(key)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if not entry[1]:
+            del self.counts[key]
+            del self.keys[bisect_left(self.keys, key)]
+
+    def complete(self, prefix, limit=MAX_COMPLETIONS):
+        """Return up to `limit` values starting with `prefix`, ignoring case."""
+        # Not stripped: "anna " must not complete "annabel"
+        prefix = unicodedata.normalize("NFKC", prefix).casefold()
+        keys = self.keys
+        start = bisect_left(keys, prefix)
+        result = []
+        for key in keys[start : start + limit]:
+            if not key.startswith(prefix):
+                break
+            result.append(self.counts[key][0])
+        return result
+
+
+def argument_slot(text):
+    """
+    Return (kind, prefix, separator) for the argument being typed at the end
+    of `text`, ("command", prefix, " ") while the command itself is typed, or
+    None when nothing can be completed.
+    """
+    command, space, rest = text.lstrip().partition(" ")
+    if not space:
+        return "command", command, " "
+    spec = ARGUMENTS.get(command.lower())
+    if spec is None:
+        return None
+    separator, kinds = spec
+    if separator == " ":
+        *done, prefix = rest.split(" ")
+        if prefix.startswith("--"):
+            return None
+        # Options such as --fuzzy do not take an argument slot
+        index = sum(1 for part in done if part and not part.startswith("--"))
+    else:
+        parts = rest.split(separator)
+        index, prefix = len(parts) - 1, parts[-1].lstrip()
+    if index >= len(kinds) or kinds[index] is None:
+        return None
+    kind = kinds[index]
+    if kind == "tags":
+        # Comma-separated list: complete the last tag
+        return "tag", prefix.split(",")[-1].lstrip(), separator
+    return kind, prefix, separator
+
+
+def complete_static(kind, prefix):
+    prefix = prefix.lower()
+    return [value for value in STATIC_VALUES.get(kind, ()) if value.startswith(prefix)]
@@ -7,11 +7,14 @@ This module contains the AddressBook class, which represents a collection of
 
 The AddressBook class has the following methods:
 - add_contact: Adds a new contact to the address book.
-- find_address: Finds a contact by name or phone number.
+- find_address: Finds a contact by name, phone number or email.
+- find_by_domain: Finds the contacts with an email at a domain.
+- find_similar: Finds contacts whose name, email or address resemble a query.
+- complete_names: Lists contact names starting with a prefix, for completion.
 - edit_address: Edits the address of a contact.
 - delete_contact: Deletes a contact from the address book.
-- save_data: Saves the address book data to a file.
-- load_data: Loads the address book data from a file.
+- save_data: Saves the address book to a snapshot (or pickle) file if it changed.
+- close: Writes the journaled changes and waits for a running compaction.
 - change_address: Changes the address of a contact.
 
 The Record class represents a contact in the address book:
@@ -52,62 +55,283 @@ dictionary-like interface for accessing and modifying the address book data.
 The AddressBook class also uses the validators module to normalize phone numbers,
 and the phone, birthday, and email classes to represent contact information.
 The colorizer module provides a colorizer class for formatting output.
-The pickle module is used to save and load the address book data to and from a file.
-The AddressBook class also uses the re module to validate email addresses.
-The re module provides a regular expression pattern for validating email addresses.
-The AddressBook class also uses the pickle module to save and load the address book data to and from a file.
+The validators module also provides the precompiled email and birthday checks.
+The address book is saved as a snapshot (see snapshot.py); the pickle module
+still reads and writes the .pkl files of older versions.
 """
 
 from collections import UserDict
-from validators import normalize_phone
+from validators import (
+    normalize_phone,
+    normalize_name,
+    normalize_phones,
+    is_valid_email,
+    is_valid_birthday,
+)
 from phone import Phone
-from birthday import Birthday
-from field import Field
-import re
+from birthday import Birthday, BirthdayCalendar
+from field import Field, Slotted
 from colorizer import Colorizer
+from persistence import atomic_write
+from metrics import metrics
+from fuzzy_index import TrigramIndex
+from completion import PrefixIndex, MAX_COMPLETIONS
+from snapshot import write_snapshot
+from email_index import EmailIndex
 import pickle
 
 
+CONTACT_FIELDS = ["Name", "Phones", "Birthday", "Email", "Address"]
+
+
 class AddressBook(UserDict):
+    # Optional storage backend (e.g. SQLiteStorage) that persists single records
+    backend = None
+    # File the book was loaded from; save_data writes it back there
+    filename = None
+    # True when the book changed since it was loaded or last saved
+    dirty = False
+    # Trigram index for find_similar, built on the first fuzzy search
+    fuzzy_index = None
+    # Sorted contact names for complete_names, built on the first completion
+    name_completions = None
+    # Email and domain lookups, built on the first query by email or domain
+    email_index = None
+    # ContactJournal that save_data appends changes to instead of rewriting
+    # the snapshot; set by helper.load_data for snapshot files
+    journal = None
+    # Attributes rebuilt after loading instead of being pickled
+    _transient = (
+        "backend",
+        "filename",
+        "dirty",
+        "phone_index",
+        "name_index",
+        "birthday_calendar",
+        "fuzzy_index",
+        "name_completions",
+        "email_index",
+        "journal",
+    )
+
+    def __init__(self, *args, **kwargs):
+        self.phone_index = {}  # normalized E.164 number -> list of records
+        self.name_index = {}  # casefolded name -> record
+        self.birthday_calendar = BirthdayCalendar()
+        super().__init__(*args, **kwargs)
+
+    def __getstate__(self):
+        # The backend holds an open connection and the indexes are derived data
+        state = self.__dict__.copy()
+        for name in self._transient:
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.phone_index = {}
+        self.name_index = {}
+        self.birthday_calendar = BirthdayCalendar()
+        # Older versions of change_name left records under their previous key
+        self.data = {record.name.value: record for record in self.data.values()}
+        # Books pickled before records knew their owner need the links restored
+        for record in self.data.values():
+            if isinstance(record.birthday, str):
+                # Record.change_birthday used to store the bare date string
+                record.birthday = Birthday(record.birthday)
+        self._index_records(self.data.values())
+
+    def __setitem__(self, key, record):
+        previous = self.data.get(key)
+        if previous is not None and previous is not record:
+            self._unindex_record(previous)
+        self.data[key] = record
+        self._index_record(record)
+        self.dirty = True
+        if self.journal is not None:
+            self.journal.log(key, record)
+
+    def __delitem__(self, key):
+        record = self.data.pop(key)
+        self._unindex_record(record)
+        self.dirty = True
+        if self.journal is not None:
+            self.journal.log(key, None)
+
+    def _index_record(self, record, calendar=True):
+        record.book = self
+        if isinstance(record.phones, Phone):
+            record.phones.record = record
+        self.name_index.setdefault(normalize_name(record.name.value), record)
+        for number in record.phones:
+            self.index_phone(number, record)
+        if calendar:
+            self.birthday_calendar.add(record)
+        if self.fuzzy_index is not None:
+            self.fuzzy_index.add(record.name.value, search_fields(record))
+        if self.name_completions is not None:
+            self.name_completions.add(record.name.value)
+        self.index_email(record)
+
+    def _index_records(self, records):
+        # Bulk variant of _index_record: the birthday calendar is sorted once
+        for record in records:
+            self._index_record(record, calendar=False)
+        self.birthday_calendar.extend(records)
+
+    def _unindex_record(self, record):
+        key = normalize_name(record.name.value)
+        if self.name_index.get(key) is record:
+            del self.name_index[key]
+        for number in record.phones:
+            self.unindex_phone(number, record)
+        self.birthday_calendar.remove(record)
+        if self.fuzzy_index is not None:
+            self.fuzzy_index.remove(record.name.value)
+        if self.name_completions is not None:
+            self.name_completions.remove(record.name.value)
+        self.unindex_email(record)
+        record.book = None
+
+    def index_phone(self, number, record):
+        records = self.phone_index.setdefault(number, [])
+        if record not in records:
+            records.append(record)
+
+    def unindex_phone(self, number, record):
+        records = self.phone_index.get(number)
+        if records and record in records:
+            records.remove(record)
+            if not records:
+                del self.phone_index[number]
+
+    def index_email(self, record):
+        if self.email_index is not None:
+            self.email_index.add(record.name.value, email_address(record))
+
+    def unindex_email(self, record):
+        if self.email_index is not None:
+            self.email_index.remove(record.name.value, email_address(record))
+
+    def record_changed(self, record):
+        self.dirty = True
+        if self.journal is not None:
+            self.journal.log(record.name.value, record)
+        if self.fuzzy_index is not None:
+            self.fuzzy_index.add(record.name.value, search_fields(record))
+        if self.backend is not None:
+            self.backend.save_record(record)
+
     def add_address(self, address):
         if isinstance(address.name.value, str):
-            self.data[address.name.value] = address
+            self[address.name.value] = address
+            self.record_changed(address)
         else:
             raise TypeError(Colorizer.error("Contact name must be a string."))
 
+    def add_addresses(self, records):
+        """
+        Add many records at once.
+
+        Indexes are updated in one pass at the end and an attached backend
+        writes all records in a single transaction.
+        """
+        records = list(records)
+        for record in records:
+            if not isinstance(record.name.value, str):
+                raise TypeError(Colorizer.error("Contact name must be a string."))
+            previous = self.data.get(record.name.value)
+            if previous is not None and previous is not record:
+                self._unindex_record(previous)
+            self.data[record.name.value] = record
+            if self.journal is not None:
+                self.journal.log(record.name.value, record)
+        self._index_records(records)
+        self.dirty = True
+        if self.backend is not None:
+            self.backend.save_records(records)
+
     def add_contact(self, name, phones, birthday=None, email=None, address=None):
-        for phone in phones:
-            normalized_number = normalize_phone(phone)
-            if not isinstance(normalized_number, str) and len(normalized_number) < 10:
+        for result in normalize_phones(phones):
+            if result.error:
                 raise ValueError(
                     Colorizer.error(
-                        f"Invalid phone number: {phone}. The number must have not less than 10 digits."
+                        f"Invalid phone number: {result.number}. The number must have not less than 10 digits."
                     )
                 )
 
         new_address = Record(name, phones, birthday, email, address)
-        self.data[name.value] = new_address
+        self.add_address(new_address)
         print(Colorizer.info(f"Contact added: {new_address}"))
 
     def find_address(self, query):
+        if "@" in query:
+            return self.find_email(query)
         # Checks if the query is a phone number
         if query.isdigit() or query.startswith("+"):
             normalized_number = normalize_phone(query)  # Normalize the phone number
-            for record in self.data.values():
-                for phone in record.phones:
-                    if normalized_number in phone.value:
-                        return record
+            records = self.phone_index.get(normalized_number)
+            if records:
+                return records[0]
         else:
             # Search by name
-            for record in self.data.values():
-                if (
-                        record.name.value.lower() == query.lower()
-                ):  # Compare the query with the name.value
-                    return record
+            return self.name_index.get(normalize_name(query))
         return None
 
+    def _emails(self):
+        if self.email_index is None:
+            # The search fields are (name, email, address), also when a
+            # LazyAddressBook reads them from its store without building Records
+            self.email_index = EmailIndex(
+                (name, fields[1]) for name, fields in self._search_sources()
+            )
+        return self.email_index
+
+    def find_email(self, email):
+        """Return a contact with this email address, ignoring case, or None."""
+        name = self._emails().find(email)
+        return None if name is None else self.data.get(name)
+
+    def find_by_domain(self, domain):
+        """Return the contacts with an email at `domain`, sorted by name."""
+        records = (self.data.get(name) for name in self._emails().find_domain(domain))
+        return [record for record in records if record is not None]
+
+    def _search_sources(self):
+        # (name, search fields) of every contact, to build the fuzzy index from
+        for record in self.data.values():
+            yield record.name.value, search_fields(record)
+
+    def find_similar(self, query, limit=10):
+        """
+        Return up to `limit` (record, score) pairs for contacts whose name,
+        email or address resemble `query`, most similar first. Tolerates
+        typos and Cyrillic/Latin spelling; scores go from 0 to 1.
+        """
+        if self.fuzzy_index is None:
+            index = TrigramIndex()
+            for name, fields in self._search_sources():
+                index.add(name, fields)
+            self.fuzzy_index = index
+        matches = self.fuzzy_index.search(
+            query, lambda name: search_fields(self.data[name]), limit
+        )
+        return [(self.data[name], score) for name, score in matches]
+
+    def complete_names(self, prefix, limit=MAX_COMPLETIONS):
+        """Return up to `limit` contact names starting with `prefix`, ignoring case."""
+        if self.name_completions is None:
+            # Iterating the book yields the names, also for a LazyAddressBook
+            self.name_completions = PrefixIndex(self.data, counted=False)
+        return self.name_completions.complete(prefix, limit)
+
+    def iter_rows(self):
+        # Generator, so listings only build the rows they actually print
+        for record in self.data.values():
+            yield record.as_row()
+
     def edit_address(self, name, new_address):
-        self.data[name] = new_address
+        self[name] = new_address
 
     def update_address(self, name, old_address, new_address):
         contact = self.data.get(name)
@@ -118,7 +342,9 @@ class AddressBook(UserDict):
 
     def delete_contact(self, name):
         if name in self.data:
-            del self.data[name]
+            del self[name]
+            if self.backend is not None:
+                self.backend.delete_record(name)
             return True
         return False
 
@@ -163,38 +389,129 @@ class AddressBook(UserDict):
     def change_name(self, old_name, new_name):
         old_name = old_name.strip().lower()
         new_name = new_name.strip().title()
-        for contact in self.data.values():
-            if contact.name.value.lower() == old_name:
-                contact.name.value = new_name
-                self.save_data()
-                print(
-                    Colorizer.info(
-                        f"Name changed from {(old_name.title())} to {new_name}"
-                    )
-                )
-                return
-        print(Colorizer.error(f"Error: Contact '{old_name}' not found."))
+        contact = self.name_index.get(normalize_name(old_name))
+        if contact is None:
+            print(Colorizer.error(f"Error: Contact '{old_name}' not found."))
+            return
+        existing = self.name_index.get(normalize_name(new_name))
+        if existing is not None and existing is not contact:
+            print(Colorizer.error(f"Error: Contact '{new_name}' already exists."))
+            return
 
-    def save_data(self):
+        previous_name = contact.name.value
+        # Re-key the record so the dict key always matches the name
+        del self[previous_name]
+        contact.name.value = new_name
+        self[new_name] = contact
+        if self.backend is not None:
+            self.backend.rename_record(previous_name, new_name)
+        self.save_data()
+        print(Colorizer.info(f"Name changed from {(old_name.title())} to {new_name}"))
+
+    def save_data(self, filename=None):
+        if self.backend is not None:
+            return  # every change is already written row by row
+        if not self.dirty:
+            return
+        if self.journal is not None and filename in (None, self.filename):
+            self._save_journal()
+            return
+        filename = filename or self.filename or "contact_book.snap"
         try:
-            with open("contact_book.pkl", "wb") as file:
-                pickle.dump(self.data, file)
+            with metrics.io_timer("contacts.save") as size, atomic_write(filename, "wb") as file:
+                if filename.endswith(".pkl"):
+                    pickle.dump(self, file)  # books of older versions
+                else:
+                    write_snapshot(file, map(record_fields, self.data.values()))
+                size[0] = file.tell()
+            self.dirty = False
         except Exception as e:
             print(Colorizer.error(f"Error while saving data: {e}"))
 
+    def _save_journal(self):
+        # Appends the changes since the last save; the snapshot is rewritten
+        # in the background once the journal is long enough
+        try:
+            self.journal.flush()
+            self.dirty = False
+            if self.journal.needs_compaction():
+                self.journal.compact(list(self.data.values()))
+        except Exception as e:
+            print(Colorizer.error(f"Error while saving data: {e}"))
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close(list(self.data.values()))
+
+
+def email_address(record):
+    email = record.email
+    # Books saved before change_email wrapped its value hold a bare string
+    return getattr(email, "email", email) or ""
+
+
+def search_fields(record):
+    return record.name.value, email_address(record), record.address or ""
+
+
+def record_fields(record):
+    # The plain values of a record, as stored by record stores and snapshots
+    return (
+        record.name.value,
+        list(record.phones),
+        record.birthday.ordinal if record.birthday else None,
+        email_address(record) or None,
+        record.address or None,
+    )
+
+
+def record_from_fields(fields):
+    # Fields were validated before they were stored, so the objects are
+    # filled in directly instead of running their validating constructors
+    name, phones, ordinal, email, address = fields
+    record = object.__new__(Record)
+    record.book = None
+    record.name = object.__new__(Name)
+    record.name.value = name
+    record.phones = object.__new__(Phone)
+    record.phones.value = list(phones)
+    record.phones.record = record
+    if ordinal is None:
+        record.birthday = None
+    else:
+        record.birthday = object.__new__(Birthday)
+        record.birthday.ordinal = ordinal
+    if email:
+        record.email = object.__new__(Email)
+        record.email.email = email
+    else:
+        record.email = None
+    record.address = address
+    return record
+
+
+class Record(Slotted):
+    __slots__ = ("name", "phones", "birthday", "email", "address", "book")
+    _derived = ("book",)
 
-class Record:
     def __init__(self, name, phones=None, birthday=None, email=None, address=None):
+        self.book = None  # AddressBook that owns the record; set by add_address
         self.name = Name(name)
         self.phones = (
             Phone(phones) if phones else Phone()
         )  # If the list of phones is empty, create an empty list
+        self.phones.record = self
         self.birthday = Birthday(birthday) if birthday else None
         self.email = Email(email) if email else None
         self.address = address
 
+    def _changed(self):
+        # Let the owning AddressBook persist the record
+        if self.book is not None:
+            self.book.record_changed(self)
+
     def add_email(self, email):
-        if not re.match(r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$", email):
+        if not is_valid_email(email):
             print(
                 Colorizer.error(
                     "Error: Invalid email format. Please enter a valid email email@domain.com"
@@ -208,28 +525,42 @@ class Record:
             )
             return
 
-        # initialize the email
-        if not isinstance(self.email, Email):
-            self.email = Email(email)
-        else:
-            self.email.email = email  # replace the old email with the new one
+        self._set_email(Email(email))  # replaces the old email, if any
 
         print(Colorizer.info(f"Emil {email} added to {self.name.value}."))
 
+    def _set_email(self, email):
+        # The email index is keyed by the old address, so drop it first
+        if self.book is not None:
+            self.book.unindex_email(self)
+        self.email = email
+        if self.book is not None:
+            self.book.index_email(self)
+        self._changed()
+
     def change_email(self, new_email):
-        if re.match(r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$", new_email):
-            self.email = new_email
+        if is_valid_email(new_email):
+            self._set_email(Email(new_email))
             print(Colorizer.success(f"Email successfully updated to {new_email}."))
         else:
             print(Colorizer.error("Error: Invalid email format. Use email@domain.com."))
 
+    def _set_birthday(self, birthday):
+        # The calendar index is keyed by the old date, so drop it first
+        if self.book is not None:
+            self.book.birthday_calendar.remove(self)
+        self.birthday = birthday
+        if self.book is not None:
+            self.book.birthday_calendar.add(self)
+        self._changed()
+
     def add_birthday(self, birthday):
-        self.birthday = Birthday(birthday)
+        self._set_birthday(Birthday(birthday))
 
     def change_birthday(self, new_birthday):
         # Checks if the new birthday is in the correct format
-        if re.match(r"^\d{2}\.\d{2}\.\d{4}$", new_birthday):
-            self.birthday = new_birthday
+        if is_valid_birthday(new_birthday):
+            self._set_birthday(Birthday(new_birthday))
             print(
                 Colorizer.success(f"Birthday successfully updated to {new_birthday}.")
             )
@@ -239,32 +570,32 @@ class Record:
             )
 
     def add_number(self, phones):
-        for number in phones:
-            normalized_number = normalize_phone(number)
-            if normalized_number:
-                self.phones.add_phone(
-                    normalized_number
-                )  # Use the Phone class to add the phone number
+        results = normalize_phones(phones)
+        # Nothing is added when one of the numbers is invalid
+        for result in results:
+            if not result.normalized:
+                raise ValueError(
+                    Colorizer.error(
+                        f"Invalid phone number: {result.number}. The number must have not less than 10 digits."
+                    )
+                )
+        for result in results:
+            self.phones.add_phone(
+                result.normalized
+            )  # Use the Phone class to add the phone number
 
     def find_number(self, phones):
-        for phone in self.phones:
-            if phone.find_phone(normalize_phone(phones)):
-                return phone.value
+        normalized_number = normalize_phone(phones)
+        if normalized_number in self.phones.value:
+            return normalized_number
         return None
 
     def edit_number(self, old_phone, new_phone):
-        for phone in self.phones:
-            if phone.find_phone(normalize_phone(old_phone)):
-                phone.edit_phone(old_phone, new_phone)
-                return True
-        return False
+        return self.phones.edit_phone(old_phone, new_phone)
 
     def remove_number(self, phones):
-        self.phones = [
-            phone
-            for phone in self.phones
-            if not phone.find_phone(normalize_phone(phones))
-        ]
+        if self.phones.find_phone(phones):
+            self.phones.remove_phone(phones)
 
     def delete_phone(self, phone_number):
         if self.phones.find_phone(phone_number):
@@ -280,6 +611,7 @@ class Record:
 
     def add_address(self, address):
         self.address = address
+        self._changed()
 
     def change_address(self, name, new_address):
         contact = self.data.get(name)
@@ -305,6 +637,7 @@ class Record:
         if self.address:
             removed_address = self.address
             self.address = None
+            self._changed()
             print(
                 Colorizer.info(
                     f"Address '{removed_address}' for '{self.name.value}' has been removed."
@@ -317,12 +650,21 @@ class Record:
 
     def delete_birthday(self):
         if self.birthday:
-            self.birthday = None
+            self._set_birthday(None)
         else:
             print(
                 Colorizer.error(f"Error: No birthday to remove for {self.name.value}.")
             )
 
+    def as_row(self):
+        return [
+            self.name.value,
+            ", ".join(self.phones),
+            self.birthday.value if self.birthday else "",
+            str(self.email) if self.email else "",
+            self.address or "",
+        ]
+
     def __str__(self):
         phones = ", ".join(self.phones.value) if self.phones else ""
         birthday_str = Colorizer.info(
@@ -333,7 +675,9 @@ class Record:
         return f"Contact name: {self.name.value}, phones: {phones}{birthday_str}{email_str}{address}"
 
 
-class Email:
+class Email(Slotted):
+    __slots__ = ("email",)
+
     def __init__(self, email=None):
         self.email = email  # Initialize email with None if not provided
 
@@ -348,10 +692,10 @@ class Email:
 
     def remove_email(contact):
         if contact.email:
-            contact.email = None
+            contact._set_email(None)
             return True
         return False
 
 
 class Name(Field):
-    pass
+    __slots__ = ()
@@ -0,0 +1,223 @@
+"""
+This module contains ContactJournal, the append-only log of contact book
+changes kept next to the snapshot (contact_book.journal next to
+contact_book.snap).
+
+Every change to a contact is logged as the contact's new state: a PUT entry
+with its fields, packed like a snapshot record, or a DELETE entry with its
+name. A rename is a DELETE of the old name and a PUT of the new one.
+Because each entry sets the whole state of one contact, only the last
+change of a contact is kept until the next flush, and replaying an entry
+twice gives the same book.
+
+The autosaver flushes the logged changes as one write and one fsync, so a
+save costs O(changes), not O(contacts). Startup replays the journal on top
+of the snapshot. Once the journal grows past COMPACT_SIZE bytes it is folded
+into a new snapshot by a background thread, with the same rotation as the
+notes journal (see persistence.py).
+
+File layout (all integers little-endian):
+    header   MAGIC, uint16 format version
+    entries  uint8 PUT or DELETE, uint32 payload size, uint32 crc32 of the
+             payload, then the payload: a snapshot record body for PUT,
+             the UTF-8 name for DELETE
+"""
+
+import os
+import sys
+import struct
+import threading
+import zlib
+from colorizer import Colorizer
+from contact_book import record_fields
+from metrics import metrics
+from persistence import atomic_write, journal_files, rotate_journal
+from snapshot import HEADER, RECORD_STRUCTS, VERSION, pack_record, unpack_record, write_snapshot
+
+MAGIC = b"CBJRNL\r\n"
+# The journal version is the snapshot version its PUT entries are packed with
+# op, payload size, crc32 of the payload
+ENTRY = struct.Struct("<BII")
+PUT = 1
+DELETE = 2
+# Journal size in bytes after which it is folded into the snapshot
+COMPACT_SIZE = 1 << 20
+
+
+def journal_file(snapshot):
+    return os.path.splitext(snapshot)[0] + ".journal"
+
+
+def replay(records, filename):
+    """
+    Apply the entries of a journal file to `records` (name -> fields) and
+    return the size of its valid part; a torn last batch is left out.
+    """
+    try:
+        with open(filename, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return 0
+    if len(data) < HEADER.size or data[: len(MAGIC)] != MAGIC:
+        print(Colorizer.error(f"{filename} is not a contact journal; ignoring it."))
+        return 0
+    _, version = HEADER.unpack_from(data, 0)
+    if version not in RECORD_STRUCTS:
+        raise ValueError(f"Unsupported contact journal version {version} in {filename}.")
+
+    offset = HEADER.size
+    while offset + ENTRY.size <= len(data):
+        op, size, checksum = ENTRY.unpack_from(data, offset)
+        start = offset + ENTRY.size
+        end = start + size
+        if end > len(data) or zlib.crc32(data[start:end]) != checksum:
+            break
+        if op == PUT:
+            fields = unpack_record(data, start, version)
+            records[fields[0]] = fields
+        elif op == DELETE:
+            records.pop(data[start:end].decode(), None)
+        offset = end
+    if offset < len(data):
+        # The process died in the middle of a flush
+        print(Colorizer.warn(f"Skipping the damaged end of {filename}."))
+    return offset
+
+
+def open_journal(records, snapshot):
+    """
+    Replay the journal of `snapshot` into `records` (name -> fields, as read
+    from the snapshot) and return the ContactJournal to log new changes to.
+    """
+    filename = journal_file(snapshot)
+    files = journal_files(filename)
+    for name in files:
+        size = replay(records, name)
+    # An interrupted compaction left its rotated journal; the snapshot may
+    # hold its entries already, which replaying them again does not change.
+    # Fold everything now rather than replay it at every start. A journal of
+    # an older version is folded too, new entries cannot be appended to it.
+    if len(files) > 1 or _version(filename) not in (None, VERSION):
+        with atomic_write(snapshot, "wb") as f:
+            write_snapshot(f, records.values())
+        for name in files:
+            if os.path.exists(name):
+                os.remove(name)
+        return ContactJournal(filename, snapshot)
+    if os.path.exists(filename) and os.path.getsize(filename) > size:
+        # New entries must not follow a damaged batch, or they would be lost
+        with open(filename, "r+b") as f:
+            f.truncate(size)
+    return ContactJournal(filename, snapshot, size)
+
+
+def _version(filename):
+    # Format version of a journal file; None if there is none
+    try:
+        with open(filename, "rb") as f:
+            header = f.read(HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(header) < HEADER.size:
+        return None
+    return HEADER.unpack(header)[1]
+
+
+class ContactJournal:
+    def __init__(self, filename, snapshot, size=0):
+        self.filename = filename
+        self.snapshot = snapshot
+        self.size = size  # bytes in the journal file; 0 starts a new file
+        self.pending = {}  # name -> Record, or None for a deleted contact
+        self._compaction = None
+
+    def log(self, name, record):
+        """Log the new state of contact `name`: its Record, or None once deleted."""
+        # A contact that cannot be stored is reported now, by the command
+        # that changed it, and kept out of the batch the other changes are in
+        if record is not None:
+            try:
+                pack_record(record_fields(record))
+            except (struct.error, ValueError) as e:
+                print(Colorizer.error(f"Error: Contact '{name}' cannot be saved: {e}"))
+                return
+        # Only the last state of a contact is written by the next flush
+        self.pending[name] = record
+
+    def flush(self):
+        """Append the logged changes with a single write and fsync."""
+        if not self.pending:
+            return
+        parts = [] if self.size else [HEADER.pack(MAGIC, VERSION)]
+        for name, record in self.pending.items():
+            if record is None:
+                op, payload = DELETE, name.encode()
+            else:
+                try:
+                    op, payload = PUT, pack_record(record_fields(record))
+                except (struct.error, ValueError) as e:
+                    # Changed since it was logged; the rest of the batch is still written
+                    print(Colorizer.error(f"Error: Contact '{name}' cannot be saved: {e}"), file=sys.stderr)
+                    continue
+            parts.append(ENTRY.pack(op, len(payload), zlib.crc32(payload)))
+            parts.append(payload)
+        data = b"".join(parts)
+        with metrics.io_timer("contacts.journal") as size, open(
+            self.filename, "ab" if self.size else "wb"
+        ) as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+            size[0] = len(data)
+        self.size += len(data)
+        self.pending = {}
+
+    def needs_compaction(self):
+        return self.size >= COMPACT_SIZE
+
+    def compact(self, records, background=True):
+        """
+        Fold the journal into a new snapshot of `records`.
+
+        The journal is rotated first, so changes made while the snapshot is
+        being written go to a fresh journal and are never lost.
+        """
+        # Logged changes go to the journal before it is rotated, so they are
+        # replayed if the new snapshot never gets written
+        self.flush()
+        # Only one compaction at a time, otherwise an older snapshot could win
+        if self._compaction is not None:
+            self._compaction.join()
+            self._compaction = None
+        fields = [record_fields(record) for record in records]
+        rotated = rotate_journal(self.filename, HEADER.size)
+        self.size = 0
+
+        def write():
+            try:
+                with metrics.io_timer("contacts.save") as size, atomic_write(self.snapshot, "wb") as f:
+                    write_snapshot(f, fields)
+                    size[0] = f.tell()
+            except Exception as e:
+                # The rotated journal stays and is kept by the next compaction. Runs
+                # on its own thread while a command may have redirected stdout.
+                print(Colorizer.error(f"Error while compacting the contact journal: {e}"), file=sys.stderr)
+                return
+            if os.path.exists(rotated):
+                os.remove(rotated)
+
+        if not background:
+            write()
+            return
+        self._compaction = threading.Thread(target=write, name="contacts-compaction", daemon=True)
+        self._compaction.start()
+
+    def close(self, records):
+        """Flush, wait for a running compaction and compact if the journal is too long."""
+        self.flush()
+        if self._compaction is not None:
+            self._compaction.join()
+            self._compaction = None
+        if self.needs_compaction():
+            self.compact(records, background=False)
+
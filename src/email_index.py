@@ -0,0 +1,60 @@
+"""
+This module contains EmailIndex, the lookup tables behind find_contact by
+email and find_by_domain.
+
+Addresses are normalized with validators.normalize_email, so "Ann@Example.com"
+and "ann@example.com " find the same contact. Both tables map to contact
+names rather than Records, so they work the same for an in-memory book and
+for a LazyAddressBook whose records are read on demand; a rename is an
+unindex of the old name and an index of the new one, like every other
+AddressBook index.
+
+Names are kept in dicts used as ordered sets: adding a contact twice is
+harmless and removing one is O(1), so keeping the index up to date costs
+the same however many contacts share a domain.
+"""
+
+from validators import email_domain, normalize_email
+
+
+class EmailIndex:
+    def __init__(self, entries=()):
+        self.emails = {}  # normalized email -> {name: None}
+        self.domains = {}  # domain -> {name: None}
+        for name, email in entries:
+            self.add(name, email)
+
+    def __len__(self):
+        return len(self.emails)
+
+    def add(self, name, email):
+        if not email:
+            return
+        email = normalize_email(email)
+        self.emails.setdefault(email, {})[name] = None
+        self.domains.setdefault(email_domain(email), {})[name] = None
+
+    def remove(self, name, email):
+        if not email:
+            return
+        email = normalize_email(email)
+        _discard(self.emails, email, name)
+        _discard(self.domains, email_domain(email), name)
+
+    def find(self, email):
+        """Return the name of a contact with this email, or None."""
+        names = self.emails.get(normalize_email(email))
+        return next(iter(names)) if names else None
+
+    def find_domain(self, domain):
+        """Return the names of the contacts with an email at `domain`, sorted."""
+        names = self.domains.get(email_domain(domain))
+        return sorted(names) if names else []
+
+
+def _discard(table, key, name):
+    names = table.get(key)
+    if names is not None:
+        names.pop(name, None)
+        if not names:
+            del table[key]
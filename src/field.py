@@ -1,8 +1,55 @@
 """
 this is the base class for all fields
+
+Fields and records use __slots__ to keep per-contact memory small. Slotted
+pickles to a plain dict, the same format the old __dict__-based objects
+produced, so contact books pickled before and after the change both load.
 """
 
-class Field:
+_SLOT_NAMES = {}
+
+
+class Slotted:
+    __slots__ = ()
+    # Slots rebuilt after loading instead of being pickled
+    _derived = ()
+
+    @classmethod
+    def _slot_names(cls):
+        names = _SLOT_NAMES.get(cls)
+        if names is None:
+            names = []
+            for klass in reversed(cls.__mro__):
+                for name in klass.__dict__.get("__slots__", ()):
+                    if name not in names:
+                        names.append(name)
+            names = _SLOT_NAMES[cls] = tuple(names)
+        return names
+
+    def __getstate__(self):
+        return {
+            name: getattr(self, name)
+            for name in self._slot_names()
+            if name not in self._derived
+        }
+
+    def __setstate__(self, state):
+        if isinstance(state, tuple):
+            # (__dict__ state, slot state) as produced by the default protocol
+            dict_state, slot_state = state
+            state = {**(dict_state or {}), **(slot_state or {})}
+        for name in self._slot_names():
+            setattr(self, name, None)
+        for name, value in state.items():
+            try:
+                setattr(self, name, value)
+            except AttributeError:
+                pass  # attribute of an older version, e.g. Phone.numbers
+
+
+class Field(Slotted):
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
 
@@ -0,0 +1,188 @@
+"""
+This module contains TrigramIndex, a character-trigram inverted index used
+for typo-tolerant contact search (find_contact --fuzzy).
+
+Every indexed text is folded first: casefolded, Cyrillic transliterated to
+Latin and accents removed, so "Олександр", "Oleksandr" and "Ołeksandr" all
+become "oleksandr". Each word is padded with a space on both sides and cut
+into overlapping three-letter pieces: " ol", "ole", "lek", ..., "dr ".
+
+A query is answered from the postings of its own trigrams, rarest first,
+until POSTINGS_BUDGET entries have been counted; trigrams shared by most of
+the book ("kyi" in a city, "com" in emails) say little about a contact and
+are skipped when rarer ones exist. The contacts sharing the most counted
+trigrams are then scored exactly: every query word is compared with every
+word of a field using the Dice coefficient, 2 * shared / (trigrams of
+both), and the field scores the mean of each query word's best match, so
+"Olecsandr Petrenco" scores high against "Олександр Петренко" and
+"street 3" does not against "Street 9".
+
+Entries are keyed by contact name. Changing an entry marks its old slot
+dead instead of searching the postings for it; dead slots are skipped by
+searches and dropped once they outnumber the live ones.
+"""
+
+import re
+import unicodedata
+from array import array
+from collections import Counter
+
+# Ukrainian national transliteration, plus the Russian-only letters and the
+# Latin letters that NFKD does not split into a base letter and an accent
+TRANSLITERATION = str.maketrans(
+    {
+        "а": "a", "б": "b", "в": "v", "г": "h", "ґ": "g", "д": "d", "е": "e",
+        "є": "ie", "ж": "zh", "з": "z", "и": "y", "і": "i", "ї": "i", "й": "i",
+        "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r",
+        "с": "s", "т": "t", "у": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch",
+        "ш": "sh", "щ": "shch", "ь": "", "ю": "iu", "я": "ia", "ё": "e",
+        "ы": "y", "э": "e", "ъ": "", "'": "", "’": "", "ʼ": "",
+        "ł": "l", "đ": "d", "ø": "o", "ħ": "h", "ı": "i", "æ": "ae", "œ": "oe",
+        "þ": "th",
+    }
+)
+WORD_PATTERN = re.compile(r"[^\W_]+")
+# Scores go from 0 to 1; below this a contact is not considered similar
+MIN_SIMILARITY = 0.4
+# How many of the best candidates by shared trigrams get scored exactly
+CANDIDATES_PER_RESULT = 20
+# Posting entries a query counts before it stops adding more common trigrams
+POSTINGS_BUDGET = 200_000
+# Dead slots are dropped once there are more of them than this and than live ones
+COMPACT_MIN = 1024
+
+
+def fold(text):
+    if text.isascii():
+        return text.lower()  # nothing to transliterate or strip
+    text = unicodedata.normalize("NFC", text.casefold()).translate(TRANSLITERATION)
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def words(text):
+    return WORD_PATTERN.findall(fold(text))
+
+
+def word_trigrams(word):
+    padded = f" {word} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def trigrams(text):
+    result = set()
+    for word in words(text):
+        result |= word_trigrams(word)
+    return result
+
+
+def dice(a, b):
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+def similarity(query_words, text):
+    """Mean over the query words (as trigram sets) of their best Dice score against a word of `text`."""
+    text_words = [word_trigrams(word) for word in words(text)]
+    if not query_words or not text_words:
+        return 0.0
+    return sum(
+        max(dice(query_word, text_word) for text_word in text_words)
+        for query_word in query_words
+    ) / len(query_words)
+
+
+class TrigramIndex:
+    def __init__(self):
+        self.postings = {}  # trigram -> array of slots
+        self.keys = []  # slot -> key, None for dead slots
+        self.hashes = array("q")  # slot -> hash of the indexed fields
+        self.slots = {}  # key -> live slot
+        self.dead = 0
+
+    def __len__(self):
+        return len(self.slots)
+
+    def add(self, key, fields):
+        """Index `fields` (strings) under `key`, replacing what was indexed for it."""
+        fields = tuple(fields)
+        slot = self.slots.get(key)
+        if slot is not None:
+            if self.hashes[slot] == hash(fields):
+                return  # e.g. only a phone changed
+            self.remove(key)
+        slot = len(self.keys)
+        self.keys.append(key)
+        self.hashes.append(hash(fields))
+        self.slots[key] = slot
+        for gram in trigrams(" ".join(fields)):
+            posting = self.postings.get(gram)
+            if posting is None:
+                posting = self.postings[gram] = array("I")
+            posting.append(slot)
+
+    def remove(self, key):
+        slot = self.slots.pop(key, None)
+        if slot is None:
+            return
+        self.keys[slot] = None
+        self.dead += 1
+        if self.dead > COMPACT_MIN and self.dead > len(self.slots):
+            self._compact()
+
+    def _compact(self):
+        # Renumber the live slots and drop the dead ones from every posting
+        new_slots = array("l", [-1]) * len(self.keys)
+        keys = []
+        hashes = array("q")
+        for slot, key in enumerate(self.keys):
+            if key is not None:
+                new_slots[slot] = len(keys)
+                self.slots[key] = len(keys)
+                keys.append(key)
+                hashes.append(self.hashes[slot])
+        for gram, posting in list(self.postings.items()):
+            live = array("I", (new_slots[s] for s in posting if new_slots[s] >= 0))
+            if live:
+                self.postings[gram] = live
+            else:
+                del self.postings[gram]
+        self.keys = keys
+        self.hashes = hashes
+        self.dead = 0
+
+    def search(self, query, fields_of, limit=10, threshold=MIN_SIMILARITY):
+        """
+        Return up to `limit` (key, score) pairs, most similar first.
+
+        `fields_of(key)` returns the current fields of a candidate, which are
+        scored exactly; only candidates sharing enough trigrams get that far.
+        """
+        query_words = [word_trigrams(word) for word in words(query)]
+        grams = set().union(*query_words)
+        postings = sorted(
+            (posting for posting in map(self.postings.get, grams) if posting), key=len
+        )
+        counts = Counter()
+        counted = 0
+        for posting in postings:
+            if counted and counted + len(posting) > POSTINGS_BUDGET:
+                break
+            counts.update(posting)  # counted in C
+            counted += len(posting)
+
+        keys = self.keys
+        candidates = limit * CANDIDATES_PER_RESULT
+        # Dead slots are a minority (see remove), so a margin covers them
+        best = [slot for slot, _ in counts.most_common(2 * candidates) if keys[slot] is not None]
+        results = []
+        for slot in best[:candidates]:
+            key = keys[slot]
+            score = max(
+                (similarity(query_words, field) for field in fields_of(key) if field), default=0.0
+            )
+            if score >= threshold:
+                results.append((key, score))
+        results.sort(key=lambda item: (-item[1], item[0]))
+        return results[:limit]
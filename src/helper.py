@@ -3,20 +3,30 @@ This module contains helper functions for the contact book application.
 
 Functions:
     parse_input(user_input): Parse the user input into a command and arguments.
-    main(): The main function of the contact book application.
+    run_command(book, command, args, ask): Execute a single command and record its latency.
+    dispatch_command(book, command, args, ask): Execute a single command.
+    execute(book, command, args, ask): Execute a command with its output captured.
+    run_script(lines): Run commands non-interactively and report their status.
+    run_client(client): Interactive loop that sends commands to the assistant server.
+    complete_argument(book, kind, prefix): Contact names, note titles or tags for the completer.
+    main(argv): The main function of the contact book application.
 
 This module imports the following modules:
-    re: Regular expression operations.
     pickle: Module for pickling objects.
     os: Module for operating system related functions.
-    prompt_toolkit: Module for command line interface.
+    prompt_toolkit: Module for command line interface (imported in interactive mode only).
     colorizer: Module for colored text output.
     validators: Module for validating input.
     contact_book: Module for contact book operations.
     birthday: Module for birthday operations.
     contact_book: Module for email operations.
     command_descrip: Module for displaying command descriptions.
-    notes_manager: Module for notes manager operations.
+    notes_manager: Module for notes manager operations (imported on the first notes command).
+    record_store: Module for the lazily loaded contact record store.
+    snapshot: Module for the contact book snapshot format.
+    contact_journal: Module for the journal of contact book changes.
+    sharded_store: Module for the contact book split into shard files.
+    metrics: Module for the command and I/O latency statistics.
 
 This module defines the following classes:
     AddressBook: Class representing a collection of contacts.
@@ -34,34 +44,51 @@ This module also defines the following functions:
     main(): The main function of the contact book application.
 
 This module also defines the following variables:
-    notes_manager: The notes manager object.
+    notes_manager: The notes manager object, None until the first notes command.
     COMMANDS: List of available commands.
-    command_completer: The command completer object.
 
 This module also defines the following constants:
     COMMANDS: List of available commands.
-    command_completer: The command completer object.
 
 
 
 """
 
 
-import re
+import argparse
+import io
+import json
 import pickle
 import os
-from prompt_toolkit import PromptSession
-from prompt_toolkit.completion import WordCompleter
-from prompt_toolkit.formatted_text import HTML
+import re
+import sys
+from contextlib import redirect_stdout
 from colorizer import Colorizer
-from validators import normalize_phone
-from contact_book import AddressBook, Record
+from validators import (
+    parse_phone,
+    is_valid_email,
+    is_valid_birthday,
+    PHONE_ARGUMENT_PATTERN,
+    BIRTHDAY_PATTERN,
+    EMAIL_PATTERN,
+)
+from contact_book import AddressBook, Record, record_from_fields
 from birthday import Birthday
 from contact_book import Email
 from command_descrip import command_help
-from notes_manager import NotesManager
-
-notes_manager = NotesManager()
+from sqlite_storage import open_book
+from record_store import open_record_store
+from sharded_store import DEFAULT_SHARDS, open_sharded_book
+from persistence import Autosaver
+from pagination import parse_page_args, print_pages
+from contact_book import CONTACT_FIELDS
+from importer import import_contacts
+from snapshot import MAGIC as SNAPSHOT_MAGIC, read_snapshot
+from contact_journal import ContactJournal, journal_file, open_journal
+from metrics import metrics, Timer
+
+# Notes are loaded on the first notes command, see get_notes_manager()
+notes_manager = None
 
 COMMANDS = [
     "help",
@@ -91,13 +118,23 @@ COMMANDS = [
     "del_email",
     "del_address",
     "find_contact",
+    "find_by_domain",
+    "import_contacts",
     "del_note",
     "find_note_by_title",
     "find_note_by_tag",
+    "search_notes",
     "show_all_notes",
+    "stats",
 ]
 
-command_completer = WordCompleter(COMMANDS, ignore_case=True)
+def get_notes_manager():
+    global notes_manager
+    if notes_manager is None:
+        from notes_manager import NotesManager
+
+        notes_manager = NotesManager()
+    return notes_manager
 
 
 def parse_input(user_input):
@@ -113,614 +150,1051 @@ def parse_input(user_input):
     return command, args
 
 
-def load_data(filename="contact_book.pkl"):
+# A .db/.sqlite file name switches the contact book to the SQLite backend,
+# a .rec file name to the lazily loaded record store and a .shards directory
+# name to shard files saved one by one (CONTACT_BOOK_SHARDS sets how many a
+# new one gets). Other files are snapshots (see snapshot.py); .pkl files of
+# older versions stay pickles.
+CONTACT_BOOK_FILE = os.environ.get("CONTACT_BOOK_FILE", "contact_book.snap")
+SNAPSHOT_FILE = "contact_book.snap"
+PICKLE_FILE = "contact_book.pkl"
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+RECORD_STORE_EXTENSIONS = (".rec",)
+SHARDED_EXTENSIONS = (".shards",)
+SHARD_COUNT = int(os.environ.get("CONTACT_BOOK_SHARDS", DEFAULT_SHARDS))
+
+
+def load_data(filename=CONTACT_BOOK_FILE, pickle_filename=PICKLE_FILE):
+    if filename.endswith(SQLITE_EXTENSIONS):
+        return open_book(filename)
+    if filename.endswith(RECORD_STORE_EXTENSIONS):
+        return open_record_store(filename)
+    if filename.endswith(SHARDED_EXTENSIONS):
+        # A new directory takes over the contacts of the snapshot or pickle
+        sources = (SNAPSHOT_FILE, pickle_filename) if pickle_filename else ()
+        return open_sharded_book(filename, sources, SHARD_COUNT)
     if not os.path.exists(filename):
-        address_book = AddressBook()
-        try:
-            with open(filename, "wb") as f:
-                pickle.dump(address_book, f)
-                return address_book
-        except Exception as e:
-            print(Colorizer.error(f"Error while creating the file: {e}"))
-    else:
-        try:
-            with open(filename, "rb") as f:
-                return pickle.load(f)
-        except Exception as e:
-            print(Colorizer.error(f"Error while reading the file: {e}"))
-            return None
-
-
-def save_data(book, filename="contact_book.pkl"):
-    with open(filename, "wb") as f:
-        pickle.dump(book, f)
-
-
-def main():
-    book = load_data()
-    session = PromptSession(completer=command_completer)
-    command_help()
-    print(Colorizer.info("Welcome to the assistant bot!"))
-
-    while True:
-        user_input = (
-            session.prompt(HTML("<ansicyan>Enter command: </ansicyan>")).strip().split()
-        )
-        command, args = parse_input(user_input)
-
-        if command in COMMANDS:
-            if command in ["close", "exit"]:
-                print(Colorizer.success("Good bye!"))
-                save_data(book)
-                break
-
-            elif command == "hello":  # HELLO #
-                print(Colorizer.success("How can I help you?"))
-
-            elif command == "add_contact":  # ADD #
-                if len(args) < 2:
+        migrate = pickle_filename and not filename.endswith(".pkl")
+        if migrate and os.path.exists(pickle_filename):
+            # First start after the switch to snapshots
+            address_book = load_data(pickle_filename, None)
+            if address_book is None:
+                return None
+            print(
+                Colorizer.info(
+                    f"Migrated {len(address_book)} contacts from {pickle_filename} to {filename}."
+                )
+            )
+        else:
+            address_book = AddressBook()
+        address_book.filename = filename
+        address_book.dirty = True
+        address_book.save_data()
+        if not filename.endswith(".pkl"):
+            address_book.journal = ContactJournal(journal_file(filename), filename)
+        return address_book
+    try:
+        with metrics.io_timer("contacts.load") as size, open(filename, "rb") as f:
+            size[0] = os.fstat(f.fileno()).st_size
+            if filename.endswith(".pkl"):
+                # Written by an older version; only files named so are unpickled
+                address_book = pickle.load(f)
+            else:
+                if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                    raise ValueError(f"{filename} is not a contact book snapshot.")
+                f.seek(0)
+                records = {fields[0]: fields for fields in read_snapshot(f)}
+                # Changes saved since the snapshot was written
+                journal = open_journal(records, filename)
+                address_book = AddressBook()
+                address_book.add_addresses(map(record_from_fields, records.values()))
+                address_book.dirty = False
+                address_book.journal = journal
+            address_book.filename = filename
+            return address_book
+    except Exception as e:
+        print(Colorizer.error(f"Error while reading the file: {e}"))
+        return None
+
+
+def save_data(book, filename=CONTACT_BOOK_FILE):
+    # Skipped when nothing changed; backends and record stores save themselves
+    book.save_data(filename)
+
+
+def save_all(book):
+    """Save the book and any pending note changes; used by the autosaver."""
+    save_data(book)
+    if notes_manager is not None:
+        notes_manager.flush()
+
+
+def note_arguments(args, prompts, ask=input):
+    """
+    Return one value per prompt for a notes command.
+
+    Inline arguments are separated with "|" (add_note Title | Content | tag1,tag2);
+    without them every value is asked for with a prompt.
+    """
+    if args:
+        values = " ".join(args).split("|", len(prompts) - 1)
+        values = [value.strip() for value in values]
+        return values + [""] * (len(prompts) - len(values))
+    return [ask(prompt).strip() for prompt in prompts]
+
+
+def run_command(book, command, args, ask=input):
+    """Execute one command and record how long it took. Returns False when the session should end."""
+    timer = Timer()
+
+    def timed_ask(prompt):
+        # Time spent waiting for the user is not part of the command
+        with timer.paused():
+            return ask(prompt)
+
+    try:
+        return dispatch_command(book, command, args, timed_ask)
+    except NeedsInput:
+        # The command runs again with the answer; only that run is recorded
+        timer = None
+        raise
+    finally:
+        if timer is not None:
+            metrics.record_command(command, timer.elapsed())
+
+
+def dispatch_command(book, command, args, ask=input):
+    """Execute one command. Returns False when the session should end."""
+    if command in ["close", "exit"]:
+        print(Colorizer.success("Good bye!"))
+        return False
+
+    elif command == "hello":  # HELLO #
+        print(Colorizer.success("How can I help you?"))
+
+    elif command == "add_contact":  # ADD #
+        if len(args) < 2:
+            print(
+                Colorizer.error(
+                    "Error: Input requires at least two arguments: name and phone."
+                )
+            )
+            return True
+
+        name = args[0]
+        phone = args[1]
+        phone2 = None
+        birthday = None
+        email = None
+        address = None
+
+        # Process additional arguments
+        for arg in args[2:]:
+            if PHONE_ARGUMENT_PATTERN.match(arg):  # check if it's a phone number
+                if not phone2:
+                    phone2 = arg  # set the second phone number
+                else:
                     print(
-                        Colorizer.error(
-                            "Error: Input requires at least two arguments: name and phone."
+                        Colorizer.warn(
+                            f"Warning: Ignoring additional phone number {arg}."
                         )
                     )
-                    continue
-
-                name = args[0]
-                phone = args[1]
-                phone2 = None
-                birthday = None
-                email = None
-                address = None
-
-                # Process additional arguments
-                for arg in args[2:]:
-                    if re.match(r"^\d{10,13}$", arg):  # check if it's a phone number
-                        if not phone2:
-                            phone2 = arg  # set the second phone number
-                        else:
-                            print(
-                                Colorizer.warning(
-                                    f"Warning: Ignoring additional phone number {arg}."
-                                )
-                            )
-                    elif re.match(
-                        r"\d{2}\.\d{2}\.\d{4}$", arg
-                    ):  # check if it's a birthday
-                        birthday = arg
-                    elif re.match(
-                        r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$", arg
-                    ):  # check if it's an email
-                        email = arg
-                    else:
-                        # Everything else is considered address
-                        if address is None:
-                            address = arg
-                        else:
-                            address += " " + arg
-
-                # Check if the phone number is valid
-                normalized_phone = normalize_phone(phone)
-                if isinstance(normalized_phone, str) and normalized_phone.startswith(
-                    "Invalid"
-                ):
-                    print(
-                        Colorizer.error(
-                            f"Error: Invalid phone number '{phone}'. Expected format: 10 to 13 digits."
-                        )
-                    )  # Show the error message
-                    continue  # Missing or invalid phone number
-                contact = book.find_address(name)
-                if contact:
-                    if normalized_phone:
-                        contact.phones.add_phone(
-                            normalized_phone
-                        )  # add the primary phone
-                        print(
-                            Colorizer.info(
-                                f"Phone number {normalized_phone} added to {name}."
-                            )
-                        )
-                    if phone2:
-                        normalized_phone2 = normalize_phone(phone2)
-                        if isinstance(
-                            normalized_phone2, str
-                        ) and not normalized_phone2.startswith("Invalid"):
-                            contact.phones.add_phone(
-                                normalized_phone2
-                            )  # Add the secondary phone
-                            print(
-                                Colorizer.info(
-                                    f"Phone number {normalized_phone2} added to {name}."
-                                )
-                            )
-                        else:
-                            print(
-                                Colorizer.warning(
-                                    f"Warning: Ignoring additional phone number {phone2}."
-                                )
-                            )
-                    if birthday:
-                        if re.match(
-                            r"^\d{2}\.\d{2}\.\d{4}$", birthday
-                        ):  # Check the format of the birthday
-                            contact.add_birthday(birthday)  # Add the birthday
-                            print(
-                                Colorizer.info(f"Birthday {birthday} added to {name}.")
-                            )
-                        else:
-                            print(
-                                Colorizer.error(
-                                    "Error: Invalid birthday format. Expected DD.MM.YYYY."
-                                )
-                            )
-                    if email:
-                        if re.match(
-                            r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$", email
-                        ):
-                            contact.add_email(email)
-                            print(Colorizer.info(f"Email {email} added to {name}."))
-                        else:
-                            print(
-                                Colorizer.error(
-                                    "Error: Invalid email format. Use email@domain.com."
-                                )
-                            )
-                        continue
-                    if address:
-                        contact.address = address  # Add the address if it exists
-                        print(Colorizer.info(f"Address {address} added to {name}."))
+            elif BIRTHDAY_PATTERN.match(arg):  # check if it's a birthday
+                birthday = arg
+            elif EMAIL_PATTERN.match(arg):  # check if it's an email
+                email = arg
+            else:
+                # Everything else is considered address
+                if address is None:
+                    address = arg
                 else:
-                    # Create a new record if the contact doesn't exist
-                    phones = [phone]
-                    if phone2:
-                        phones.append(
-                            phone2
-                        )  # Add the second phone number if it exists
-                    record = Record(
-                        name, phones, birthday, email, address
-                    )  # Given name, phones, birthday, email, address
-                    book.add_address(record)
+                    address += " " + arg
+
+        # Check if the phone number is valid
+        normalized_phone = parse_phone(phone).normalized
+        if not normalized_phone:
+            print(
+                Colorizer.error(
+                    f"Error: Invalid phone number '{phone}'. Expected format: 10 to 13 digits."
+                )
+            )  # Show the error message
+            return True  # Missing or invalid phone number
+        contact = book.find_address(name)
+        if contact:
+            if normalized_phone:
+                contact.phones.add_phone(
+                    normalized_phone
+                )  # add the primary phone
+                print(
+                    Colorizer.info(
+                        f"Phone number {normalized_phone} added to {name}."
+                    )
+                )
+            if phone2:
+                normalized_phone2 = parse_phone(phone2).normalized
+                if normalized_phone2:
+                    contact.phones.add_phone(
+                        normalized_phone2
+                    )  # Add the secondary phone
                     print(
                         Colorizer.info(
-                            f"New contact {name} added with phone number: {phone}, "
-                            f"second phone number: {phone2 if phone2 else 'N/A'}, "
-                            f"birthday: {birthday if birthday else 'N/A'}, "
-                            f"email: {email if email else 'N/A'}, "
-                            f"and address: {address if address else 'N/A'}."
+                            f"Phone number {normalized_phone2} added to {name}."
                         )
                     )
-
-            elif command == "change_name":
-
-                if len(args) < 2 or "|" not in " ".join(args):
-                    print(Colorizer.error("Error: Provide old name and new name."))
-                    continue
-                full_input = " ".join(args)
-                if "|" not in full_input:
-                    print(Colorizer.error("Error: Provide old name and new name."))
-                    continue
-                old_name, new_name = full_input.split("|", 1)
-                old_name = old_name.strip()
-                new_name = new_name.strip()
-
-                if old_name and new_name:
-                    book.change_name(old_name, new_name)
                 else:
                     print(
-                        Colorizer.error("Error: Provide both old name and new name.")
-                    )  # Change name
-
-            elif command == "change_phone":  # Change phone number
-                if len(args) < 3:
-                    print(
-                        Colorizer.error(
-                            "Error: Provide name, old phone, and new phone."
+                        Colorizer.warn(
+                            f"Warning: Ignoring additional phone number {phone2}."
                         )
                     )
-                else:
-                    name, old_phone, new_phone = args
-                    contact = book.find_address(name)
-                    if contact:
-                        # Normalize the new phone number
-                        normalized_new_phone = normalize_phone(new_phone)
-
-                        if contact.phones.edit_phone(old_phone, normalized_new_phone):
-                            print(
-                                Colorizer.info(
-                                    f"Phone number changed from {old_phone} to {normalized_new_phone} for {name}."
-                                )
-                            )
-                        else:
-                            print(
-                                Colorizer.info(
-                                    f"Phone number {old_phone} not found for {name}."
-                                )
-                            )
-                    else:
-                        print(Colorizer.error(f"Error: Contact '{name}' not found."))
-
-            elif command == "show_phone":  # Find phone number
-                if not args:
-                    print(Colorizer.error("Error: Provide a name."))
-                else:
-                    name = args[0]
-                    contact = book.find_address(name)
-                    if contact:
-                        print(
-                            Colorizer.info(
-                                f"{name}'s phone numbers: {', '.join(contact.phones.value)}"
-                            )
-                        )
-                    else:
-                        print(Colorizer.error(f"Error: Contact '{name}' not found."))
-
-            elif command == "del_phone":  # Delete phone number from contact
-                try:
-                    name = args[0]
-                    phone_number = args[
-                        1
-                    ]  # Use the second argument as the phone number
-                    if not name or not phone_number:
-                        print(
-                            Colorizer.error(
-                                "Error: Both contact name and phone number are required."
-                            )
-                        )
-                        continue
-                except IndexError:
+            if birthday:
+                if is_valid_birthday(birthday):  # Check the format of the birthday
+                    contact.add_birthday(birthday)  # Add the birthday
                     print(
-                        Colorizer.error(
-                            "Error: Both contact name and phone number are required."
-                        )
-                    )
-                    continue
-                if book.delete_phone(name, phone_number):
-                    print(
-                        Colorizer.info(
-                            f"Phone number '{phone_number}' deleted from contact '{name}'."
-                        )
+                        Colorizer.info(f"Birthday {birthday} added to {name}.")
                     )
                 else:
                     print(
                         Colorizer.error(
-                            f"Error: Contact '{name}' or phone number '{phone_number}' not found."
+                            "Error: Invalid birthday format. Expected DD.MM.YYYY."
                         )
                     )
-
-            elif command == "show_all_contacts":
-                if not book.data:
-                    print(Colorizer.info("No contacts found."))
-                else:
-                    for contact in book.values():
-                        print(Colorizer.info(contact))
-
-            elif command == "del_contact":  # Delete contact
-                if not args:
-                    print(Colorizer.error("Error: Input the contact name to delete."))
-                    continue
-                name = args[0]
-                if book.delete_contact(name):
-                    print(Colorizer.info(f"Contact '{name}' deleted."))
+            if email:
+                if is_valid_email(email):
+                    contact.add_email(email)
+                    print(Colorizer.info(f"Email {email} added to {name}."))
                 else:
-                    print(Colorizer.error(f"Error: Contact '{name}' not found."))
-
-            elif command == "add_birthday":  # Add birthday
-                if not args or len(args) < 2:
-                    print(Colorizer.error("Error: Input name and birthday."))
-                    continue
-                name, birthday = args[0], args[1]
-                contact = book.find_address(name)
-                if contact:
-                    # check birthday format
-                    if re.match(r"\d{2}\.\d{2}\.\d{4}$", birthday):
-                        Birthday.add_birthday_to_contact(contact, birthday)
-                        print(Colorizer.info(f"Birthday {birthday} added to {name}."))
-                    else:
-                        print(
-                            Colorizer.error(
-                                f"Error: Invalid birthday format. Expected DD.MM.YYYY."
-                            )
-                        )
-                else:
-                    print(Colorizer.error(f"Error: Contact '{name}' not found."))
-
-            elif command == "show_birthday":  # Show birthday
-                if not args:
-                    print(Colorizer.error("Error:Input a name."))
-                    continue
-                name = args[0]
-                contact = book.find_address(name)
-                if contact:
-                    print(Colorizer.info(Birthday.show_birthday_of_contact(contact)))
-                else:
-                    print(Colorizer.error(f"Error: Contact '{name}' not found."))
-
-            elif command == "change_birthday":  # Change birthday
-                if not args:
-                    print(Colorizer.error("Error: Input a name and new birthday."))
-                    continue
-                name = args[0]
-                if len(args) < 2:
                     print(
                         Colorizer.error(
-                            "Error: You must provide a new birthday in the format DD.MM.YYYY."
+                            "Error: Invalid email format. Use email@domain.com."
                         )
                     )
-                    continue
-                new_birthday = args[1]
+                return True
+            if address:
+                contact.add_address(address)  # Add the address if it exists
+                print(Colorizer.info(f"Address {address} added to {name}."))
+        else:
+            # Create a new record if the contact doesn't exist
+            phones = [phone]
+            if phone2:
+                phones.append(
+                    phone2
+                )  # Add the second phone number if it exists
+            record = Record(
+                name, phones, birthday, email, address
+            )  # Given name, phones, birthday, email, address
+            book.add_address(record)
+            print(
+                Colorizer.info(
+                    f"New contact {name} added with phone number: {phone}, "
+                    f"second phone number: {phone2 if phone2 else 'N/A'}, "
+                    f"birthday: {birthday if birthday else 'N/A'}, "
+                    f"email: {email if email else 'N/A'}, "
+                    f"and address: {address if address else 'N/A'}."
+                )
+            )
+
+    elif command == "change_name":
+
+        if len(args) < 2 or "|" not in " ".join(args):
+            print(Colorizer.error("Error: Provide old name and new name."))
+            return True
+        full_input = " ".join(args)
+        if "|" not in full_input:
+            print(Colorizer.error("Error: Provide old name and new name."))
+            return True
+        old_name, new_name = full_input.split("|", 1)
+        old_name = old_name.strip()
+        new_name = new_name.strip()
+
+        if old_name and new_name:
+            book.change_name(old_name, new_name)
+        else:
+            print(
+                Colorizer.error("Error: Provide both old name and new name.")
+            )  # Change name
+
+    elif command == "change_phone":  # Change phone number
+        if len(args) < 3:
+            print(
+                Colorizer.error(
+                    "Error: Provide name, old phone, and new phone."
+                )
+            )
+        else:
+            name, old_phone, new_phone = args
+            contact = book.find_address(name)
+            if contact:
+                # Normalize the new phone number
+                normalized_new_phone = parse_phone(new_phone).normalized
 
-                # Validate the new birthday format
-                if not re.match(r"^\d{2}\.\d{2}\.\d{4}$", new_birthday):
+                if not normalized_new_phone:
                     print(
                         Colorizer.error(
-                            "Error: Invalid birthday format. Expected DD.MM.YYYY."
+                            f"Error: Invalid phone number '{new_phone}'. Expected format: 10 to 13 digits."
                         )
                     )
-                    continue
-
-                contact = book.find_address(name)
-                if contact:
-                    contact.add_birthday(
-                        new_birthday
-                    )  # Replace the old birthday with the new one
+                elif contact.phones.edit_phone(old_phone, normalized_new_phone):
                     print(
-                        Colorizer.info(f"Birthday of {name} changed to {new_birthday}.")
-                    )
-                else:
-                    print(Colorizer.error(f"Error: Contact '{name}' not found."))
-
-            elif command == "show_upcoming_birthdays":
-                if len(args) < 1:
-
-                    print(Colorizer.error("Please specify the number of days after the command."))
-                else:
-                    try:
-                        days_ahead = int(args[0])
-                        upcoming_birthdays = Birthday.get_upcoming_birthdays(
-                            book, days_ahead
-                        )
-                        if upcoming_birthdays:
-                            print(Colorizer.info("Upcoming birthdays:"))
-                            for ub in upcoming_birthdays:
-                                print(Colorizer.info(f'{ub["name"]} on {ub["congratulation_date"]}.'))
-                        else:
-                            print(Colorizer.info(
-                                f"There are no upcoming birthdays in the next {days_ahead} days."
-                            ))
-                    except ValueError:
-
-                        print(Colorizer.error("Please specify a valid number of days."))
-
-            elif command == "del_birthday":
-                if not args:
-                    print(Colorizer.error("Input a name."))
-                    continue
-                name = args[0]
-                contact = book.find_address(name)
-                if contact:
-                    if contact.birthday:
-                        book.delete_birthday(name)
-                        print(Colorizer.info(f"Birthday of {name} deleted."))
-                    else:
-                        print(
-                            Colorizer.error(f"Error: No birthday to remove for {name}.")
-                        )
-                else:
-                    print(Colorizer.error(f"Error: Contact '{name}' not found."))
-
-            elif command == "add_email":
-                if not args or len(args) < 2:
-                    print(Colorizer.error("Error: Input name and email."))
-                    continue
-                name, email = args[0], args[1]
-                contact = book.find_address(name)
-                if contact:
-                    if re.match(
-                        r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$", email
-                    ):
-                        contact.add_email(email)
-                    else:
-                        print(
-                            Colorizer.error(
-                                "Error: Invalid email format. Use email@domain.com"
-                            )
+                        Colorizer.info(
+                            f"Phone number changed from {old_phone} to {normalized_new_phone} for {name}."
                         )
-
-            elif command == "show_email":  # Show email
-                if not args:
-                    print(Colorizer.error("Error:Input a name."))
-                    continue
-                name = args[0]
-                contact = book.find_address(name)
-                if contact:
-                    print(Colorizer.info(Email.find_email(contact)))
+                    )
                 else:
-                    print(Colorizer.error(f"Error: Contact '{name}' not found."))
-
-            elif command == "change_email":
-                if not args:
-                    print(Colorizer.error("Error: Input name and email."))
-                    continue
-                name = args[0]
-                if len(args) < 2:
                     print(
-                        Colorizer.error(
-                            "Error: You must provide a new email. Use email@domain.com"
+                        Colorizer.info(
+                            f"Phone number {old_phone} not found for {name}."
                         )
                     )
-                    continue
-                new_email = args[1]
-                contact = book.find_address(name)
-                if contact:
-                    if re.match(
-                        r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$", new_email
-                    ):
-                        contact.add_email(new_email)
-                    else:
-                        print(
-                            Colorizer.error(
-                                "Error: Invalid email format. Use email@domain.com"
-                            )
-                        )
+            else:
+                print(Colorizer.error(f"Error: Contact '{name}' not found."))
 
-            elif command == "del_email":  # Delete email
-                if not args:
-                    print(Colorizer.error("Error: Input name and email."))
-                    continue
-                name = args[0]
-                contact = book.find_address(name)
-                if contact:
-                    if Email.remove_email(contact):
-                        print(Colorizer.info(f"Email for {name} deleted."))
-                    else:
-                        print(Colorizer.error(f"Error: No email found for {name}"))
-                else:
-                    print(Colorizer.error(f"Error: Contact '{name}' not found."))
-
-            elif command == "add_address":
-                if not args or len(args) < 2:
-                    print(Colorizer.error("Error: Input name and address."))
-                    continue
-                name = args[0]
-                address = " ".join(args[1:]).strip()
-                contact = book.find_address(name)
-                if contact:
-                    contact.add_address(address)  # Add the address
-                    print(Colorizer.info(f"Address '{address}' added to '{name}'."))
-                else:
-                    print(Colorizer.error(f"Error: Contact '{name}' not found."))
-
-            elif command == "show_address":  # Show email
-                if not args:
-                    print(Colorizer.error("Error:Input a name."))
-                    continue
-                name = args[0]
-                contact = book.find_address(name)
-                if contact:
-                    if contact.address:
-                        print(Colorizer.info(f"Address for {name}: {contact.address}"))
-                    else:
-                        print(
-                            Colorizer.error(f"Error: Contact '{name}' has no address.")
-                        )
-                else:
-                    print(Colorizer.error(f"Error: Contact '{name}' not found."))
+    elif command == "show_phone":  # Find phone number
+        if not args:
+            print(Colorizer.error("Error: Provide a name."))
+        else:
+            name = args[0]
+            contact = book.find_address(name)
+            if contact:
+                print(
+                    Colorizer.info(
+                        f"{name}'s phone numbers: {', '.join(contact.phones.value)}"
+                    )
+                )
+            else:
+                print(Colorizer.error(f"Error: Contact '{name}' not found."))
 
-            elif command == "change_address":  # Change address
-                if len(args) < 3 or "|" not in args:
-                    print(
-                        Colorizer.error(
-                            "Error: Provide name, old address, |, and new address."
-                        )
+    elif command == "del_phone":  # Delete phone number from contact
+        try:
+            name = args[0]
+            phone_number = args[
+                1
+            ]  # Use the second argument as the phone number
+            if not name or not phone_number:
+                print(
+                    Colorizer.error(
+                        "Error: Both contact name and phone number are required."
                     )
-                    continue
-                separator_index = args.index("|")
-                name = args[0]
-                old_address = " ".join(args[1:separator_index])
-                new_address = " ".join(args[separator_index + 1 :])
-                contact = book.find_address(name)
-                if contact:
-                    if (
-                        contact.address == old_address
-                    ):  # Check if the old address matches
-                        contact.address = new_address  # Change the address
-                        print(
-                            Colorizer.info(
-                                f"Address changed from '{old_address}' to '{new_address}' for {name}."
-                            )
-                        )
-                    else:
-                        print(
-                            Colorizer.error(
-                                f"Error: Old address '{old_address}' not found for {name}."
-                            )
-                        )
-                else:
-                    print(Colorizer.error(f"Error: Contact '{name}' not found."))
-
-            elif command == "del_address":
-                if not args:
-                    print(Colorizer.error("Error: Input a name."))
-                    continue
-                name = args[0]
-                contact = book.find_address(name)
-                if contact:
-                    contact.delete_address()
-                else:
-                    print(Colorizer.error(f"Error: Contact '{name}' not found."))
+                )
+                return True
+        except IndexError:
+            print(
+                Colorizer.error(
+                    "Error: Both contact name and phone number are required."
+                )
+            )
+            return True
+        if book.delete_phone(name, phone_number):
+            print(
+                Colorizer.info(
+                    f"Phone number '{phone_number}' deleted from contact '{name}'."
+                )
+            )
+        else:
+            print(
+                Colorizer.error(
+                    f"Error: Contact '{name}' or phone number '{phone_number}' not found."
+                )
+            )
 
-            elif command == "find_contact":
-                if not args:
-                    print(Colorizer.error("Error: Provide a name or phone number."))
-                    continue
+    elif command == "show_all_contacts":
+        try:
+            page_size, offset = parse_page_args(args)
+        except ValueError:
+            print(Colorizer.error("Error: Use show_all_contacts [page_size] [offset]."))
+            return True
+        if not book.data:
+            print(Colorizer.info("No contacts found."))
+        elif not print_pages(
+            CONTACT_FIELDS,
+            book.iter_rows(),
+            page_size,
+            offset,
+            "show_all_contacts",
+        ):
+            print(Colorizer.info("No contacts on this page."))
+
+    elif command == "del_contact":  # Delete contact
+        if not args:
+            print(Colorizer.error("Error: Input the contact name to delete."))
+            return True
+        name = args[0]
+        if book.delete_contact(name):
+            print(Colorizer.info(f"Contact '{name}' deleted."))
+        else:
+            print(Colorizer.error(f"Error: Contact '{name}' not found."))
+
+    elif command == "add_birthday":  # Add birthday
+        if not args or len(args) < 2:
+            print(Colorizer.error("Error: Input name and birthday."))
+            return True
+        name, birthday = args[0], args[1]
+        contact = book.find_address(name)
+        if contact:
+            # check birthday format
+            if is_valid_birthday(birthday):
+                Birthday.add_birthday_to_contact(contact, birthday)
+                print(Colorizer.info(f"Birthday {birthday} added to {name}."))
+            else:
+                print(
+                    Colorizer.error(
+                        f"Error: Invalid birthday format. Expected DD.MM.YYYY."
+                    )
+                )
+        else:
+            print(Colorizer.error(f"Error: Contact '{name}' not found."))
+
+    elif command == "show_birthday":  # Show birthday
+        if not args:
+            print(Colorizer.error("Error:Input a name."))
+            return True
+        name = args[0]
+        contact = book.find_address(name)
+        if contact:
+            print(Colorizer.info(Birthday.show_birthday_of_contact(contact)))
+        else:
+            print(Colorizer.error(f"Error: Contact '{name}' not found."))
+
+    elif command == "change_birthday":  # Change birthday
+        if not args:
+            print(Colorizer.error("Error: Input a name and new birthday."))
+            return True
+        name = args[0]
+        if len(args) < 2:
+            print(
+                Colorizer.error(
+                    "Error: You must provide a new birthday in the format DD.MM.YYYY."
+                )
+            )
+            return True
+        new_birthday = args[1]
+
+        # Validate the new birthday format
+        if not is_valid_birthday(new_birthday):
+            print(
+                Colorizer.error(
+                    "Error: Invalid birthday format. Expected DD.MM.YYYY."
+                )
+            )
+            return True
+
+        contact = book.find_address(name)
+        if contact:
+            contact.add_birthday(
+                new_birthday
+            )  # Replace the old birthday with the new one
+            print(
+                Colorizer.info(f"Birthday of {name} changed to {new_birthday}.")
+            )
+        else:
+            print(Colorizer.error(f"Error: Contact '{name}' not found."))
 
-                search_term = args[0]
-                contact = book.find_address(search_term)
+    elif command == "show_upcoming_birthdays":
+        if len(args) < 1:
 
-                if contact:
-                    print(Colorizer.info(f"Found contact: {contact}"))
+            print(Colorizer.error("Please specify the number of days after the command."))
+        else:
+            try:
+                days_ahead = int(args[0])
+                upcoming_birthdays = Birthday.get_upcoming_birthdays(
+                    book, days_ahead
+                )
+                if upcoming_birthdays:
+                    print(Colorizer.info("Upcoming birthdays:"))
+                    for ub in upcoming_birthdays:
+                        print(Colorizer.info(f'{ub["name"]} on {ub["congratulation_date"]}.'))
                 else:
-                    print(
-                        Colorizer.error(
-                            f"Error: No contact found with '{search_term}'."
-                        )
+                    print(Colorizer.info(
+                        f"There are no upcoming birthdays in the next {days_ahead} days."
+                    ))
+            except ValueError:
+
+                print(Colorizer.error("Please specify a valid number of days."))
+
+    elif command == "del_birthday":
+        if not args:
+            print(Colorizer.error("Input a name."))
+            return True
+        name = args[0]
+        contact = book.find_address(name)
+        if contact:
+            if contact.birthday:
+                book.delete_birthday(name)
+                print(Colorizer.info(f"Birthday of {name} deleted."))
+            else:
+                print(
+                    Colorizer.error(f"Error: No birthday to remove for {name}.")
+                )
+        else:
+            print(Colorizer.error(f"Error: Contact '{name}' not found."))
+
+    elif command == "add_email":
+        if not args or len(args) < 2:
+            print(Colorizer.error("Error: Input name and email."))
+            return True
+        name, email = args[0], args[1]
+        contact = book.find_address(name)
+        if contact:
+            if is_valid_email(email):
+                contact.add_email(email)
+            else:
+                print(
+                    Colorizer.error(
+                        "Error: Invalid email format. Use email@domain.com"
                     )
-
-            elif command == "help":
-                command_help()
-
-            elif command == "add_note":
-                title = input("Input the title of the note: ").strip()
-                content = input("Input the content of the note: ")
-                tags_input = input("Input tags separated by commas: ").strip()
-                tags = tags_input.split(",") if tags_input else None
-                notes_manager.add_note(title, content, tags)
-
-            elif command == "change_note":
-                title = input("Enter the title of the note to edit: ").strip()
-                field = (
-                    input("Enter the field to edit (title/content/tags): ")
-                    .strip()
-                    .lower()
                 )
 
-                if field in ["title", "content", "tags"]:
-                    new_value = input(f"Enter the new value for {field}: ").strip()
-                    if field == "tags":
-                        new_value = new_value.split(",") if new_value else None
-                    notes_manager.edit_note(title, field, new_value)
-                else:
-                    print(
-                        Colorizer.error(
-                            "Invalid field. Choose from 'title', 'content', or 'tags'."
-                        )
+    elif command == "show_email":  # Show email
+        if not args:
+            print(Colorizer.error("Error:Input a name."))
+            return True
+        name = args[0]
+        contact = book.find_address(name)
+        if contact:
+            print(Colorizer.info(Email.find_email(contact)))
+        else:
+            print(Colorizer.error(f"Error: Contact '{name}' not found."))
+
+    elif command == "change_email":
+        if not args:
+            print(Colorizer.error("Error: Input name and email."))
+            return True
+        name = args[0]
+        if len(args) < 2:
+            print(
+                Colorizer.error(
+                    "Error: You must provide a new email. Use email@domain.com"
+                )
+            )
+            return True
+        new_email = args[1]
+        contact = book.find_address(name)
+        if contact:
+            if is_valid_email(new_email):
+                contact.add_email(new_email)
+            else:
+                print(
+                    Colorizer.error(
+                        "Error: Invalid email format. Use email@domain.com"
                     )
+                )
 
-            elif command == "show_all_notes":
-                notes_manager.display_all_notes()
+    elif command == "del_email":  # Delete email
+        if not args:
+            print(Colorizer.error("Error: Input name and email."))
+            return True
+        name = args[0]
+        contact = book.find_address(name)
+        if contact:
+            if Email.remove_email(contact):
+                print(Colorizer.info(f"Email for {name} deleted."))
+            else:
+                print(Colorizer.error(f"Error: No email found for {name}"))
+        else:
+            print(Colorizer.error(f"Error: Contact '{name}' not found."))
+
+    elif command == "add_address":
+        if not args or len(args) < 2:
+            print(Colorizer.error("Error: Input name and address."))
+            return True
+        name = args[0]
+        address = " ".join(args[1:]).strip()
+        contact = book.find_address(name)
+        if contact:
+            contact.add_address(address)  # Add the address
+            print(Colorizer.info(f"Address '{address}' added to '{name}'."))
+        else:
+            print(Colorizer.error(f"Error: Contact '{name}' not found."))
+
+    elif command == "show_address":  # Show email
+        if not args:
+            print(Colorizer.error("Error:Input a name."))
+            return True
+        name = args[0]
+        contact = book.find_address(name)
+        if contact:
+            if contact.address:
+                print(Colorizer.info(f"Address for {name}: {contact.address}"))
+            else:
+                print(
+                    Colorizer.error(f"Error: Contact '{name}' has no address.")
+                )
+        else:
+            print(Colorizer.error(f"Error: Contact '{name}' not found."))
 
-            elif command == "find_note_by_title":
-                title = input("Enter the title of the note to find: ").strip()
-                note = notes_manager.find_note_by_title(title)
-                if note:
-                    print(
-                        Colorizer.info(
-                            f"Title: {note.title}\nContent: {note.content}\nTags: {', '.join(note.tags) if note.tags else 'No tags'}"
-                        )
+    elif command == "change_address":  # Change address
+        if len(args) < 3 or "|" not in args:
+            print(
+                Colorizer.error(
+                    "Error: Provide name, old address, |, and new address."
+                )
+            )
+            return True
+        separator_index = args.index("|")
+        name = args[0]
+        old_address = " ".join(args[1:separator_index])
+        new_address = " ".join(args[separator_index + 1 :])
+        contact = book.find_address(name)
+        if contact:
+            if (
+                contact.address == old_address
+            ):  # Check if the old address matches
+                contact.add_address(new_address)  # Change the address
+                print(
+                    Colorizer.info(
+                        f"Address changed from '{old_address}' to '{new_address}' for {name}."
                     )
+                )
+            else:
+                print(
+                    Colorizer.error(
+                        f"Error: Old address '{old_address}' not found for {name}."
+                    )
+                )
+        else:
+            print(Colorizer.error(f"Error: Contact '{name}' not found."))
+
+    elif command == "del_address":
+        if not args:
+            print(Colorizer.error("Error: Input a name."))
+            return True
+        name = args[0]
+        contact = book.find_address(name)
+        if contact:
+            contact.delete_address()
+        else:
+            print(Colorizer.error(f"Error: Contact '{name}' not found."))
+
+    elif command == "find_contact":
+        fuzzy = "--fuzzy" in args
+        args = [arg for arg in args if arg != "--fuzzy"]
+        if not args:
+            print(Colorizer.error("Error: Provide a name, phone number or email."))
+            return True
+
+        if fuzzy:
+            query = " ".join(args)
+            matches = book.find_similar(query)
+            if not matches:
+                print(Colorizer.info(f"No contact similar to '{query}'."))
+                return True
+            print(Colorizer.info(f"Contacts similar to '{query}':"))
+            for contact, score in matches:
+                print(Colorizer.info(f"{score:.2f}  {contact}"))
+            return True
+
+        search_term = args[0]
+        contact = book.find_address(search_term)
+
+        if contact:
+            print(Colorizer.info(f"Found contact: {contact}"))
+        else:
+            print(Colorizer.info(f"No contact found with '{search_term}'."))
+
+    elif command == "find_by_domain":
+        usage = "Error: Use find_by_domain [domain] [page_size] [offset]."
+        if not args:
+            print(Colorizer.error(usage))
+            return True
+        try:
+            page_size, offset = parse_page_args(args[1:])
+        except ValueError:
+            print(Colorizer.error(usage))
+            return True
+        domain = args[0]
+        contacts = book.find_by_domain(domain)
+        if not contacts:
+            print(Colorizer.info(f"No contacts with an email at '{domain}'."))
+        elif not print_pages(
+            CONTACT_FIELDS,
+            (contact.as_row() for contact in contacts),
+            page_size,
+            offset,
+            f"find_by_domain {domain}",
+        ):
+            print(Colorizer.info("No contacts on this page."))
+
+    elif command == "import_contacts":
+        if not args:
+            print(Colorizer.error("Error: Provide a CSV or vCard file to import."))
+            return True
+        filename = " ".join(args)
+        try:
+            imported, rejected, error_file = import_contacts(book, filename)
+        except (OSError, UnicodeDecodeError) as e:
+            print(Colorizer.error(f"Error while reading the file: {e}"))
+            return True
+        save_data(book)
+        print(Colorizer.success(f"Imported {imported} contacts from {filename}."))
+        if rejected:
+            print(
+                Colorizer.warn(
+                    f"{rejected} rows were rejected, see {error_file} for details."
+                )
+            )
+
+    elif command == "help":
+        command_help()
+
+    elif command == "add_note":
+        title, content, tags_input = note_arguments(
+            args,
+            [
+                "Input the title of the note: ",
+                "Input the content of the note: ",
+                "Input tags separated by commas: ",
+            ],
+            ask,
+        )
+        tags = tags_input.split(",") if tags_input else None
+        get_notes_manager().add_note(title, content, tags)
+
+    elif command == "change_note":
+        if args:
+            title, field, new_value = note_arguments(args, ["", "", ""])
+        else:
+            title = ask("Enter the title of the note to edit: ").strip()
+            field = ask("Enter the field to edit (title/content/tags): ").strip()
+            new_value = None
+        field = field.lower()
+
+        if field in ["title", "content", "tags"]:
+            if new_value is None:
+                new_value = ask(f"Enter the new value for {field}: ").strip()
+            if field == "tags":
+                new_value = new_value.split(",") if new_value else None
+            get_notes_manager().edit_note(title, field, new_value)
+        else:
+            print(
+                Colorizer.error(
+                    "Invalid field. Choose from 'title', 'content', or 'tags'."
+                )
+            )
+
+    elif command == "show_all_notes":
+        try:
+            page_size, offset = parse_page_args(args)
+        except ValueError:
+            print(Colorizer.error("Error: Use show_all_notes [page_size] [offset]."))
+            return True
+        get_notes_manager().display_all_notes(page_size, offset)
+
+    elif command == "find_note_by_title":
+        (title,) = note_arguments(args, ["Enter the title of the note to find: "], ask)
+        note = get_notes_manager().find_note_by_title(title)
+        if note:
+            print(
+                Colorizer.info(
+                    f"Title: {note.title}\nContent: {note.content}\nTags: {', '.join(note.tags) if note.tags else 'No tags'}"
+                )
+            )
+
+    elif command == "find_note_by_tag":
+        (tag,) = note_arguments(args, ["Enter the tag to search for notes: "], ask)
+        tag = tag.lower()
+        get_notes_manager().find_notes_by_tag(tag)
+
+    elif command == "search_notes":
+        query = " ".join(args).strip()
+        if not query:
+            query = ask("Enter words to search for in notes: ").strip()
+        if query:
+            get_notes_manager().search_notes(query)
+        else:
+            print(Colorizer.error("Error: Provide words to search for."))
+
+    elif command == "del_note":
+        (title,) = note_arguments(args, ["Enter the title of the note to delete: "], ask)
+        get_notes_manager().delete_note_by_title(title)
+
+    elif command == "stats":
+        if args and args[0].lower() == "reset":
+            metrics.clear()
+            print(Colorizer.success("Statistics cleared."))
+        else:
+            print(metrics.report() or Colorizer.info("No statistics yet."))
+
+    return True
+
+
+def close_session(book):
+    # The notes are closed even if the contact book could not be
+    try:
+        save_data(book)
+        if book.backend is not None:
+            book.backend.close()
+        book.close()
+    finally:
+        if notes_manager is not None:
+            notes_manager.close()
+
+
+ANSI_PATTERN = re.compile(r"\x1b\[[0-9;]*m")
 
-            elif command == "find_note_by_tag":
-                tag = input("Enter the tag to search for notes: ").strip().lower()
-                notes_manager.find_notes_by_tag(tag)
 
-            elif command == "del_note":
-                title = input("Enter the title of the note to delete: ").strip()
-                notes_manager.delete_note_by_title(title)
+class NeedsInput(Exception):
+    """Raised by an `ask` function that has no answer for a prompt."""
 
+    def __init__(self, prompt):
+        super().__init__(prompt)
+        self.prompt = prompt.strip()
+
+
+def _no_prompt(prompt):
+    raise NeedsInput(prompt)
+
+
+def execute(book, command, args, ask=_no_prompt):
+    """
+    Run one command with its output captured.
+
+    Returns (keep_going, status, output). status is "error" when the command
+    printed an error or raised, and "input" when `ask` raised NeedsInput; the
+    output is then the unanswered prompt. Colour codes are kept. A search or
+    listing that finds nothing is not an error, it reports so as info.
+    """
+    buffer = io.StringIO()
+    keep_going = True
+    with redirect_stdout(buffer):
+        if command is None:
+            print(Colorizer.error("Error: Invalid command."))
         else:
-            print(Colorizer.error("Error: Invalid command. Please try again."))
+            try:
+                keep_going = run_command(book, command, args, ask=ask)
+            except NeedsInput as e:
+                return True, "input", e.prompt
+            except Exception as e:
+                print(Colorizer.error(f"Error: {e}"))
+    output = buffer.getvalue()
+    return keep_going, "error" if Colorizer.ERROR in output else "ok", output
+
+
+def run_script(lines, out=sys.stdout, client=None):
+    """
+    Run commands non-interactively, one per line, and return the number of
+    failed commands.
+
+    Every command is reported on `out` as one JSON line:
+    {"line": 3, "command": "add_contact", "status": "ok", "output": "..."}
+    A command fails when it prints an error or raises. Empty lines and lines
+    starting with "#" are skipped. With a client the commands run in the
+    assistant server; otherwise the book and notes are saved once at the end.
+    """
+    book = None
+    if client is None:
+        # Loading messages must not mix with the JSON report
+        with redirect_stdout(sys.stderr):
+            book = load_data()
+    failed = 0
+
+    for line_number, line in enumerate(lines, 1):
+        user_input = line.strip().split()
+        if not user_input or user_input[0].startswith("#"):
+            continue
+        command, args = parse_input(user_input)
+
+        if client is None or command is None:
+            keep_going, status, output = execute(book, command, args)
+        else:
+            response = client.request(command, args)
+            keep_going = command not in ["close", "exit"]
+            status, output = response["status"], response.get("output", "")
+            if status == "input":
+                output = response["prompt"]
+        if status == "input":
+            status = "error"
+            output = f"Error: No inline arguments for '{output}'"
+        if status == "error":
+            failed += 1
+
+        report = {
+            "line": line_number,
+            "command": user_input[0],
+            "status": status,
+            "output": ANSI_PATTERN.sub("", output).strip(),
+        }
+        out.write(json.dumps(report, ensure_ascii=False) + "\n")
+        if not keep_going:
+            break
+
+    if book is not None:
+        with redirect_stdout(sys.stderr):
+            close_session(book)
+    return failed
+
+
+def complete_argument(book, kind, prefix):
+    """Return the values of kind "contact", "note" or "tag" starting with `prefix`."""
+    # Loading the notes may print a message, which must not land in the prompt
+    with redirect_stdout(io.StringIO()):
+        if kind == "contact":
+            return book.complete_names(prefix)
+        if kind == "note":
+            return get_notes_manager().complete_titles(prefix)
+        if kind == "tag":
+            return get_notes_manager().complete_tags(prefix)
+    return []
+
+
+def prompt_session(lookup=None):
+    """
+    Build the prompt and greet the user. `lookup(kind, prefix)` provides the
+    contact names, note titles and tags the prompt completes.
+    """
+    # prompt_toolkit is only needed in interactive mode
+    from prompt_toolkit import PromptSession
+    from completer import ArgumentCompleter
+
+    session = PromptSession(completer=ArgumentCompleter(COMMANDS, lookup))
+    print(Colorizer.info("Welcome to the assistant bot!"))
+    print(Colorizer.info("Type 'help' to see the list of commands."))
+    return session
+
+
+def read_command(session):
+    from prompt_toolkit.formatted_text import HTML
+
+    user_input = session.prompt(HTML("<ansicyan>Enter command: </ansicyan>"))
+    return parse_input(user_input.strip().split())
+
+
+def start_session():
+    """Load the book and build the prompt; everything that runs before the first prompt."""
+    book = load_data()
+    return book, prompt_session(lambda kind, prefix: complete_argument(book, kind, prefix))
+
+
+def run_client(client):
+    """Interactive loop of a thin client; commands run in the assistant server."""
+    session = prompt_session(client.complete)
+    try:
+        while True:
+            command, args = read_command(session)
+            if command is None:
+                print(Colorizer.error("Error: Invalid command. Please try again."))
+                continue
+            response = client.run(command, args)
+            sys.stdout.write(response["output"])
+            if command in ["close", "exit"]:
+                break
+    finally:
+        client.close()
+
+
+def dump_stats(filename, client=None):
+    if not filename:
+        return
+    if client is not None:
+        # The commands ran in the server, which keeps the statistics
+        print(
+            Colorizer.warn(
+                "Statistics are kept by the assistant server: start it with --serve --stats FILE."
+            ),
+            file=sys.stderr,
+        )
+        return
+    try:
+        metrics.dump(filename)
+    except OSError as e:
+        print(Colorizer.error(f"Error while writing statistics: {e}"), file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="personal-assistant")
+    parser.add_argument(
+        "--script",
+        metavar="FILE",
+        help="run commands from FILE ('-' for stdin) without the interactive prompt",
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="run the assistant server in the foreground",
+    )
+    parser.add_argument(
+        "--http",
+        type=int,
+        metavar="PORT",
+        help="with --serve, also serve the JSON-RPC API on this port",
+    )
+    parser.add_argument(
+        "--stats",
+        metavar="FILE",
+        help="write command and I/O latency statistics to FILE as JSON on exit",
+    )
+    parser.add_argument(
+        "--standalone",
+        action="store_true",
+        help="work on the data files directly instead of through the assistant server",
+    )
+    options = parser.parse_args(argv)
+
+    # Imported here: assistant_server imports this module
+    import assistant_server
+
+    if options.serve:
+        return assistant_server.serve(http_port=options.http, stats_file=options.stats)
+    if options.standalone and assistant_server.is_running():
+        # Both would write the same data files and overwrite each other's changes
+        print(
+            Colorizer.error(
+                "Error: An assistant server is running; stop it to use --standalone."
+            ),
+            file=sys.stderr,
+        )
+        return 1
+    if options.script:
+        # Scripts use a running server but never start one
+        client = None if options.standalone else assistant_server.connect(start=False)
+        try:
+            if options.script == "-":
+                return 1 if run_script(sys.stdin, client=client) else 0
+            with open(options.script, encoding="utf-8") as f:
+                return 1 if run_script(f, client=client) else 0
+        finally:
+            if client is not None:
+                client.close()
+            dump_stats(options.stats, client)
+
+    if not options.standalone:
+        client = assistant_server.connect()
+        if client is not None:
+            try:
+                return run_client(client)
+            finally:
+                dump_stats(options.stats, client)
+        if assistant_server.is_running():
+            # Started, but too slow to answer; its data files are not ours to open
+            print(Colorizer.error("Error: The assistant server is not responding."))
+            return 1
+        print(
+            Colorizer.warn(
+                "Could not reach the assistant server, working on the data files directly."
+            )
+        )
+
+    book, session = start_session()
+    # Saves in the background shortly after changes, so a crash loses seconds of work
+    autosaver = Autosaver(lambda: save_all(book)).start()
+
+    try:
+        while True:
+            command, args = read_command(session)
+
+            if command in COMMANDS:
+                with autosaver.lock:
+                    keep_going = run_command(book, command, args)
+                autosaver.touch()
+                if not keep_going:
+                    break
+            else:
+                print(Colorizer.error("Error: Invalid command. Please try again."))
+    finally:
+        # Also runs on Ctrl+C/Ctrl+D and unexpected errors
+        autosaver.stop()
+        close_session(book)
+        dump_stats(options.stats)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
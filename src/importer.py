@@ -0,0 +1,186 @@
+"""
+This module contains functions for importing contacts in bulk from CSV or
+vCard files.
+
+Rows are streamed from the file and validated one by one; accepted records
+are added to the AddressBook in a single batch, so the indexes are updated
+once and the caller saves once. Rejected rows are written to an error
+report next to the source file.
+
+CSV files need a header row. Recognised columns (case-insensitive) are
+name, phone (any column starting with "phone"; several numbers in one cell
+can be separated with ";"), birthday (DD.MM.YYYY), email and address.
+
+Functions:
+    read_csv(filename): Yield (line_number, row) pairs from a CSV file.
+    read_vcard(filename): Yield (line_number, row) pairs from a vCard file.
+    import_contacts(book, filename, error_file=None): Import a whole file.
+"""
+
+import csv
+from birthday import Birthday
+from contact_book import Record, Email
+from validators import normalize_phones, normalize_name, is_valid_email
+
+VCARD_EXTENSIONS = (".vcf", ".vcard")
+
+
+def read_csv(filename):
+    with open(filename, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = [column.strip().lower() for column in next(reader, [])]
+        for row in reader:
+            if not any(cell.strip() for cell in row):
+                continue
+            fields = {"phones": []}
+            for column, cell in zip(header, row):
+                cell = cell.strip()
+                if column.startswith("phone"):
+                    fields["phones"].extend(p for p in cell.split(";") if p.strip())
+                elif column in ("name", "birthday", "email", "address") and cell:
+                    fields[column] = cell
+            yield reader.line_num, fields
+
+
+def _vcard_birthday(value):
+    # vCard uses ISO dates (1990-02-01 or 19900201); the book uses DD.MM.YYYY
+    digits = value.replace("-", "")
+    if len(digits) == 8 and digits.isdigit():
+        return f"{digits[6:8]}.{digits[4:6]}.{digits[0:4]}"
+    return value
+
+
+def _unfolded_lines(f):
+    # Long vCard lines are folded: a continuation line starts with a space
+    pending = None
+    for line_number, line in enumerate(f, 1):
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and pending:
+            pending[1] += line[1:]
+            continue
+        if pending:
+            yield pending
+        pending = [line_number, line]
+    if pending:
+        yield pending
+
+
+def read_vcard(filename):
+    with open(filename, encoding="utf-8-sig") as f:
+        fields = None
+        start = 0
+        for line_number, line in _unfolded_lines(f):
+            if ":" not in line:
+                continue
+            key, value = line.split(":", 1)
+            key = key.split(";", 1)[0].upper()
+            value = value.strip()
+            if key == "BEGIN":
+                fields = {"phones": []}
+                start = line_number
+            elif fields is None:
+                continue
+            elif key == "END":
+                yield start, fields
+                fields = None
+            elif key == "FN":
+                fields["name"] = value
+            elif key == "N" and "name" not in fields:
+                parts = [part for part in value.split(";")[:2] if part]
+                fields["name"] = " ".join(reversed(parts))
+            elif key == "TEL":
+                fields["phones"].append(value)
+            elif key == "EMAIL" and "email" not in fields:
+                fields["email"] = value
+            elif key == "BDAY":
+                fields["birthday"] = _vcard_birthday(value)
+            elif key == "ADR":
+                parts = [part.strip() for part in value.split(";") if part.strip()]
+                fields["address"] = ", ".join(parts)
+
+
+def _build_record(fields):
+    name = fields.get("name")
+    if not name:
+        raise ValueError("Missing name.")
+
+    phones = []
+    for result in normalize_phones(fields["phones"]):
+        if result.error:
+            raise ValueError(f"Invalid phone number '{result.number}'.")
+        phones.append(result.normalized)
+    if not phones:
+        raise ValueError("Missing phone number.")
+
+    email = fields.get("email")
+    if email and not is_valid_email(email):
+        raise ValueError(f"Invalid email '{email}'.")
+
+    birthday = fields.get("birthday")
+    if birthday:
+        try:
+            birthday = Birthday(birthday)
+        except ValueError:
+            raise ValueError(f"Invalid birthday '{birthday}'. Expected DD.MM.YYYY.")
+
+    # Fields are already validated, so fill the record without re-checking them
+    record = Record(name, address=fields.get("address"))
+    record.phones.value = phones
+    record.birthday = birthday or None
+    record.email = Email(email) if email else None
+    return record
+
+
+def _write_error_report(error_file, errors):
+    with open(error_file, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["line", "error", "name", "phones", "birthday", "email", "address"])
+        for line_number, error, fields in errors:
+            writer.writerow(
+                [
+                    line_number,
+                    error,
+                    fields.get("name", ""),
+                    ";".join(fields.get("phones", [])),
+                    fields.get("birthday", ""),
+                    fields.get("email", ""),
+                    fields.get("address", ""),
+                ]
+            )
+
+
+def import_contacts(book, filename, error_file=None):
+    """
+    Import contacts from a CSV or vCard file into the book.
+
+    Contacts whose name already exists (in the book or earlier in the file)
+    are rejected. Returns (imported, rejected, error_file); error_file is None
+    when every row was accepted.
+    """
+    if filename.lower().endswith(VCARD_EXTENSIONS):
+        rows = read_vcard(filename)
+    else:
+        rows = read_csv(filename)
+
+    records = []
+    errors = []
+    seen = set()
+    for line_number, fields in rows:
+        try:
+            record = _build_record(fields)
+            key = normalize_name(record.name.value)
+            if key in seen or key in book.name_index:
+                raise ValueError(f"Contact '{record.name.value}' already exists.")
+            seen.add(key)
+            records.append(record)
+        except ValueError as e:
+            errors.append((line_number, str(e), fields))
+
+    book.add_addresses(records)
+
+    if errors:
+        error_file = error_file or filename + ".errors.csv"
+        _write_error_report(error_file, errors)
+    else:
+        error_file = None
+    return len(records), len(errors), error_file
@@ -31,9 +31,21 @@ Commands:
 
 Type 'help' to see a list of available commands.
 
+Run `personal-assistant --script FILE` (or `--script -` for stdin) to execute
+commands line by line without the interactive prompt. Note commands then take
+their values inline, separated with "|", and every command is reported as one
+JSON line with its status and output.
+
+The interactive prompt is a thin client of the assistant server, which keeps
+the contact book and notes in memory and is started in the background on
+first use (see assistant_server.py). Several clients can be open at once.
+Use --standalone to work on the data files directly, or --serve to run the
+server in the foreground.
+
 """
 
+import sys
 from helper import main
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
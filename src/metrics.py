@@ -0,0 +1,172 @@
+"""
+This module contains the latency metrics of the assistant: how long every
+command takes and how long and how many bytes the data files take to read
+and write.
+
+Latencies go into log-scaled histograms: each bucket is 2 ** (1 / 8), about
+9%, wider than the one before, so p50/p95/p99 stay within 9% of the exact
+value while a histogram holds a few dozen counters however many samples it
+has seen.
+
+The module-level `metrics` collects everything for this process; the `stats`
+command shows it and `--stats FILE` writes it as JSON on exit.
+"""
+
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from pagination import new_table
+
+# Latencies below MIN_LATENCY seconds share the first bucket
+MIN_LATENCY = 1e-6
+BUCKETS_PER_DOUBLING = 8
+PERCENTILES = (50, 95, 99)
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = {}  # bucket index -> number of samples
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.bytes = 0
+
+    @staticmethod
+    def bucket(seconds):
+        if seconds <= MIN_LATENCY:
+            return 0
+        return math.ceil(math.log2(seconds / MIN_LATENCY) * BUCKETS_PER_DOUBLING)
+
+    @staticmethod
+    def upper_bound(bucket):
+        return MIN_LATENCY * 2 ** (bucket / BUCKETS_PER_DOUBLING)
+
+    def add(self, seconds, nbytes=0):
+        index = self.bucket(seconds)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.bytes += nbytes
+
+    def percentile(self, percent):
+        """Latency below which `percent` % of the samples fall; 0.0 when empty."""
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * percent / 100)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(self.upper_bound(index), self.max)
+        return self.max
+
+    def to_dict(self):
+        data = {"count": self.count, "total": self.total, "max": self.max}
+        for percent in PERCENTILES:
+            data[f"p{percent}"] = self.percentile(percent)
+        if self.bytes:
+            data["bytes"] = self.bytes
+        return data
+
+
+class Timer:
+    """Measures one operation; time spent inside paused() is left out."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.excluded = 0.0
+
+    @contextmanager
+    def paused(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.excluded += time.perf_counter() - start
+
+    def elapsed(self):
+        return time.perf_counter() - self.start - self.excluded
+
+
+class Metrics:
+    def __init__(self):
+        self.commands = {}  # command -> Histogram
+        self.io = {}  # operation, e.g. "notes.load" -> Histogram with byte counts
+        self._lock = threading.Lock()  # the autosaver records from its own thread
+
+    def record_command(self, command, seconds):
+        with self._lock:
+            self.commands.setdefault(command, Histogram()).add(seconds)
+
+    def record_io(self, operation, seconds, nbytes):
+        with self._lock:
+            self.io.setdefault(operation, Histogram()).add(seconds, nbytes)
+
+    @contextmanager
+    def io_timer(self, operation):
+        """
+        Time the I/O in the block. The block sets `size[0]` to the number of
+        bytes it read or wrote; nothing is recorded if it raises.
+        """
+        size = [0]
+        start = time.perf_counter()
+        yield size
+        self.record_io(operation, time.perf_counter() - start, size[0])
+
+    def clear(self):
+        with self._lock:
+            self.commands.clear()
+            self.io.clear()
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "commands": {name: h.to_dict() for name, h in self.commands.items()},
+                "io": {name: h.to_dict() for name, h in self.io.items()},
+            }
+
+    def dump(self, filename):
+        with open(filename, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+            f.write("\n")
+
+    def report(self):
+        """The metrics as text tables, slowest operations first."""
+        data = self.to_dict()
+        tables = []
+        for title, rows in (("Command", data["commands"]), ("I/O", data["io"])):
+            if not rows:
+                continue
+            table = new_table([title, "Count", "p50", "p95", "p99", "Max", "Bytes"])
+            for name, row in sorted(rows.items(), key=lambda item: -item[1]["total"]):
+                table.add_row(
+                    [name, row["count"]]
+                    + [format_seconds(row[f"p{percent}"]) for percent in PERCENTILES]
+                    + [format_seconds(row["max"]), format_bytes(row.get("bytes", 0))]
+                )
+            tables.append(table.get_string())
+        return "\n".join(tables)
+
+
+def format_seconds(seconds):
+    if seconds >= 1:
+        return f"{seconds:.2f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.1f} ms"
+    return f"{seconds * 1e6:.0f} µs"
+
+
+def format_bytes(nbytes):
+    if not nbytes:
+        return "-"
+    for unit in ("B", "KB", "MB"):
+        if nbytes < 1024:
+            return f"{nbytes:.0f} {unit}" if unit == "B" else f"{nbytes:.1f} {unit}"
+        nbytes /= 1024
+    return f"{nbytes:.1f} GB"
+
+
+metrics = Metrics()
@@ -1,5 +1,7 @@
 """Module with the class Notes"""
 class Note:
+    __slots__ = ("title", "content", "tags")
+
     def __init__(self, title, content, tags=None):
         self.title = title
         self.content = content
@@ -1,25 +1,165 @@
 """Module to manage notes within Personal Assistant bot"""
-from storage import Storage
+import os
+from bisect import bisect_left, bisect_right
+from search_index import SearchIndex
+from completion import PrefixIndex, MAX_COMPLETIONS
+from storage import Storage, NOTES_FILE, JOURNAL_FILE, COMPACT_THRESHOLD, note_to_dict
+from persistence import rotated_journal
 from notes import Note
 from colorama import Fore
 from prettytable import PrettyTable
+from pagination import print_pages
+
+NOTE_FIELDS = ["Title", "Content", "Tags"]
+
+
+def tag_key(tag):
+    return tag.strip().casefold()
+
+
+def note_row(note):
+    return [note.title, note.content, ", ".join(note.tags) if note.tags else "Nothing..."]
+
+
+def sort_key(note):
+    # Notes are ordered by their first tag, untagged notes go first
+    return tag_key(note.tags[0]) if note.tags else ""
 
 
 class NotesManager:
-    def __init__(self):
-        self.notes = Storage.load_notes()
+    def __init__(self, filename=NOTES_FILE, journal=JOURNAL_FILE):
+        # With journal=None every change rewrites the whole snapshot
+        self.filename = filename
+        self.journal = journal
+        self.notes, self.seq = Storage.load_state(filename, journal)  # seq: last journal entry
+        self._journal_entries = Storage.journal_length(journal) if journal else 0
+        self._compaction = None
+        self._pending = []  # journal entries not written yet
+        self.dirty = False
+
+        self.tag_index = {}  # casefolded tag -> {note: None}, kept in insertion order
+        self._sorted_keys = []  # sort_key of each note in self._sorted_notes
+        self._sorted_notes = []
+        # Sorted titles and tags for the prompt, built on the first completion
+        self.title_completions = None
+        self.tag_completions = None
+        for note in self.notes:
+            self._index_note(note)
+        # Full-text index is saved next to the notes file
+        self.index_file = os.path.splitext(filename)[0] + ".index.json"
+        self.search_index = SearchIndex.load(self.index_file, self.notes)
+        if journal and os.path.exists(rotated_journal(journal)):
+            # Left by an interrupted compaction; fold it instead of replaying it at every start
+            self.compact(background=False)
+
+    def _index_note(self, note):
+        for tag in note.tags or []:
+            self.tag_index.setdefault(tag_key(tag), {})[note] = None
+        if self.title_completions is not None:
+            self.title_completions.add(note.title)
+            for tag in note.tags or []:
+                self.tag_completions.add(tag.strip())
+        key = sort_key(note)
+        index = bisect_right(self._sorted_keys, key)
+        self._sorted_keys.insert(index, key)
+        self._sorted_notes.insert(index, note)
+
+    def _unindex_note(self, note):
+        for tag in note.tags or []:
+            notes = self.tag_index.get(tag_key(tag))
+            if notes is not None:
+                notes.pop(note, None)
+                if not notes:
+                    del self.tag_index[tag_key(tag)]
+        if self.title_completions is not None:
+            self.title_completions.remove(note.title)
+            for tag in note.tags or []:
+                self.tag_completions.remove(tag.strip())
+        key = sort_key(note)
+        for index in range(
+            bisect_left(self._sorted_keys, key), bisect_right(self._sorted_keys, key)
+        ):
+            if self._sorted_notes[index] is note:
+                del self._sorted_keys[index]
+                del self._sorted_notes[index]
+                return
+
+    def _save(self, entry):
+        # Changes are written in batches by flush(), called by the autosaver and on close
+        self.seq += 1
+        entry["seq"] = self.seq
+        self._pending.append(entry)
+        self.dirty = True
+
+    def _write_journal(self):
+        if self._pending:
+            Storage.append_journal(self._pending, self.journal)
+            self._journal_entries += len(self._pending)
+            self._pending = []
+
+    def flush(self):
+        """Write the changes made since the last flush. Does nothing when clean."""
+        if not self.dirty:
+            return
+        self.dirty = False
+        if not self.journal:
+            Storage.save_notes(self.notes, self.filename, self.seq)
+            return
+        self._write_journal()
+        if self._journal_entries >= COMPACT_THRESHOLD:
+            self.compact()
+
+    def compact(self, background=True):
+        if not self.journal:
+            return
+        # Pending entries go to the journal before it is rotated, so they are
+        # replayed if the new snapshot never gets written
+        self._write_journal()
+        self.dirty = False
+        # Only one compaction at a time, otherwise an older snapshot could win
+        if self._compaction is not None:
+            self._compaction.join()
+        self._compaction = Storage.compact(
+            self.notes, self.filename, self.journal, background, self.seq
+        )
+        self._journal_entries = 0
+
+    def close(self):
+        self.flush()
+        if self._compaction is not None:
+            self._compaction.join()
+            self._compaction = None
+        # A short journal is replayed at the next start instead
+        if self._journal_entries >= COMPACT_THRESHOLD:
+            self.compact(background=False)
+            self._compaction = None
+        self.search_index.save(self.index_file, self.notes)
 
     def add_note(self, title, content, tags=None):
         new_note = Note(title=title, content=content, tags=tags)
         self.notes.append(new_note)
-        Storage.save_notes(self.notes)
+        self._index_note(new_note)
+        self.search_index.add(new_note)
+        self._save({"op": "add", "note": note_to_dict(new_note)})
         # print(Fore.GREEN + "Note successfully added.")
 
     def edit_note(self, title, field, new_value):
         note = self.find_note_by_title(title)
         if note:
-            setattr(note, field, new_value)
-            Storage.save_notes(self.notes)
+            if field == "tags":
+                self._unindex_note(note)
+                setattr(note, field, new_value)
+                self._index_note(note)
+            else:
+                self.search_index.remove(note)
+                if field == "title" and self.title_completions is not None:
+                    self.title_completions.remove(note.title)
+                    self.title_completions.add(new_value)
+                setattr(note, field, new_value)
+                self.search_index.add(note)
+            self._save(
+                {"op": "edit", "title": title, "field": field, "value": new_value}
+            )
             # print(Fore.GREEN + f"Note with title '{title}' updated.")
         else:
             print(Fore.RED + "Note hasn't been found.")
@@ -28,7 +168,9 @@ class NotesManager:
         for note in self.notes:
             if note.title == title:
                 self.notes.remove(note)
-                Storage.save_notes(self.notes)
+                self._unindex_note(note)
+                self.search_index.remove(note)
+                self._save({"op": "delete", "title": title})
                 print(Fore.GREEN + f"Note with title '{title}' deleted.")
                 return
         print(Fore.RED + f"Note with title '{title}' hasn't been found.")
@@ -40,23 +182,33 @@ class NotesManager:
         print(Fore.RED + f"Note with title '{title}' hasn't been found.")
         return None
 
-    def display_all_notes(self):
+    def _completions(self):
+        if self.title_completions is None:
+            self.title_completions = PrefixIndex(note.title for note in self.notes)
+            self.tag_completions = PrefixIndex(
+                tag.strip() for note in self.notes for tag in note.tags or []
+            )
+
+    def complete_titles(self, prefix, limit=MAX_COMPLETIONS):
+        self._completions()
+        return self.title_completions.complete(prefix, limit)
+
+    def complete_tags(self, prefix, limit=MAX_COMPLETIONS):
+        self._completions()
+        return self.tag_completions.complete(prefix, limit)
+
+    def display_all_notes(self, page_size=None, offset=0):
         if not self.notes:
-            print(Fore.RED + "No notes to display.")
+            print(Fore.WHITE + "No notes to display.")
             return
 
-        table = PrettyTable()
-        table.field_names = ["Title", "Content", "Tags"]
-        for note in self.notes:
-            tags_formatted = ", ".join(note.tags) if note.tags else "Nothing..."
-            table.add_row([note.title, note.content, tags_formatted])
-        print(table)
+        rows = (note_row(note) for note in self.notes)
+        if not print_pages(NOTE_FIELDS, rows, page_size, offset, "show_all_notes"):
+            print(Fore.WHITE + "No notes on this page.")
 
     def find_notes_by_tag(self, tag):
         # Фільтруємо нотатки за тегом
-        results = [
-            note for note in self.notes if tag.lower() in [t.lower() for t in note.tags]
-        ]
+        results = list(self.tag_index.get(tag_key(tag), ()))
 
         if results:
             # Відображаємо результати у вигляді таблиці
@@ -68,12 +220,10 @@ class NotesManager:
             print(Fore.GREEN + f"Notes with the following tag '{tag}' found:")
             print(table)
         else:
-            print(Fore.RED + f"No notes with tag '{tag}' found.")
+            print(Fore.WHITE + f"No notes with tag '{tag}' found.")
 
     def sort_notes_by_tag(self):
-        sorted_notes = sorted(
-            self.notes, key=lambda note: note.tags[0].lower() if note.tags else ""
-        )
+        sorted_notes = self._sorted_notes
 
         if sorted_notes:
             # Відображення відсортованих нотаток у вигляді таблиці
@@ -85,4 +235,19 @@ class NotesManager:
             print(Fore.GREEN + "Notes sorted by tags:")
             print(table)
         else:
-            print(Fore.RED + "No notes to sort.")
+            print(Fore.WHITE + "No notes to sort.")
+
+    def search_notes(self, query, limit=10):
+        results = self.search_index.search(query, limit)
+        if not results:
+            print(Fore.WHITE + f"No notes matching '{query}' found.")
+            return []
+
+        table = PrettyTable()
+        table.field_names = ["Title", "Content", "Tags", "Score"]
+        for note, score in results:
+            tags_formatted = ", ".join(note.tags) if note.tags else "Nothing..."
+            table.add_row([note.title, note.content, tags_formatted, f"{score:.2f}"])
+        print(Fore.GREEN + f"Notes matching '{query}':")
+        print(table)
+        return results
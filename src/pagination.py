@@ -0,0 +1,77 @@
+"""
+This module contains helpers for paginated, streaming listings.
+
+Rows are pulled lazily from a generator one page at a time, and every page is
+rendered as its own table, so column widths depend only on that page and the
+first page is printed without touching the rest of the data.
+
+Functions:
+    parse_page_args(args): Read optional [page_size] [offset] command arguments.
+    paginate(rows, page_size, offset): Yield lists of at most page_size rows.
+    new_table(field_names): Create an empty table with these columns.
+    render_page(field_names, rows): Render one page as a table.
+    print_pages(field_names, rows, page_size, offset, command): Print a listing.
+"""
+
+from itertools import islice
+from colorizer import Colorizer
+
+DEFAULT_PAGE_SIZE = 50
+
+
+def parse_page_args(args):
+    """Return (page_size, offset); page_size is None when no page was requested."""
+    page_size = int(args[0]) if len(args) > 0 else None
+    offset = int(args[1]) if len(args) > 1 else 0
+    if (page_size is not None and page_size < 1) or offset < 0:
+        raise ValueError("Page size must be positive and offset not negative.")
+    return page_size, offset
+
+
+def paginate(rows, page_size=DEFAULT_PAGE_SIZE, offset=0):
+    rows = islice(rows, offset, None)
+    while True:
+        page = list(islice(rows, page_size))
+        if not page:
+            return
+        yield page
+
+
+def new_table(field_names):
+    # Imported here so that startup does not pay for prettytable
+    from prettytable import PrettyTable
+
+    table = PrettyTable()
+    table.field_names = field_names
+    return table
+
+
+def render_page(field_names, rows):
+    table = new_table(field_names)
+    table.align = "l"
+    for row in rows:
+        table.add_row(row)
+    return table.get_string()
+
+
+def print_pages(field_names, rows, page_size=None, offset=0, command=None):
+    """
+    Print rows page by page and return the number of rows printed.
+
+    Without a page size every page is streamed one after another; with one,
+    a single page is printed followed by the command for the next page.
+    """
+    printed = 0
+    pages = paginate(rows, page_size or DEFAULT_PAGE_SIZE, offset)
+    for page in pages:
+        print(Colorizer.info(render_page(field_names, page)))
+        printed += len(page)
+        if page_size:
+            if command and next(pages, None):
+                print(
+                    Colorizer.highlight(
+                        f"Next page: {command} {page_size} {offset + printed}"
+                    )
+                )
+            break
+    return printed
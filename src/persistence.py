@@ -0,0 +1,169 @@
+"""
+This module contains the helpers that keep the contact book and the notes
+safe on disk: atomic file writes and the background autosaver.
+
+atomic_write writes to a temporary file next to the target, fsyncs it and
+renames it over the target, so a crash leaves either the old or the new
+file, never a torn one.
+
+rotate_journal and journal_files implement journal compaction for the
+notes and the contact book: the journal is moved aside, a new snapshot is
+written from memory, and the rotated journal is removed afterwards. If the
+process dies in between, the rotated journal is replayed at the next start,
+so replaying a journal on top of a snapshot that already holds its changes
+must not change the result.
+
+Autosaver batches mutations: the CLI touches it after every command, and
+its thread saves whatever is dirty once the changes have settled.
+"""
+
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from colorizer import Colorizer
+
+# Seconds without new changes before dirty data is saved
+AUTOSAVE_DELAY = 1.0
+# Upper bound on how long a change can stay unsaved during a long burst
+AUTOSAVE_MAX_DELAY = 10.0
+
+
+def fsync_directory(filename):
+    # Makes a rename inside the directory durable; not possible on Windows
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(filename)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_write(filename, mode="w", **kwargs):
+    """Open a temporary file for writing and move it over `filename` on success."""
+    # Unique per thread, so a background compaction never shares it
+    temporary = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+    f = open(temporary, mode, **kwargs)
+    try:
+        yield f
+        f.flush()
+        os.fsync(f.fileno())
+    except BaseException:
+        f.close()
+        os.remove(temporary)
+        raise
+    f.close()
+    os.replace(temporary, filename)
+    fsync_directory(filename)
+
+
+def rotated_journal(journal):
+    return journal + ".compacting"
+
+
+def rotate_journal(journal, header_size=0):
+    """
+    Move `journal` aside before it is folded into a new snapshot, so changes
+    made meanwhile start a fresh journal, and return the rotated file name;
+    remove that file once the snapshot is written.
+
+    A rotated journal left by an earlier compaction is kept and gets the
+    entries of `journal` appended, without its `header_size` byte header.
+    """
+    rotated = rotated_journal(journal)
+    if not os.path.exists(journal):
+        return rotated
+    if not os.path.exists(rotated):
+        os.replace(journal, rotated)
+        fsync_directory(rotated)
+        return rotated
+    with open(journal, "rb") as f:
+        f.seek(header_size)
+        entries = f.read()
+    with open(rotated, "ab") as f:
+        f.write(entries)
+        f.flush()
+        os.fsync(f.fileno())
+    os.remove(journal)
+    return rotated
+
+
+def journal_files(journal):
+    """
+    The journal files to replay on top of the snapshot, oldest first: the
+    journal rotated by an interrupted compaction, if there is one, and
+    `journal`. Either may be missing.
+    """
+    rotated = rotated_journal(journal)
+    return [rotated, journal] if os.path.exists(rotated) else [journal]
+
+
+class Autosaver:
+    """
+    Background thread that calls `save` once changes have settled.
+
+    Call touch() after every mutation. `save` runs when no touch() came for
+    `delay` seconds, or at the latest `max_delay` seconds after the first
+    unsaved change, so a burst of mutations becomes a single write.
+    Mutations must hold `lock`, which is also held while saving.
+    """
+
+    def __init__(self, save, delay=AUTOSAVE_DELAY, max_delay=AUTOSAVE_MAX_DELAY):
+        self.save = save
+        self.delay = delay
+        self.max_delay = max_delay
+        self.lock = threading.RLock()
+        self._changed = threading.Condition()
+        self._first_change = None
+        self._last_change = None
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def touch(self):
+        with self._changed:
+            now = time.monotonic()
+            if self._first_change is None:
+                self._first_change = now
+            self._last_change = now
+            self._changed.notify()
+
+    def _wait_until_settled(self):
+        # Returns False when stopped; the final save is left to the caller
+        with self._changed:
+            while self._first_change is None and not self._stopping:
+                self._changed.wait()
+            while not self._stopping:
+                due = min(
+                    self._last_change + self.delay, self._first_change + self.max_delay
+                )
+                remaining = due - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+            self._first_change = self._last_change = None
+            return not self._stopping
+
+    def _run(self):
+        while self._wait_until_settled():
+            with self.lock:
+                try:
+                    self.save()
+                except Exception as e:
+                    print(Colorizer.error(f"Error while autosaving: {e}"), file=sys.stderr)
+
+    def stop(self):
+        with self._changed:
+            self._stopping = True
+            self._changed.notify()
+        if self._thread.is_alive():
+            self._thread.join()
@@ -2,11 +2,11 @@
 This module contains the Phone class, which represents a phone number for a contact.
 
 Attributes:
-    numbers (list): A list of phone numbers.
     value (list): A list of normalized phone numbers.
+    record (Record): The record that owns the phone list.
 
 Methods:
-    _normalize_all_phones(self): Normalizes all phone numbers in the numbers list and adds them to the value list.
+    _normalize_all_phones(self, phones): Normalizes the given phone numbers and adds them to the value list.
     __iter__(self): Returns an iterator over the value list.
     add_phone(self, number): Adds a phone number to the value list.
     find_phone(self, number): Returns True if the phone number is in the value list, False otherwise.
@@ -18,39 +18,52 @@ Classes:
 """
 
 
-from validators import normalize_phone
+from validators import normalize_phone, parse_phone, normalize_phones
 from field import Field
 from colorizer import Colorizer
 
 
 class Phone(Field):
+    __slots__ = ("record",)
+    _derived = ("record",)
+
     def __init__(self, phones=None):
-        self.numbers = list(phones) if phones else []
         self.value = []
-        self._normalize_all_phones()
+        self.record = None  # Record that owns the phone list; set by Record
+        self._normalize_all_phones(phones or [])
 
-    def _normalize_all_phones(self):
-        for number in self.numbers:
-            normalized_phone = normalize_phone(number)
-            if isinstance(normalized_phone, str):
-                self.value.append(normalized_phone)
+    def _normalize_all_phones(self, phones):
+        for result in normalize_phones(phones):
+            if result.normalized:
+                self.value.append(result.normalized)
             else:
                 raise ValueError(
                     Colorizer.error(
-                        f"Invalid phone number: {number}. The number must have not less than 10 digits."
+                        f"Invalid phone number: {result.number}. The number must have not less than 10 digits."
                     )
                 )
 
     def __iter__(self):
         return iter(self.value)
 
+    def _changed(self, added=None, removed=None):
+        # Keep the owning AddressBook's phone index in sync, then persist
+        if self.record is None:
+            return
+        book = self.record.book
+        if book is not None:
+            if removed:
+                book.unindex_phone(removed, self.record)
+            if added:
+                book.index_phone(added, self.record)
+        self.record._changed()
+
     def add_phone(self, number):
-        normalized_number = normalize_phone(number)
-        if isinstance(normalized_number, str) and not normalized_number.startswith(
-            "Invalid"
-        ):
+        normalized_number = parse_phone(number).normalized
+        if normalized_number:
             if normalized_number not in self.value:
                 self.value.append(normalized_number)
+                self._changed(added=normalized_number)
         else:
             raise ValueError(
                 Colorizer.error(
@@ -63,13 +76,13 @@ class Phone(Field):
         return normalized_phone_number in self.value
 
     def edit_phone(self, old_number, new_number):
+        normalized_old_number = normalize_phone(old_number)
         for index, num in enumerate(self.value):
-            if num == normalize_phone(old_number):
-                normalized_new_number = normalize_phone(new_number)
-                if isinstance(
-                    normalized_new_number, str
-                ) and not normalized_new_number.startswith("Invalid"):
+            if num == normalized_old_number:
+                normalized_new_number = parse_phone(new_number).normalized
+                if normalized_new_number:
                     self.value[index] = normalized_new_number
+                    self._changed(added=normalized_new_number, removed=num)
                     return True
                 else:
                     raise ValueError(
@@ -83,5 +96,6 @@ class Phone(Field):
         normalized_number = normalize_phone(number)
         if normalized_number in self.value:
             self.value.remove(normalized_number)  # remove the phone number
+            self._changed(removed=normalized_number)
         else:
             print(Colorizer.error(f"Error: Phone number {number} not found."))
@@ -0,0 +1,480 @@
+"""
+This module contains the record store, an on-disk format for very large
+contact books, and LazyAddressBook, an AddressBook that reads its records
+from a store on demand.
+
+Opening a store reads only a fixed-size header and memory-maps the file, so
+it takes the same time for ten contacts or a million. Record bodies are
+deserialized when find_address, a listing or a birthday query touches them,
+and at most `cache_size` clean Record objects are kept in an LRU cache.
+Records that are added or changed stay in memory until the book is saved;
+saving writes a new store next to the old one and swaps it in.
+
+File layout (all integers little-endian):
+    header     MAGIC, version, counts and the offsets of the four tables
+    bodies     one pickled (name, phones, birthday ordinal, email, address)
+               tuple per contact
+    records    uint64 offset of every body, plus the end of the last body
+    names      uint64 (crc32 of the normalized name << 32 | record number), sorted
+    phones     uint64 (crc32 of the E.164 number << 32 | record number), sorted
+    birthdays  uint64 (day of year << 32 | record number), sorted
+
+Usage as a script converts an existing pickle file once:
+    python record_store.py contact_book.pkl contact_book.rec
+"""
+
+import mmap
+import os
+import pickle
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from datetime import date
+from birthday import BirthdayCalendar, day_of_year
+from colorizer import Colorizer
+from persistence import fsync_directory
+from contact_book import AddressBook, record_fields, record_from_fields, search_fields
+from validators import normalize_name, normalize_phone
+
+MAGIC = b"CONTACTS"
+VERSION = 1
+# magic, version, count, phone entries, birthday entries, four table offsets
+HEADER = struct.Struct("<8sIIIIQQQQ")
+ENTRY = struct.Struct("<Q")
+# How many clean materialized records a LazyAddressBook keeps
+CACHE_SIZE = 4096
+
+
+def key_hash(key):
+    return zlib.crc32(key.encode())
+
+
+def row_from_fields(fields):
+    # Same columns as Record.as_row, without building the Record
+    name, phones, ordinal, email, address = fields
+    birthday = date.fromordinal(ordinal).strftime("%d.%m.%Y") if ordinal else ""
+    return [name, ", ".join(phones), birthday, email or "", address or ""]
+
+
+def _table_bytes(values):
+    table = array("Q", values)
+    if sys.byteorder == "big":
+        table.byteswap()
+    return table.tobytes()
+
+
+class RecordStoreWriter:
+    """
+    Streams records into a new store file.
+
+    Bodies are written as they are added; the tables are written by close(),
+    which then replaces `filename` in one step, so readers never see a
+    half-written store.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.temporary = filename + ".tmp"
+        self.file = open(self.temporary, "wb")
+        self.file.write(bytes(HEADER.size))
+        self.offsets = array("Q")
+        self.names = array("Q")
+        self.phones = array("Q")
+        self.birthdays = array("Q")
+
+    def add(self, fields, body=None):
+        """Add one record; `body` is its already pickled fields, if known."""
+        if body is None:
+            body = pickle.dumps(fields, pickle.HIGHEST_PROTOCOL)
+        name, phones, ordinal = fields[:3]
+        number = len(self.offsets)
+        self.offsets.append(self.file.tell())
+        self.file.write(body)
+        self.names.append(key_hash(normalize_name(name)) << 32 | number)
+        for phone in phones:
+            self.phones.append(key_hash(phone) << 32 | number)
+        if ordinal is not None:
+            birthday = date.fromordinal(ordinal)
+            self.birthdays.append(day_of_year(birthday.month, birthday.day) << 32 | number)
+
+    def close(self):
+        count = len(self.offsets)
+        self.offsets.append(self.file.tell())
+        tables = []
+        for values in (self.offsets, sorted(self.names), sorted(self.phones), sorted(self.birthdays)):
+            tables.append(self.file.tell())
+            self.file.write(_table_bytes(values))
+        self.file.seek(0)
+        self.file.write(
+            HEADER.pack(MAGIC, VERSION, count, len(self.phones), len(self.birthdays), *tables)
+        )
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.temporary, self.filename)
+        fsync_directory(self.filename)
+
+
+class RecordStore:
+    """Read-only, memory-mapped view of a store file."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = open(filename, "rb")
+        if os.fstat(self.file.fileno()).st_size < HEADER.size:
+            self.file.close()
+            raise ValueError(f"{filename} is not a contact record store.")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        (
+            magic,
+            version,
+            self.count,
+            self.phone_count,
+            self.birthday_count,
+            self.records_offset,
+            self.names_offset,
+            self.phones_offset,
+            self.birthdays_offset,
+        ) = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{filename} is not a contact record store.")
+        if version != VERSION:
+            self.close()
+            raise ValueError(f"Unsupported record store version {version} in {filename}.")
+        # The birthdays table is written last and ends the file
+        if len(self.map) != self.birthdays_offset + self.birthday_count * ENTRY.size:
+            self.close()
+            raise ValueError(f"{filename} is truncated.")
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def _entry(self, table_offset, index):
+        return ENTRY.unpack_from(self.map, table_offset + index * ENTRY.size)[0]
+
+    def body(self, number):
+        start = self._entry(self.records_offset, number)
+        end = self._entry(self.records_offset, number + 1)
+        return self.map[start:end]
+
+    def read(self, number):
+        return pickle.loads(self.body(number))
+
+    def _range(self, table_offset, length, low, high):
+        # Record numbers of the entries whose key is in [low, high]
+        entries = _MappedTable(self, table_offset, length)
+        index = bisect_left(entries, low << 32)
+        while index < length:
+            value = entries[index]
+            if value >> 32 > high:
+                break
+            yield value & 0xFFFFFFFF
+            index += 1
+
+    def find_names(self, key):
+        code = key_hash(key)
+        return list(self._range(self.names_offset, self.count, code, code))
+
+    def find_phones(self, number):
+        code = key_hash(number)
+        return list(self._range(self.phones_offset, self.phone_count, code, code))
+
+    def birthdays_between(self, low, high):
+        return self._range(self.birthdays_offset, self.birthday_count, low, high)
+
+
+class _MappedTable:
+    # Sequence view of one table, so bisect can search it in place
+    def __init__(self, store, offset, length):
+        self.store = store
+        self.offset = offset
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        return self.store._entry(self.offset, index)
+
+
+class StoredRecords(MutableMapping):
+    """
+    The `data` mapping of a LazyAddressBook: name -> Record.
+
+    Records added or changed since the store was written live in `changed`;
+    the store numbers they replace are listed in `removed`.
+    """
+
+    def __init__(self, book, store, cache_size=CACHE_SIZE):
+        self.book = book
+        self.store = store
+        self.cache_size = cache_size
+        self.changed = {}  # name -> Record not yet written to the store
+        self.removed = set()  # store record numbers that were deleted or changed
+        self.cache = OrderedDict()  # store record number -> clean Record, LRU order
+        self.numbers = {}  # clean Record -> its store record number
+
+    def load(self, number):
+        record = self.cache.get(number)
+        if record is not None:
+            self.cache.move_to_end(number)
+            return record
+        record = record_from_fields(self.store.read(number))
+        record.book = self.book
+        record.phones.record = record
+        self.remember(number, record)
+        return record
+
+    def remember(self, number, record):
+        self.cache[number] = record
+        self.numbers[record] = number
+        if len(self.cache) > self.cache_size:
+            _, evicted = self.cache.popitem(last=False)
+            del self.numbers[evicted]
+
+    def _forget(self, number):
+        self.removed.add(number)
+        record = self.cache.pop(number, None)
+        if record is not None:
+            del self.numbers[record]
+
+    def _stored(self, name):
+        # (number, record) of the live stored record with exactly this name
+        for number in self.store.find_names(normalize_name(name)):
+            if number not in self.removed:
+                record = self.load(number)
+                if record.name.value == name:
+                    return number, record
+        return None, None
+
+    def find_name(self, key):
+        for number in self.store.find_names(key):
+            if number not in self.removed:
+                record = self.load(number)
+                if normalize_name(record.name.value) == key:
+                    return record
+        return None
+
+    def find_phone(self, phone):
+        for number in self.store.find_phones(phone):
+            if number not in self.removed:
+                record = self.load(number)
+                if phone in record.phones.value:
+                    return record
+        return None
+
+    def __getitem__(self, name):
+        record = self.changed.get(name)
+        if record is None:
+            _, record = self._stored(name)
+            if record is None:
+                raise KeyError(name)
+        return record
+
+    def __setitem__(self, name, record):
+        number = self.numbers.get(record)
+        if number is not None:
+            self._forget(number)  # a clean cached record was modified
+        if name not in self.changed:
+            # Also covers a modified record that was evicted from the cache
+            number, _ = self._stored(name)
+            if number is not None:
+                self._forget(number)
+        self.changed[name] = record
+
+    def __delitem__(self, name):
+        if name in self.changed:
+            del self.changed[name]
+            return
+        number, _ = self._stored(name)
+        if number is None:
+            raise KeyError(name)
+        self._forget(number)
+
+    def __iter__(self):
+        yield from list(self.changed)
+        for number in range(self.store.count):
+            if number not in self.removed:
+                yield self.store.read(number)[0]
+
+    def __len__(self):
+        return len(self.changed) + self.store.count - len(self.removed)
+
+    def rows(self):
+        for record in self.changed.values():
+            yield record.as_row()
+        for number in range(self.store.count):
+            if number not in self.removed:
+                yield row_from_fields(self.store.read(number))
+
+
+class StoredNameIndex(dict):
+    # Normalized name -> Record; the dict holds changed records only and
+    # misses fall back to the store
+    def __init__(self, records):
+        super().__init__()
+        self.records = records
+
+    def get(self, key, default=None):
+        record = dict.get(self, key)
+        if record is None:
+            record = self.records.find_name(key)
+        return default if record is None else record
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __delitem__(self, key):
+        # A stored record may be returned by get() without being in the dict
+        self.pop(key, None)
+
+
+class StoredBirthdayCalendar(BirthdayCalendar):
+    # Changed records are kept in the usual sorted lists, the rest is
+    # range-scanned in the store's birthdays table
+    def __init__(self, records):
+        super().__init__()
+        self.stored = records
+
+    def __len__(self):
+        return len(self.days) + self.stored.store.birthday_count
+
+    def _between(self, low, high):
+        yield from super()._between(low, high)
+        for number in self.stored.store.birthdays_between(low, high):
+            if number not in self.stored.removed:
+                yield self.stored.load(number)
+
+
+class LazyAddressBook(AddressBook):
+    """An AddressBook whose records are read from a record store on demand."""
+
+    def __init__(self, store, cache_size=CACHE_SIZE):
+        super().__init__()
+        self.data = StoredRecords(self, store, cache_size)
+        self.name_index = StoredNameIndex(self.data)
+        self.birthday_calendar = StoredBirthdayCalendar(self.data)
+
+    @property
+    def store(self):
+        return self.data.store
+
+    def is_dirty(self):
+        return bool(self.data.changed or self.data.removed)
+
+    def record_changed(self, record):
+        # A clean stored record that was just modified moves to `changed`
+        if self.data.changed.get(record.name.value) is not record:
+            self.data[record.name.value] = record
+            self._index_record(record, calendar=False)
+            # _set_birthday may already have added it to the calendar
+            self.birthday_calendar.remove(record)
+            self.birthday_calendar.add(record)
+        if self.fuzzy_index is not None:
+            self.fuzzy_index.add(record.name.value, search_fields(record))
+
+    def find_address(self, query):
+        record = super().find_address(query)
+        if record is not None or "@" in query:
+            return record  # emails are all in the email index
+        if query.isdigit() or query.startswith("+"):
+            return self.data.find_phone(normalize_phone(query))
+        return self.data.find_name(normalize_name(query))
+
+    def _search_sources(self):
+        # Stored contacts are indexed from their fields, without building Records
+        data = self.data
+        for record in data.changed.values():
+            yield record.name.value, search_fields(record)
+        for number in range(data.store.count):
+            if number not in data.removed:
+                name, _, _, email, address = data.store.read(number)
+                yield name, (name, email or "", address or "")
+
+    def iter_rows(self):
+        return self.data.rows()
+
+    def save_data(self, filename=None):
+        self.save()  # always writes back to the store it was opened from
+
+    def save(self):
+        """Write a new store with every change and reopen it. Does nothing when clean."""
+        if not self.is_dirty():
+            return
+        data = self.data
+        store = data.store
+        writer = RecordStoreWriter(store.filename)
+        try:
+            for number in range(store.count):
+                if number not in data.removed:
+                    body = store.body(number)
+                    writer.add(pickle.loads(body), body)
+            written = len(writer.offsets)
+            changed = list(data.changed.values())
+            for record in changed:
+                writer.add(record_fields(record))
+            writer.close()
+        except BaseException:
+            writer.file.close()
+            if os.path.exists(writer.temporary):
+                os.remove(writer.temporary)
+            raise
+
+        store.close()
+        data.store = RecordStore(store.filename)
+        self.dirty = False
+        data.changed = {}
+        data.removed = set()
+        data.cache.clear()
+        data.numbers.clear()
+        dict.clear(self.name_index)
+        self.phone_index = {}
+        self.birthday_calendar = StoredBirthdayCalendar(data)
+        # Records that were just written stay cached under their new numbers
+        for number, record in enumerate(changed, written):
+            data.remember(number, record)
+
+    def close(self):
+        self.data.store.close()
+
+
+def write_store(filename, records):
+    """Write records (any iterable of Record) to a new store file; return the count."""
+    writer = RecordStoreWriter(filename)
+    for record in records:
+        writer.add(record_fields(record))
+    count = len(writer.offsets)
+    writer.close()
+    return count
+
+
+def open_record_store(filename="contact_book.rec", pickle_filename="contact_book.pkl", cache_size=CACHE_SIZE):
+    """Open a store-backed LazyAddressBook, converting the pickle file on first use."""
+    if not os.path.exists(filename):
+        records = []
+        if pickle_filename and os.path.exists(pickle_filename):
+            with open(pickle_filename, "rb") as f:
+                records = pickle.load(f).data.values()
+        count = write_store(filename, records)
+        if count:
+            print(
+                Colorizer.info(
+                    f"Migrated {count} contacts from {pickle_filename} to {filename}."
+                )
+            )
+    return LazyAddressBook(RecordStore(filename), cache_size)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python record_store.py <contact_book.pkl> <contact_book.rec>")
+        sys.exit(1)
+    with open(sys.argv[1], "rb") as f:
+        migrated = write_store(sys.argv[2], pickle.load(f).data.values())
+    print(Colorizer.success(f"Migrated {migrated} contacts to {sys.argv[2]}."))
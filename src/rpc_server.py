@@ -0,0 +1,446 @@
+"""
+This module contains a JSON-RPC 2.0 API over HTTP for the contact book and
+notes, served with asyncio.
+
+Calls return structured data instead of coloured text, so tools do not have
+to parse CLI output. Every request is a POST to / (or /rpc) with a JSON-RPC
+request or a batch (a JSON array of requests) as the body. Connections are
+kept alive and pipelined requests are answered in order.
+
+Methods (params by name or by position):
+    contacts.find(query)                    contact or null
+    contacts.find_many(queries)             list of contacts or nulls
+    contacts.find_similar(query, limit=10)  list of {"contact", "score"}, best first
+    contacts.find_by_domain(domain)         list of contacts with an email at domain
+    contacts.list(offset=0, limit=100)      list of contacts
+    contacts.add(name, phones, birthday=None, email=None, address=None)
+    contacts.change(name, field, value, old_value=None)
+        field is name, phone, birthday, email or address; a null value
+        removes the birthday, email or address, and a phone with no
+        old_value is added
+    contacts.delete(name)
+    contacts.upcoming_birthdays(days=7)
+    notes.add(title, content, tags=None)
+    notes.get(title)
+    notes.edit(title, field, value)         field is title, content or tags
+    notes.delete(title)
+    notes.list(offset=0, limit=100)
+    notes.find_by_tag(tag)
+    notes.search(query, limit=10)
+    stats()                                 command and I/O latency statistics
+
+Usage (the assistant server can also host the API, see --http):
+    python rpc_server.py [--host HOST] [--port PORT]
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import sys
+import traceback
+from contextlib import nullcontext, redirect_stdout
+from inspect import signature
+from itertools import islice
+from birthday import Birthday
+from colorizer import Colorizer
+from contact_book import Email
+from validators import is_valid_email, parse_phone
+from metrics import metrics, Timer
+import helper
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+# JSON-RPC 2.0 error codes; -32000 and below are application errors
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+NOT_FOUND = -32001
+CONFLICT = -32002
+
+HTTP_REASONS = {
+    200: "OK",
+    204: "No Content",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+}
+
+
+class ApiError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def plain(text):
+    return helper.ANSI_PATTERN.sub("", text).strip()
+
+
+def quietly(function, *args):
+    # CLI-oriented methods report errors by printing them in red
+    buffer = io.StringIO()
+    with redirect_stdout(buffer):
+        result = function(*args)
+    output = buffer.getvalue()
+    if Colorizer.ERROR in output:
+        raise ApiError(INVALID_PARAMS, plain(output))
+    return result
+
+
+def contact_to_dict(record):
+    if record is None:
+        return None
+    email = record.email
+    return {
+        "name": record.name.value,
+        "phones": list(record.phones),
+        "birthday": record.birthday.value if record.birthday else None,
+        "email": getattr(email, "email", email) or None,
+        "address": record.address or None,
+    }
+
+
+def note_to_dict(note):
+    return {"title": note.title, "content": note.content, "tags": list(note.tags or [])}
+
+
+class Api:
+    """
+    The API methods over one AddressBook and the notes.
+
+    `notes` is a callable returning the NotesManager, so notes are still
+    loaded on first use. Calls hold `lock` and call `touch` afterwards, which
+    lets the assistant server share its autosaver with the API.
+    """
+
+    def __init__(self, book, notes, lock=None, touch=None):
+        self.book = book
+        self.notes = notes
+        self.lock = lock or nullcontext()
+        self.touch = touch or (lambda: None)
+        self.methods = {
+            "contacts.find": self.find_contact,
+            "contacts.find_many": self.find_contacts,
+            "contacts.find_similar": self.find_similar,
+            "contacts.find_by_domain": self.find_by_domain,
+            "contacts.list": self.list_contacts,
+            "contacts.add": self.add_contact,
+            "contacts.change": self.change_contact,
+            "contacts.delete": self.delete_contact,
+            "contacts.upcoming_birthdays": self.upcoming_birthdays,
+            "notes.add": self.add_note,
+            "notes.get": self.get_note,
+            "notes.edit": self.edit_note,
+            "notes.delete": self.delete_note,
+            "notes.list": self.list_notes,
+            "notes.find_by_tag": self.find_notes_by_tag,
+            "notes.search": self.search_notes,
+            "stats": metrics.to_dict,
+        }
+
+    # Contacts
+
+    def _contact(self, name):
+        record = self.book.find_address(name)
+        if record is None:
+            raise ApiError(NOT_FOUND, f"Contact '{name}' not found.")
+        return record
+
+    def find_contact(self, query):
+        return contact_to_dict(self.book.find_address(query))
+
+    def find_contacts(self, queries):
+        return [contact_to_dict(self.book.find_address(query)) for query in queries]
+
+    def find_similar(self, query, limit=10):
+        return [
+            {"contact": contact_to_dict(record), "score": round(score, 3)}
+            for record, score in self.book.find_similar(query, limit)
+        ]
+
+    def find_by_domain(self, domain):
+        return [contact_to_dict(record) for record in self.book.find_by_domain(domain)]
+
+    def list_contacts(self, offset=0, limit=100):
+        records = islice(self.book.data.values(), offset, offset + limit)
+        return [contact_to_dict(record) for record in records]
+
+    def add_contact(self, name, phones, birthday=None, email=None, address=None):
+        if self.book.find_address(name) is not None:
+            raise ApiError(CONFLICT, f"Contact '{name}' already exists.")
+        if not phones:
+            raise ApiError(INVALID_PARAMS, "At least one phone number is required.")
+        if email and not is_valid_email(email):
+            raise ApiError(INVALID_PARAMS, f"Invalid email '{email}'.")
+        quietly(self.book.add_contact, name, list(phones), birthday, email, address)
+        return contact_to_dict(self.book.find_address(name))
+
+    def change_contact(self, name, field, value, old_value=None):
+        record = self._contact(name)
+        if field == "name":
+            quietly(self.book.change_name, record.name.value, value)
+        elif field == "phone":
+            if not parse_phone(value).normalized:
+                raise ApiError(INVALID_PARAMS, f"Invalid phone number '{value}'.")
+            if old_value is None:
+                record.add_number([value])
+            elif not record.edit_number(old_value, value):
+                raise ApiError(NOT_FOUND, f"Phone number '{old_value}' not found.")
+        elif field == "birthday":
+            if value is None:
+                quietly(record.delete_birthday)
+            else:
+                record.add_birthday(value)
+        elif field == "email":
+            if value is None:
+                Email.remove_email(record)
+            elif not is_valid_email(value):
+                raise ApiError(INVALID_PARAMS, f"Invalid email '{value}'.")
+            else:
+                quietly(record.add_email, value)
+        elif field == "address":
+            if value is None:
+                quietly(record.delete_address)
+            else:
+                record.add_address(value)
+        else:
+            raise ApiError(INVALID_PARAMS, f"Unknown field '{field}'.")
+        return contact_to_dict(record)
+
+    def delete_contact(self, name):
+        record = self._contact(name)
+        self.book.delete_contact(record.name.value)
+        return True
+
+    def upcoming_birthdays(self, days=7):
+        return Birthday.get_upcoming_birthdays(self.book, int(days))
+
+    # Notes
+
+    def _note(self, title):
+        for note in self.notes().notes:
+            if note.title == title:
+                return note
+        raise ApiError(NOT_FOUND, f"Note '{title}' not found.")
+
+    def add_note(self, title, content, tags=None):
+        self.notes().add_note(title, content, list(tags) if tags else None)
+        return note_to_dict(self._note(title))
+
+    def get_note(self, title):
+        return note_to_dict(self._note(title))
+
+    def edit_note(self, title, field, value):
+        if field not in ("title", "content", "tags"):
+            raise ApiError(INVALID_PARAMS, f"Unknown field '{field}'.")
+        note = self._note(title)
+        if field == "tags" and isinstance(value, str):
+            value = [tag.strip() for tag in value.split(",") if tag.strip()]
+        self.notes().edit_note(title, field, value)
+        return note_to_dict(note)
+
+    def delete_note(self, title):
+        self._note(title)
+        quietly(self.notes().delete_note_by_title, title)
+        return True
+
+    def list_notes(self, offset=0, limit=100):
+        return [note_to_dict(note) for note in self.notes().notes[offset : offset + limit]]
+
+    def find_notes_by_tag(self, tag):
+        # Imported here so that notes stay unloaded until they are used
+        from notes_manager import tag_key
+
+        notes = self.notes().tag_index.get(tag_key(tag), ())
+        return [note_to_dict(note) for note in notes]
+
+    def search_notes(self, query, limit=10):
+        results = self.notes().search_index.search(query, limit)
+        return [
+            {"note": note_to_dict(note), "score": round(score, 4)}
+            for note, score in results
+        ]
+
+    # JSON-RPC
+
+    def call(self, method, params):
+        function = self.methods.get(method)
+        if function is None:
+            raise ApiError(METHOD_NOT_FOUND, f"Method '{method}' not found.")
+        # Only a mismatch with the method's signature is the client's fault;
+        # a TypeError raised inside the method is a bug
+        try:
+            if isinstance(params, list):
+                bound = signature(function).bind(*params)
+            else:
+                bound = signature(function).bind(**params)
+        except TypeError as e:
+            raise ApiError(INVALID_PARAMS, str(e))
+        timer = Timer()
+        try:
+            return function(*bound.args, **bound.kwargs)
+        except ValueError as e:
+            raise ApiError(INVALID_PARAMS, plain(str(e)))
+        finally:
+            metrics.record_command(method, timer.elapsed())
+
+    def _handle_one(self, request):
+        if not isinstance(request, dict):
+            return error_response(None, INVALID_REQUEST, "Request must be an object.")
+        request_id = request.get("id")
+        method = request.get("method")
+        params = request.get("params", [])
+        if (
+            request.get("jsonrpc") != "2.0"
+            or not isinstance(method, str)
+            or not isinstance(params, (list, dict))
+        ):
+            return error_response(request_id, INVALID_REQUEST, "Invalid request.")
+        try:
+            result = self.call(method, params)
+        except ApiError as e:
+            response = error_response(request_id, e.code, e.message)
+        except Exception:
+            # Logged for the server's owner; the client only learns the call failed
+            print(Colorizer.error(f"Internal error in {method}:"), file=sys.stderr)
+            traceback.print_exc()
+            response = error_response(request_id, INTERNAL_ERROR, "Internal error.")
+        else:
+            response = {"jsonrpc": "2.0", "result": result, "id": request_id}
+        # Requests without an id are notifications and get no response
+        return response if "id" in request else None
+
+    def handle(self, payload):
+        """Answer a request or a batch; returns None when there is nothing to send."""
+        # One lock for the whole batch
+        with self.lock:
+            if isinstance(payload, list):
+                if not payload:
+                    return error_response(None, INVALID_REQUEST, "Empty batch.")
+                responses = [self._handle_one(request) for request in payload]
+                responses = [response for response in responses if response is not None]
+                result = responses or None
+            else:
+                result = self._handle_one(payload)
+        self.touch()
+        return result
+
+    def handle_body(self, body):
+        try:
+            payload = json.loads(body)
+        except ValueError as e:
+            return error_response(None, PARSE_ERROR, f"Parse error: {e}")
+        return self.handle(payload)
+
+
+def error_response(request_id, code, message):
+    return {"jsonrpc": "2.0", "error": {"code": code, "message": message}, "id": request_id}
+
+
+def http_response(status, body=b"", keep_alive=True):
+    headers = [
+        f"HTTP/1.1 {status} {HTTP_REASONS[status]}",
+        f"Content-Length: {len(body)}",
+        "Connection: keep-alive" if keep_alive else "Connection: close",
+    ]
+    if body:
+        headers.append("Content-Type: application/json")
+    return ("\r\n".join(headers) + "\r\n\r\n").encode() + body
+
+
+async def handle_connection(api, reader, writer):
+    # Requests on one connection are read and answered in order, so clients
+    # can pipeline them without waiting for each response
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                break
+            try:
+                method, path, version = request_line.decode("latin-1").split()
+            except ValueError:
+                writer.write(http_response(400, keep_alive=False))
+                break
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            keep_alive = (
+                version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+            )
+            length = int(headers.get("content-length", 0) or 0)
+            if length > MAX_BODY_SIZE:
+                writer.write(http_response(413, keep_alive=False))
+                break
+            body = await reader.readexactly(length)
+
+            if path not in ("/", "/rpc"):
+                writer.write(http_response(404, keep_alive=keep_alive))
+            elif method != "POST":
+                writer.write(http_response(405, keep_alive=keep_alive))
+            else:
+                try:
+                    result = api.handle_body(body)
+                    content = None if result is None else json.dumps(result, ensure_ascii=False)
+                except Exception:
+                    # Answer instead of dropping the connection with the request unanswered
+                    traceback.print_exc()
+                    content = json.dumps(error_response(None, INTERNAL_ERROR, "Internal error."))
+                if content is None:
+                    writer.write(http_response(204, keep_alive=keep_alive))
+                else:
+                    writer.write(http_response(200, content.encode(), keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_http(api, host=DEFAULT_HOST, port=DEFAULT_PORT, ready=None):
+    server = await asyncio.start_server(
+        lambda reader, writer: handle_connection(api, reader, writer), host, port
+    )
+    if ready is not None:
+        ready(server)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JSON-RPC API for contacts and notes.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    options = parser.parse_args(argv)
+
+    from persistence import Autosaver
+
+    book = helper.load_data()
+    autosaver = Autosaver(lambda: helper.save_all(book)).start()
+    api = Api(book, helper.get_notes_manager, autosaver.lock, autosaver.touch)
+    print(Colorizer.info(f"JSON-RPC API listening on http://{options.host}:{options.port}/"))
+    try:
+        asyncio.run(serve_http(api, options.host, options.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        autosaver.stop()
+        helper.close_session(book)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
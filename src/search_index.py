@@ -0,0 +1,165 @@
+"""
+This module contains the SearchIndex class, a full-text inverted index over
+note titles and contents with BM25 ranking and prefix matching.
+
+The index is updated note by note as notes change and can be saved next to
+notes.json, so startup does not have to tokenize every note again.
+"""
+
+import json
+import math
+import re
+import unicodedata
+import zlib
+from bisect import bisect_left, insort
+from persistence import atomic_write
+
+INDEX_VERSION = 1
+TOKEN_PATTERN = re.compile(r"\w+(?:'\w+)*")
+# Ukrainian words are written with several different apostrophes
+APOSTROPHES = str.maketrans({"’": "'", "ʼ": "'", "`": "'"})
+TITLE_WEIGHT = 2  # title terms count as if they appeared twice
+MAX_PREFIX_TERMS = 50  # how many index terms a single prefix may expand to
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text):
+    text = unicodedata.normalize("NFKC", text or "").translate(APOSTROPHES)
+    return TOKEN_PATTERN.findall(text.casefold())
+
+
+def signature(notes):
+    # Cheap fingerprint used to check that a saved index matches the notes
+    checksum = 0
+    for note in notes:
+        checksum = zlib.crc32(f"{note.title}\x00{note.content}\x01".encode(), checksum)
+    return f"{len(notes)}:{checksum}"
+
+
+class SearchIndex:
+    def __init__(self):
+        self.postings = {}  # term -> {note: weighted term frequency}
+        self.doc_lengths = {}  # note -> number of weighted terms
+        self.total_length = 0
+        self.terms = []  # sorted list of every term, for prefix lookups
+        self.dirty = False  # changed since it was saved or loaded
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    @staticmethod
+    def _term_counts(note):
+        counts = {}
+        for term in tokenize(note.title):
+            counts[term] = counts.get(term, 0) + TITLE_WEIGHT
+        for term in tokenize(note.content):
+            counts[term] = counts.get(term, 0) + 1
+        return counts
+
+    def _insert(self, note, counts):
+        for term, count in counts.items():
+            notes = self.postings.get(term)
+            if notes is None:
+                notes = self.postings[term] = {}
+                insort(self.terms, term)
+            notes[note] = count
+        length = sum(counts.values())
+        self.doc_lengths[note] = length
+        self.total_length += length
+        self.dirty = True
+
+    def add(self, note):
+        self._insert(note, self._term_counts(note))
+
+    def remove(self, note):
+        if note not in self.doc_lengths:
+            return
+        for term in self._term_counts(note):
+            notes = self.postings.get(term)
+            if notes is None:
+                continue
+            notes.pop(note, None)
+            if not notes:
+                del self.postings[term]
+                del self.terms[bisect_left(self.terms, term)]
+        self.total_length -= self.doc_lengths.pop(note)
+        self.dirty = True
+
+    def _expand(self, token):
+        """Return (term, weight) pairs: the exact term and terms it prefixes."""
+        expanded = []
+        index = bisect_left(self.terms, token)
+        while index < len(self.terms) and len(expanded) < MAX_PREFIX_TERMS:
+            term = self.terms[index]
+            if not term.startswith(token):
+                break
+            # Prefix matches rank below whole-word matches
+            expanded.append((term, 1.0 if term == token else 0.5))
+            index += 1
+        return expanded
+
+    def search(self, query, limit=10):
+        """Return up to `limit` (note, score) pairs, best match first."""
+        if not self.doc_lengths:
+            return []
+        count = len(self.doc_lengths)
+        average_length = self.total_length / count
+        scores = {}
+        for token in set(tokenize(query)):
+            for term, weight in self._expand(token):
+                notes = self.postings[term]
+                idf = math.log(1 + (count - len(notes) + 0.5) / (len(notes) + 0.5))
+                for note, frequency in notes.items():
+                    norm = K1 * (1 - B + B * self.doc_lengths[note] / average_length)
+                    score = weight * idf * frequency * (K1 + 1) / (frequency + norm)
+                    scores[note] = scores.get(note, 0.0) + score
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:limit]
+
+    @classmethod
+    def build(cls, notes):
+        index = cls()
+        for note in notes:
+            index.add(note)
+        return index
+
+    def save(self, filename, notes):
+        """Write the index next to `notes`; skipped when nothing changed since the last save or load."""
+        if not self.dirty:
+            return
+        positions = {note: position for position, note in enumerate(notes)}
+        data = {
+            "version": INDEX_VERSION,
+            "signature": signature(notes),
+            "lengths": [self.doc_lengths.get(note, 0) for note in notes],
+            "postings": {
+                term: [[positions[note], count] for note, count in docs.items()]
+                for term, docs in self.postings.items()
+            },
+        }
+        with atomic_write(filename, encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        self.dirty = False
+
+    @classmethod
+    def load(cls, filename, notes):
+        """Load a saved index, or rebuild it if it is missing or out of date."""
+        try:
+            with open(filename, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return cls.build(notes)
+        if data.get("version") != INDEX_VERSION or data.get("signature") != signature(
+            notes
+        ):
+            return cls.build(notes)
+
+        index = cls()
+        for note, length in zip(notes, data["lengths"]):
+            index.doc_lengths[note] = length
+            index.total_length += length
+        for term, docs in data["postings"].items():
+            index.postings[term] = {notes[position]: count for position, count in docs}
+        index.terms = sorted(index.postings)
+        return index
@@ -0,0 +1,250 @@
+"""
+This module contains sharded contact storage: a directory of snapshot files
+(see snapshot.py), each holding the contacts whose normalized name hashes
+to it, and ShardedAddressBook, an AddressBook that loads a shard on first
+access and saves only the shards that changed.
+
+Looking a contact up by name loads one shard. Listings, phone and email
+lookups, birthday queries and fuzzy search need every contact and load the
+remaining shards once. A save after a single edit writes one shard file,
+about 1/N of the book, and the shard files can be backed up and synced
+independently.
+
+Directory layout:
+    manifest.json        {"version": 1, "shards": N}, written last
+    shard-000.snap ...   one snapshot per shard; a missing file is an
+                         empty shard
+
+Usage as a script converts a snapshot (with its journal) or a pickle file:
+    python sharded_store.py contact_book.snap contact_book.shards [number_of_shards]
+"""
+
+import json
+import os
+import pickle
+import sys
+import zlib
+from collections.abc import MutableMapping
+from birthday import BirthdayCalendar
+from colorizer import Colorizer
+from contact_book import AddressBook, record_fields, record_from_fields
+from contact_journal import journal_file, replay
+from metrics import metrics
+from persistence import atomic_write
+from snapshot import MAGIC as SNAPSHOT_MAGIC, read_snapshot, write_snapshot
+from validators import normalize_name
+
+MANIFEST = "manifest.json"
+VERSION = 1
+DEFAULT_SHARDS = 16
+
+
+def shard_number(key, shard_count):
+    # crc32 rather than hash(), which changes from one process to the next
+    return zlib.crc32(key.encode()) % shard_count
+
+
+def shard_file(directory, number):
+    return os.path.join(directory, f"shard-{number:03d}.snap")
+
+
+def write_shard(filename, records):
+    with metrics.io_timer("contacts.save") as size, atomic_write(filename, "wb") as f:
+        write_snapshot(f, map(record_fields, records))
+        size[0] = f.tell()
+
+
+def write_shards(directory, fields, shard_count=DEFAULT_SHARDS):
+    """Write contact fields (name, phones, ...) as a new sharded book; returns their number."""
+    shards = [[] for _ in range(shard_count)]
+    for item in fields:
+        shards[shard_number(normalize_name(item[0]), shard_count)].append(item)
+    os.makedirs(directory, exist_ok=True)
+    for number, shard in enumerate(shards):
+        with atomic_write(shard_file(directory, number), "wb") as f:
+            write_snapshot(f, shard)
+    # The manifest marks a complete set of shards
+    with atomic_write(os.path.join(directory, MANIFEST)) as f:
+        json.dump({"version": VERSION, "shards": shard_count}, f)
+    return sum(len(shard) for shard in shards)
+
+
+def source_fields(filename):
+    """The fields of every contact in a snapshot file (plus its journal) or a pickle file."""
+    with open(filename, "rb") as f:
+        if filename.endswith(".pkl"):
+            return [record_fields(record) for record in pickle.load(f).data.values()]
+        if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+            raise ValueError(f"{filename} is not a contact book snapshot.")
+        f.seek(0)
+        records = {fields[0]: fields for fields in read_snapshot(f)}
+    replay(records, journal_file(filename))
+    return list(records.values())
+
+
+class ShardedRecords(MutableMapping):
+    """
+    The `data` mapping of a ShardedAddressBook: name -> Record.
+
+    `shards` holds one dict per shard, None until the shard is loaded;
+    `dirty` the numbers of the shards changed since they were saved.
+    """
+
+    def __init__(self, book, directory):
+        self.book = book
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST), "r") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != VERSION:
+            raise ValueError(f"Unsupported shard format version {manifest.get('version')} in {directory}.")
+        self.shards = [None] * manifest["shards"]
+        self.dirty = set()
+
+    def number(self, key):
+        return shard_number(key, len(self.shards))
+
+    def shard(self, number):
+        records = self.shards[number]
+        if records is None:
+            records = self.shards[number] = {}
+            try:
+                with metrics.io_timer("contacts.load") as size, open(
+                    shard_file(self.directory, number), "rb"
+                ) as f:
+                    size[0] = os.fstat(f.fileno()).st_size
+                    for fields in read_snapshot(f):
+                        records[fields[0]] = record_from_fields(fields)
+            except FileNotFoundError:
+                pass
+            self.book._index_records(records.values())
+        return records
+
+    def shard_of(self, name):
+        return self.shard(self.number(normalize_name(name)))
+
+    def is_loaded(self):
+        return None not in self.shards
+
+    def load_all(self):
+        for number in range(len(self.shards)):
+            self.shard(number)
+
+    def mark(self, name):
+        self.dirty.add(self.number(normalize_name(name)))
+
+    def __getitem__(self, name):
+        return self.shard_of(name)[name]
+
+    def __setitem__(self, name, record):
+        self.shard_of(name)[name] = record
+        self.mark(name)
+
+    def __delitem__(self, name):
+        del self.shard_of(name)[name]
+        self.mark(name)
+
+    def __contains__(self, name):
+        return name in self.shard_of(name)
+
+    def __iter__(self):
+        self.load_all()
+        for records in self.shards:
+            yield from list(records)
+
+    def __len__(self):
+        self.load_all()
+        return sum(len(records) for records in self.shards)
+
+    def save(self):
+        for number in sorted(self.dirty):
+            write_shard(shard_file(self.directory, number), self.shards[number].values())
+            self.dirty.discard(number)
+
+
+class ShardedNameIndex(dict):
+    # Normalized name -> Record of the loaded shards; a miss loads the shard
+    # the name belongs to, which adds its records
+    def __init__(self, records):
+        super().__init__()
+        self.records = records
+
+    def get(self, key, default=None):
+        if not dict.__contains__(self, key):
+            self.records.shard(self.records.number(key))
+        return dict.get(self, key, default)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+
+class ShardedBirthdayCalendar(BirthdayCalendar):
+    # Birthdays can be in any shard
+    def __init__(self, records):
+        super().__init__()
+        self.stored = records
+
+    def upcoming(self, today, days_ahead):
+        self.stored.load_all()
+        return super().upcoming(today, days_ahead)
+
+
+class ShardedAddressBook(AddressBook):
+    """An AddressBook split into shard files, loaded on first access and saved when changed."""
+
+    def __init__(self, directory):
+        super().__init__()
+        self.filename = directory
+        self.data = ShardedRecords(self, directory)
+        self.name_index = ShardedNameIndex(self.data)
+        self.birthday_calendar = ShardedBirthdayCalendar(self.data)
+
+    def record_changed(self, record):
+        self.data.mark(record.name.value)
+        super().record_changed(record)
+
+    def find_address(self, query):
+        record = super().find_address(query)
+        if record is None and (query.isdigit() or query.startswith("+")):
+            if not self.data.is_loaded():
+                # Phones are indexed for the loaded shards only
+                self.data.load_all()
+                record = super().find_address(query)
+        return record
+
+    def save_data(self, filename=None):
+        # Always writes back to the directory it was opened from
+        if not self.data.dirty:
+            return
+        try:
+            self.data.save()
+            self.dirty = False
+        except Exception as e:
+            print(Colorizer.error(f"Error while saving data: {e}"))
+
+
+def open_sharded_book(directory, sources=(), shard_count=DEFAULT_SHARDS):
+    """
+    Open a ShardedAddressBook. A new directory is filled from the first of
+    `sources` (snapshot or pickle files) that exists, or starts empty.
+    """
+    if not os.path.exists(os.path.join(directory, MANIFEST)):
+        for source in sources:
+            if os.path.exists(source):
+                count = write_shards(directory, source_fields(source), shard_count)
+                print(Colorizer.info(f"Migrated {count} contacts from {source} to {directory}."))
+                break
+        else:
+            write_shards(directory, (), shard_count)
+    return ShardedAddressBook(directory)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4):
+        print(
+            "Usage: python sharded_store.py <contact_book.snap | contact_book.pkl> "
+            "<contact_book.shards> [number_of_shards]"
+        )
+        sys.exit(1)
+    shards = int(sys.argv[3]) if len(sys.argv) == 4 else DEFAULT_SHARDS
+    migrated = write_shards(sys.argv[2], source_fields(sys.argv[1]), shards)
+    print(f"Migrated {migrated} contacts into {shards} shards in {sys.argv[2]}.")
@@ -0,0 +1,215 @@
+"""
+This module contains the contact book snapshot format, the file format of
+contact_book.snap, which replaces the pickled AddressBook.
+
+A snapshot holds plain values only, no class references, so loading one
+runs no code from the file and survives refactors of the contact classes.
+It is read and written as a stream, record by record, in large chunks.
+
+File layout (all integers little-endian):
+    header   MAGIC, uint16 format version
+    records  one per contact:
+               uint32 length of the rest of the record
+               uint8 flags, uint32 phone count, uint32 birthday ordinal
+               (0 for none), uint32 name, uint32 email and uint32 address
+               sizes in bytes
+               phones: uint64 per E.164 number without its "+", or with
+               TEXT_PHONES one uint32 size and the numbers joined by "\\n"
+               name, email and address, UTF-8
+    end      uint32 0, uint64 number of records
+
+Readers skip the bytes of a record past the fields they know, so a later
+version can append fields to a record without breaking older readers;
+anything else needs a new VERSION. Version 1 stored the phone count, the
+name and email sizes and the text phone size as uint16, which limited them
+to 65535; it is still read.
+
+Usage as a script converts an existing pickle file once:
+    python snapshot.py contact_book.pkl contact_book.snap
+"""
+
+import pickle
+import struct
+import sys
+
+MAGIC = b"CBSNAP\r\n"
+VERSION = 2
+HEADER = struct.Struct("<8sH")
+LENGTH = struct.Struct("<I")
+# flags, phone count, birthday ordinal, name size, email size, address size
+FIELDS = struct.Struct("<BIIIII")
+TEXT_SIZE = struct.Struct("<I")
+# FIELDS and TEXT_SIZE by format version
+RECORD_STRUCTS = {
+    1: (struct.Struct("<BHIHHI"), struct.Struct("<H")),
+    VERSION: (FIELDS, TEXT_SIZE),
+}
+TRAILER = struct.Struct("<Q")
+# Phones are stored as text when one of them is not "+" and up to 19 digits
+TEXT_PHONES = 1
+MAX_PHONE_DIGITS = 19  # fits in a uint64
+CHUNK_SIZE = 1 << 20
+# Packed phone lists by count; longer lists get their Struct on the fly
+PHONE_STRUCTS = [struct.Struct(f"<{count}Q") for count in range(8)]
+
+
+def _phone_struct(count):
+    return PHONE_STRUCTS[count] if count < len(PHONE_STRUCTS) else struct.Struct(f"<{count}Q")
+
+
+def _phone_number(phone):
+    digits = phone[1:]
+    if (
+        phone[:1] == "+"
+        and digits.isascii()
+        and digits.isdigit()
+        and digits[:1] != "0"  # would be lost in the integer
+        and len(digits) <= MAX_PHONE_DIGITS
+    ):
+        return int(digits)
+    return None
+
+
+def pack_record(fields):
+    """
+    Return the body of one record, without its length; `fields` is
+    (name, phones, birthday ordinal, email, address).
+    """
+    name, phones, ordinal, email, address = fields
+    name = name.encode()
+    email = (email or "").encode()
+    address = (address or "").encode()
+    numbers = [_phone_number(phone) for phone in phones]
+    if None in numbers:
+        flags = TEXT_PHONES
+        text = "\n".join(phones).encode()
+        packed_phones = TEXT_SIZE.pack(len(text)) + text
+    else:
+        flags = 0
+        packed_phones = _phone_struct(len(numbers)).pack(*numbers)
+    return b"".join(
+        (
+            FIELDS.pack(flags, len(phones), ordinal or 0, len(name), len(email), len(address)),
+            packed_phones,
+            name,
+            email,
+            address,
+        )
+    )
+
+
+def unpack_record(data, offset, version=VERSION):
+    """Return the fields of the record body starting at `offset` in `data`."""
+    fields, text_size = RECORD_STRUCTS[version]
+    flags, phone_count, ordinal, name_size, email_size, address_size = fields.unpack_from(data, offset)
+    offset += fields.size
+    if flags & TEXT_PHONES:
+        (size,) = text_size.unpack_from(data, offset)
+        offset += text_size.size
+        phones = data[offset : offset + size].decode().split("\n") if phone_count else []
+        offset += size
+    else:
+        phone_struct = _phone_struct(phone_count)
+        phones = ["+%d" % number for number in phone_struct.unpack_from(data, offset)]
+        offset += phone_struct.size
+    name = data[offset : offset + name_size].decode()
+    offset += name_size
+    email = data[offset : offset + email_size].decode() or None
+    offset += email_size
+    address = data[offset : offset + address_size].decode() or None
+    return name, phones, ordinal or None, email, address
+
+
+class SnapshotWriter:
+    """Streams records into a binary file object; close() writes the end marker."""
+
+    def __init__(self, file):
+        self.file = file
+        self.count = 0
+        self.buffer = bytearray(HEADER.pack(MAGIC, VERSION))
+
+    def add(self, fields):
+        body = pack_record(fields)
+        self.buffer += LENGTH.pack(len(body))
+        self.buffer += body
+        self.count += 1
+        if len(self.buffer) >= CHUNK_SIZE:
+            self.file.write(self.buffer)
+            self.buffer.clear()
+
+    def close(self):
+        self.buffer += LENGTH.pack(0) + TRAILER.pack(self.count)
+        self.file.write(self.buffer)
+        self.buffer.clear()
+
+
+class SnapshotReader:
+    """Iterates over the records of a binary file object, as field tuples."""
+
+    def __init__(self, file):
+        self.file = file
+        header = file.read(HEADER.size)
+        if len(header) < HEADER.size or header[: len(MAGIC)] != MAGIC:
+            raise ValueError("Not a contact book snapshot.")
+        _, version = HEADER.unpack(header)
+        if version not in RECORD_STRUCTS:
+            raise ValueError(f"Unsupported snapshot version {version}.")
+        self.version = version
+
+    def __iter__(self):
+        buffer = b""
+        offset = count = 0
+        while True:
+            available = len(buffer) - offset
+            if available >= LENGTH.size:
+                (length,) = LENGTH.unpack_from(buffer, offset)
+                if length == 0:
+                    needed = LENGTH.size + TRAILER.size
+                    if available >= needed:
+                        (expected,) = TRAILER.unpack_from(buffer, offset + LENGTH.size)
+                        if expected != count:
+                            raise ValueError(f"Snapshot lists {expected} records, found {count}.")
+                        return
+                else:
+                    needed = LENGTH.size + length
+                    if available >= needed:
+                        yield unpack_record(buffer, offset + LENGTH.size, self.version)
+                        offset += needed
+                        count += 1
+                        continue
+            else:
+                needed = LENGTH.size
+            # The next record is not complete: keep the rest, read more
+            chunk = self.file.read(max(CHUNK_SIZE, needed - available))
+            if not chunk:
+                raise ValueError("Snapshot is truncated.")
+            buffer = buffer[offset:] + chunk
+            offset = 0
+
+
+def write_snapshot(file, records):
+    """Write field tuples to a binary file object as a complete snapshot; returns their number."""
+    writer = SnapshotWriter(file)
+    for fields in records:
+        writer.add(fields)
+    writer.close()
+    return writer.count
+
+
+def read_snapshot(file):
+    """Iterate over the field tuples of the snapshot in a binary file object."""
+    return iter(SnapshotReader(file))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python snapshot.py <contact_book.pkl> <contact_book.snap>")
+        sys.exit(1)
+    from contact_book import record_fields
+    from persistence import atomic_write
+
+    with open(sys.argv[1], "rb") as f:
+        book = pickle.load(f)
+    with atomic_write(sys.argv[2], "wb") as f:
+        migrated = write_snapshot(f, map(record_fields, book.data.values()))
+    print(f"Migrated {migrated} contacts from {sys.argv[1]} to {sys.argv[2]}.")
@@ -0,0 +1,216 @@
+"""
+This module contains the SQLiteStorage class, a storage backend for the
+AddressBook built on the standard sqlite3 module.
+
+Every contact is stored as a row in the contacts table, with phones, emails,
+birthdays and addresses kept in their own indexed tables. When a backend is
+attached to an AddressBook, each Record mutation is saved as a row-level
+upsert of that one record instead of re-pickling the whole book.
+
+Usage as a script migrates an existing pickle file once:
+    python sqlite_storage.py contact_book.pkl contact_book.db
+"""
+
+import os
+import pickle
+import sqlite3
+import sys
+from colorizer import Colorizer
+from contact_book import AddressBook, Record
+from validators import normalize_name
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS contacts (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    name_key TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS contacts_name_key ON contacts(name_key);
+
+CREATE TABLE IF NOT EXISTS phones (
+    contact_id INTEGER NOT NULL REFERENCES contacts(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    number TEXT NOT NULL,
+    PRIMARY KEY (contact_id, position)
+);
+CREATE INDEX IF NOT EXISTS phones_number ON phones(number);
+
+CREATE TABLE IF NOT EXISTS emails (
+    contact_id INTEGER PRIMARY KEY REFERENCES contacts(id) ON DELETE CASCADE,
+    email TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS emails_email ON emails(email);
+
+CREATE TABLE IF NOT EXISTS birthdays (
+    contact_id INTEGER PRIMARY KEY REFERENCES contacts(id) ON DELETE CASCADE,
+    birthday TEXT NOT NULL,
+    month_day TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS birthdays_month_day ON birthdays(month_day);
+
+CREATE TABLE IF NOT EXISTS addresses (
+    contact_id INTEGER PRIMARY KEY REFERENCES contacts(id) ON DELETE CASCADE,
+    address TEXT NOT NULL
+);
+"""
+
+
+def _plain(field):
+    # Birthday and Email can be stored either as objects or as bare strings
+    if field is None:
+        return None
+    if hasattr(field, "email"):
+        return field.email
+    return getattr(field, "value", field)
+
+
+class SQLiteStorage:
+    def __init__(self, filename="contact_book.db"):
+        self.filename = filename
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def is_empty(self):
+        row = self.connection.execute("SELECT 1 FROM contacts LIMIT 1").fetchone()
+        return row is None
+
+    def _contact_id(self, name):
+        row = self.connection.execute(
+            "SELECT id FROM contacts WHERE name = ?", (name,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _write_record(self, record):
+        name = record.name.value
+        self.connection.execute(
+            "INSERT INTO contacts (name, name_key) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET name_key = excluded.name_key",
+            (name, normalize_name(name)),
+        )
+        contact_id = self._contact_id(name)
+
+        self.connection.execute(
+            "DELETE FROM phones WHERE contact_id = ?", (contact_id,)
+        )
+        self.connection.executemany(
+            "INSERT INTO phones (contact_id, position, number) VALUES (?, ?, ?)",
+            [
+                (contact_id, position, number)
+                for position, number in enumerate(record.phones or [])
+            ],
+        )
+
+        email = _plain(record.email)
+        if email:
+            self.connection.execute(
+                "INSERT INTO emails (contact_id, email) VALUES (?, ?) "
+                "ON CONFLICT(contact_id) DO UPDATE SET email = excluded.email",
+                (contact_id, email),
+            )
+        else:
+            self.connection.execute(
+                "DELETE FROM emails WHERE contact_id = ?", (contact_id,)
+            )
+
+        birthday = _plain(record.birthday)
+        if birthday:
+            self.connection.execute(
+                "INSERT INTO birthdays (contact_id, birthday, month_day) VALUES (?, ?, ?) "
+                "ON CONFLICT(contact_id) DO UPDATE SET "
+                "birthday = excluded.birthday, month_day = excluded.month_day",
+                (contact_id, birthday, birthday[3:5] + birthday[0:2]),
+            )
+        else:
+            self.connection.execute(
+                "DELETE FROM birthdays WHERE contact_id = ?", (contact_id,)
+            )
+
+        if record.address:
+            self.connection.execute(
+                "INSERT INTO addresses (contact_id, address) VALUES (?, ?) "
+                "ON CONFLICT(contact_id) DO UPDATE SET address = excluded.address",
+                (contact_id, record.address),
+            )
+        else:
+            self.connection.execute(
+                "DELETE FROM addresses WHERE contact_id = ?", (contact_id,)
+            )
+
+    def save_record(self, record):
+        with self.connection:
+            self._write_record(record)
+
+    def save_records(self, records):
+        with self.connection:
+            for record in records:
+                self._write_record(record)
+
+    def delete_record(self, name):
+        with self.connection:
+            self.connection.execute("DELETE FROM contacts WHERE name = ?", (name,))
+
+    def rename_record(self, old_name, new_name):
+        with self.connection:
+            self.connection.execute(
+                "UPDATE contacts SET name = ?, name_key = ? WHERE name = ?",
+                (new_name, normalize_name(new_name), old_name),
+            )
+
+    def load_book(self):
+        phones = {}
+        for contact_id, number in self.connection.execute(
+            "SELECT contact_id, number FROM phones ORDER BY contact_id, position"
+        ):
+            phones.setdefault(contact_id, []).append(number)
+
+        records = []
+        rows = self.connection.execute(
+            "SELECT contacts.id, contacts.name, birthdays.birthday, "
+            "emails.email, addresses.address FROM contacts "
+            "LEFT JOIN birthdays ON birthdays.contact_id = contacts.id "
+            "LEFT JOIN emails ON emails.contact_id = contacts.id "
+            "LEFT JOIN addresses ON addresses.contact_id = contacts.id "
+            "ORDER BY contacts.id"
+        )
+        for contact_id, name, birthday, email, address in rows:
+            records.append(Record(name, phones.get(contact_id), birthday, email, address))
+        book = AddressBook()
+        book.add_addresses(records)
+        book.backend = self
+        return book
+
+    def migrate_from_pickle(self, pickle_filename="contact_book.pkl"):
+        """Copy every record from a pickled AddressBook into the database."""
+        with open(pickle_filename, "rb") as f:
+            book = pickle.load(f)
+        records = book.data.values() if hasattr(book, "data") else book.values()
+        with self.connection:
+            for record in records:
+                self._write_record(record)
+        return len(records)
+
+
+def open_book(filename="contact_book.db", pickle_filename="contact_book.pkl"):
+    """Open an SQLite-backed AddressBook, migrating the pickle file on first use."""
+    storage = SQLiteStorage(filename)
+    if storage.is_empty() and pickle_filename and os.path.exists(pickle_filename):
+        count = storage.migrate_from_pickle(pickle_filename)
+        print(
+            Colorizer.info(
+                f"Migrated {count} contacts from {pickle_filename} to {filename}."
+            )
+        )
+    return storage.load_book()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python sqlite_storage.py <contact_book.pkl> <contact_book.db>")
+        sys.exit(1)
+    migrated = SQLiteStorage(sys.argv[2]).migrate_from_pickle(sys.argv[1])
+    print(Colorizer.success(f"Migrated {migrated} contacts to {sys.argv[2]}."))
@@ -1,34 +1,176 @@
-"""Module to store notes in JSON format"""
+"""Module to store notes in JSON format
+
+Notes are kept as a JSON snapshot (notes.json) plus an append-only journal
+(notes.journal). Every mutation becomes one JSON line in the journal, and
+lines are appended in batches, so a write costs O(changes) instead of
+rewriting the whole list. On startup the journal is replayed on top of the
+snapshot, and compaction folds the journal back into a fresh snapshot, which
+is always written atomically.
+
+Journal entries are numbered, and the snapshot records the number of the
+last entry it holds, so replaying a journal whose entries are already in
+the snapshot skips them: an add would otherwise create the note twice.
+Snapshots of older versions are plain lists of notes and hold entry 0.
+"""
 import json
+import os
+import sys
+import threading
 from notes import Note
 from colorama import Fore
+from persistence import atomic_write, journal_files, rotate_journal
+from metrics import metrics
 
 NOTES_FILE = "notes.json"
+JOURNAL_FILE = "notes.journal"
+# Number of journal entries after which the journal is folded into the snapshot
+COMPACT_THRESHOLD = 1000
+
+
+def note_to_dict(note):
+    return {"title": note.title, "content": note.content, "tags": note.tags}
 
 
 class Storage:
     @staticmethod
-    def save_notes(notes, filename=NOTES_FILE):
-        data = [
-            {"title": note.title, "content": note.content, "tags": note.tags}
-            for note in notes
-        ]
-        with open(filename, "w") as f:
-            json.dump(data, f, indent=4)
+    def save_notes(notes, filename=NOTES_FILE, seq=0):
+        data = {"seq": seq, "notes": [note_to_dict(note) for note in notes]}
+        Storage._write_snapshot(data, filename)
         # print(Fore.GREEN + "Note successfully stored.")
 
     @staticmethod
-    def load_notes(filename=NOTES_FILE):
+    def _write_snapshot(data, filename=NOTES_FILE):
+        with metrics.io_timer("notes.save") as size, atomic_write(filename, encoding="utf-8") as f:
+            json.dump(data, f, indent=4)
+            size[0] = f.tell()
+
+    @staticmethod
+    def load_notes(filename=NOTES_FILE, journal=None):
+        return Storage.load_state(filename, journal)[0]
+
+    @staticmethod
+    def load_state(filename=NOTES_FILE, journal=None):
+        """Return the notes and the number of the last journal entry applied to them."""
+        seq = 0
         try:
-            with open(filename, "r") as f:
+            with metrics.io_timer("notes.load") as size, open(filename, "r", encoding="utf-8") as f:
+                size[0] = os.fstat(f.fileno()).st_size
                 data = json.load(f)
-                # Перевірка ключів даних для відладки
-                print("Notes data loaded:", data)
+                if isinstance(data, dict):
+                    seq = data["seq"]
+                    data = data["notes"]
                 # Переконайтеся, що ключі 'title', 'content' і 'tags' існують
-                return [Note(**note_data) for note_data in data]
+                notes = [Note(**note_data) for note_data in data]
         except FileNotFoundError:
-            print(Fore.RED + "No JSON file with notes found. Creating a new file...")
-            return []
+            print(Fore.YELLOW + "No JSON file with notes found. Creating a new file...")
+            notes = []
         except TypeError as e:
             print(Fore.RED + f"JSON format error: {e}")
-            return []
+            notes = []
+
+        if journal:
+            for name in journal_files(journal):
+                notes, seq = Storage.replay_journal(notes, name, seq)
+        return notes, seq
+
+    @staticmethod
+    def append_journal(entries, journal=JOURNAL_FILE):
+        """Append a batch of entries with a single write and fsync."""
+        lines = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+        with metrics.io_timer("notes.journal") as size, open(journal, "a", encoding="utf-8") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+            size[0] = len(lines.encode())
+
+    @staticmethod
+    def journal_length(journal=JOURNAL_FILE):
+        try:
+            with open(journal, "r", encoding="utf-8") as f:
+                return sum(1 for _ in f)
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def replay_journal(notes, journal=JOURNAL_FILE, seq=0):
+        """
+        Apply the journal entries numbered after `seq` on top of the notes
+        list; return the result and the number of the last entry applied.
+        """
+        by_title = {}
+        for note in notes:
+            by_title.setdefault(note.title, []).append(note)
+        deleted = set()
+
+        try:
+            f = open(journal, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return notes, seq
+
+        with f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn last line means the process died mid-append
+                    print(Fore.RED + f"Skipping damaged journal line {line_number}.")
+                    continue
+
+                # Entries of older versions are not numbered
+                if "seq" in entry:
+                    if entry["seq"] <= seq:
+                        continue
+                    seq = entry["seq"]
+                op = entry.get("op")
+                if op == "add":
+                    note = Note(**entry["note"])
+                    notes.append(note)
+                    by_title.setdefault(note.title, []).append(note)
+                elif op == "edit":
+                    matches = by_title.get(entry["title"])
+                    if not matches:
+                        continue
+                    note = matches[0]
+                    setattr(note, entry["field"], entry["value"])
+                    if entry["field"] == "title":
+                        matches.pop(0)
+                        by_title.setdefault(note.title, []).append(note)
+                elif op == "delete":
+                    matches = by_title.get(entry["title"])
+                    if matches:
+                        deleted.add(id(matches.pop(0)))
+
+        if deleted:
+            notes = [note for note in notes if id(note) not in deleted]
+        return notes, seq
+
+    @staticmethod
+    def compact(notes, filename=NOTES_FILE, journal=JOURNAL_FILE, background=True, seq=0):
+        """
+        Fold the journal into a new snapshot.
+
+        The journal is rotated first, so mutations made while the snapshot is
+        being written go to a fresh journal and are never lost.
+        """
+        data = {"seq": seq, "notes": [note_to_dict(note) for note in notes]}
+        rotated = rotate_journal(journal)
+
+        def write():
+            try:
+                Storage._write_snapshot(data, filename)
+            except Exception as e:
+                # The rotated journal stays and is kept by the next compaction
+                print(Fore.RED + f"Error while compacting the notes journal: {e}", file=sys.stderr)
+                return
+            if os.path.exists(rotated):
+                os.remove(rotated)
+
+        if not background:
+            write()
+            return None
+        thread = threading.Thread(target=write, name="notes-compaction", daemon=True)
+        thread.start()
+        return thread
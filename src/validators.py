@@ -1,49 +1,124 @@
 """
-This module contains functions to validate and normalize phone numbers.
+This module contains functions to validate and normalize phone numbers,
+emails, birthdays and names. All patterns are compiled once here.
 
 Functions:
+    parse_phone(number): Normalize a phone number into a PhoneResult (cached).
     normalize_phone(number): Normalize a phone number.
+    normalize_phones(numbers): Normalize many phone numbers at once.
+    is_valid_email(email): Check the email format.
+    normalize_email(email): Build a case-insensitive lookup key for an email.
+    email_domain(email): The normalized domain of an email (or of a bare domain).
+    parse_birthday(value): Parse a DD.MM.YYYY date into a date ordinal.
+    is_valid_birthday(value): Check that a DD.MM.YYYY date exists.
+    normalize_name(name): Build a case-insensitive lookup key for a name.
 """
 
 
 
 import re
+import unicodedata
+from collections import namedtuple
+from datetime import date
+from functools import lru_cache
 
+PHONE_CLEANUP_PATTERN = re.compile(r"[^\d+]")
+# A bare argument that looks like a phone number (used to classify input)
+PHONE_ARGUMENT_PATTERN = re.compile(r"^\d{10,13}$")
+EMAIL_PATTERN = re.compile(r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$")
+BIRTHDAY_PATTERN = re.compile(r"^\d{2}\.\d{2}\.\d{4}$")
+# Same rules as strptime("%d.%m.%Y"), which also accepts 1.2.1990
+DATE_PATTERN = re.compile(r"^(\d{1,2})\.(\d{1,2})\.(\d{4})$")
 
-def normalize_phone(number):
-    # Replace all non-digit characters with "+"
-    number = re.sub(r"[^\d+]", "", number)
+# How many distinct raw phone strings parse_phone remembers
+PHONE_CACHE_SIZE = 16384
+
+# normalized is None and error holds the message when the number is invalid
+PhoneResult = namedtuple("PhoneResult", ["number", "normalized", "error"])
+
+
+def normalize_name(name):
+    # NFKC folds composed/decomposed forms (e.g. "й") to the same code points,
+    # casefold handles Cyrillic and other scripts where lower() is not enough
+    return unicodedata.normalize("NFKC", name.strip()).casefold()
+
+
+def _normalize(number):
+    # Remove everything except digits and "+"
+    number = PHONE_CLEANUP_PATTERN.sub("", number)
+    length = len(number)
 
-    if len(number) < 10:
+    if length < 10:
         return (
+            None,
             "Invalid phone number. The number must have not less than 10 digits: "
-            + number
+            + number,
         )
-    elif len(number) == 10 and number.isdigit():
-        return "+38" + number  # 10 numbers
-    elif len(number) == 11 and number.startswith("+0") and number[2:].isdigit():
-        return "+380" + number[2:]  # 10 numbers
-    elif len(number) == 10 and number.startswith("+") and number[1:].isdigit():
-        return "+380" + number[1:]  # 10 numbers
-    elif len(number) == 12 and number.isdigit():
-        return "+" + number  # 12 numbers without +
-    elif len(number) == 13 and number.startswith("+") and number[1:].isdigit():
-        return number  # + and  12 numbers
-    elif (
-        len(number) == 13
-        and number.startswith("+38")
-        and number[3:].isdigit()
-        and len(number[3:]) == 10
-    ):
-        return number  # +38 plus 10 numbers
-    elif (
-        len(number) == 12
-        and number.startswith("380")
-        and number[3:].isdigit()
-        and len(number[3:]) == 9
-    ):
-        return "+" + number  # 380 plus 9 numbers
-    elif len(number) == 11 and number.startswith("0") and number[1:].isdigit():
-        return "+38" + number[1:]  # + and 10 numbers, but the first number is 0
-    else:
-        return f"Invalid phone number: {number}. The number must have not less than 10 digits."
+    if number.startswith("+"):
+        digits_only = number[1:].isdigit()
+        if length == 10 and digits_only:
+            return "+380" + number[1:], None  # 10 numbers
+        if length == 11 and number.startswith("+0") and digits_only:
+            return "+380" + number[2:], None  # 10 numbers
+        if length == 13 and digits_only:
+            return number, None  # + and 12 numbers
+    elif number.isdigit():
+        if length == 10:
+            return "+38" + number, None  # 10 numbers
+        if length == 12:
+            return "+" + number, None  # 12 numbers without +
+        if length == 11 and number.startswith("0"):
+            return "+38" + number[1:], None  # + and 10 numbers, but the first number is 0
+    return (
+        None,
+        f"Invalid phone number: {number}. The number must have not less than 10 digits.",
+    )
+
+
+@lru_cache(maxsize=PHONE_CACHE_SIZE)
+def parse_phone(number):
+    normalized, error = _normalize(number)
+    return PhoneResult(number, normalized, error)
+
+
+def normalize_phone(number):
+    """Return the normalized number, or an error message starting with "Invalid"."""
+    result = parse_phone(number)
+    return result.normalized or result.error
+
+
+def normalize_phones(numbers):
+    """Return a list of PhoneResult, one per number, in the same order."""
+    return [parse_phone(number) for number in numbers]
+
+
+def is_valid_email(email):
+    return bool(EMAIL_PATTERN.match(email))
+
+
+def normalize_email(email):
+    return email.strip().casefold()
+
+
+def email_domain(email):
+    # "ann@example.com", "@example.com" and "example.com" all give "example.com"
+    return normalize_email(email).rpartition("@")[2]
+
+
+def parse_birthday(value):
+    """Return the date ordinal of a DD.MM.YYYY string; raise ValueError if invalid."""
+    match = DATE_PATTERN.match(value)
+    if not match:
+        raise ValueError(f"Invalid date: {value}")
+    day, month, year = match.groups()
+    return date(int(year), int(month), int(day)).toordinal()
+
+
+def is_valid_birthday(value):
+    if not BIRTHDAY_PATTERN.match(value):
+        return False
+    try:
+        parse_birthday(value)
+    except ValueError:
+        return False
+    return True
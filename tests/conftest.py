@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+# The modules in src/ import each other as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # The data files default to names relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,18 @@
+import pytest
+
+from contact_book import AddressBook, Record
+
+
+def test_add_number_rejects_an_invalid_number_and_adds_none():
+    book = AddressBook()
+    book.add_address(Record("Ann Lee", ["+380501112233"]))
+    record = book.find_address("Ann Lee")
+
+    with pytest.raises(ValueError, match="Invalid phone number: 12"):
+        record.add_number(["+380501112244", "12"])
+    assert record.phones.value == ["+380501112233"]
+    assert book.find_address("+380501112244") is None
+
+    record.add_number(["+380501112244", "0671112233"])
+    assert record.phones.value == ["+380501112233", "+380501112244", "+380671112233"]
+    assert book.find_address("+380671112233") is record
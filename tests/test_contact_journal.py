@@ -0,0 +1,174 @@
+import os
+import shutil
+import zlib
+
+import helper
+from contact_book import AddressBook, Record, record_fields
+from contact_journal import ENTRY, MAGIC, PUT, journal_file, replay
+from notes_manager import NotesManager
+from persistence import rotate_journal
+from snapshot import HEADER
+from test_snapshot import pack_version_1
+
+SNAPSHOT = "contact_book.snap"
+JOURNAL = journal_file(SNAPSHOT)
+ROTATED = JOURNAL + ".compacting"
+
+
+def new_book():
+    book = AddressBook()
+    book.add_address(Record("Ann Lee", ["+380501112233"]))
+    book.add_address(Record("Bob", ["+380671112233"]))
+    book.filename = SNAPSHOT
+    book.dirty = True
+    book.save_data()
+    return helper.load_data(SNAPSHOT)
+
+
+def contents(book):
+    return sorted(map(record_fields, book.data.values()))
+
+
+def test_changes_are_journaled_and_replayed(workdir):
+    book = new_book()
+    book.add_contact("Carol", ["+380931112233"])
+    book.delete_contact("Bob")
+    book.find_address("Ann Lee").add_number(["+380501112234"])
+    book.save_data()
+    assert os.path.getsize(JOURNAL) > 0
+
+    loaded = helper.load_data(SNAPSHOT)
+    assert contents(loaded) == contents(book)
+    assert loaded.find_address("Bob") is None
+
+
+def test_replay_is_idempotent(workdir):
+    book = new_book()
+    book.add_contact("Carol", ["+380931112233"])
+    book.delete_contact("Bob")
+    book.save_data()
+
+    once = {}
+    replay(once, JOURNAL)
+    twice = dict(once)
+    replay(twice, JOURNAL)
+    assert twice == once
+
+
+def test_torn_last_entry_is_dropped_and_truncated(workdir):
+    book = new_book()
+    book.add_contact("Carol", ["+380931112233"])
+    book.save_data()
+    valid_size = os.path.getsize(JOURNAL)
+    book.add_contact("Dave", ["+380441112233"])
+    book.save_data()
+    with open(JOURNAL, "r+b") as f:
+        f.truncate(os.path.getsize(JOURNAL) - 3)  # the process died mid-write
+
+    loaded = helper.load_data(SNAPSHOT)
+    assert loaded.find_address("Carol") is not None
+    assert loaded.find_address("Dave") is None
+    assert os.path.getsize(JOURNAL) == valid_size
+
+    # New entries follow the valid part, so they are not lost behind the torn one
+    loaded.add_contact("Eve", ["+380551112233"])
+    loaded.save_data()
+    assert helper.load_data(SNAPSHOT).find_address("Eve") is not None
+
+
+def test_crash_between_rotate_and_snapshot(workdir):
+    book = new_book()
+    book.add_contact("Carol", ["+380931112233"])
+    book.delete_contact("Bob")
+    book.save_data()
+    # compact() rotated the journal, then the process died; an mtime older
+    # than the snapshot's must not matter
+    os.replace(JOURNAL, ROTATED)
+    os.utime(ROTATED, (1, 1))
+
+    loaded = helper.load_data(SNAPSHOT)
+    assert contents(loaded) == contents(book)
+    assert not os.path.exists(ROTATED)
+    # The recovered changes are in the snapshot now
+    assert not os.path.exists(JOURNAL)
+    assert contents(helper.load_data(SNAPSHOT)) == contents(book)
+
+
+def test_crash_between_snapshot_and_removing_the_rotated_journal(workdir):
+    book = new_book()
+    book.add_contact("Carol", ["+380931112233"])
+    book.delete_contact("Bob")
+    book.save_data()
+    shutil.copy(JOURNAL, "saved.journal")
+    book.journal.compact(book.data.values(), background=False)
+    # The snapshot holds the changes already; replaying them again is harmless
+    shutil.copy("saved.journal", ROTATED)
+
+    loaded = helper.load_data(SNAPSHOT)
+    assert contents(loaded) == contents(book)
+    assert not os.path.exists(ROTATED)
+
+
+def test_rotation_keeps_a_leftover_rotated_journal(workdir):
+    book = new_book()
+    book.add_contact("Carol", ["+380931112233"])
+    book.save_data()
+    # A failed compaction left the rotated journal behind
+    os.replace(JOURNAL, ROTATED)
+    book.journal.size = 0
+    book.add_contact("Dave", ["+380441112233"])
+    book.save_data()
+
+    assert rotate_journal(JOURNAL, HEADER.size) == ROTATED
+    assert not os.path.exists(JOURNAL)
+    records = {}
+    replay(records, ROTATED)
+    assert {"Carol", "Dave"} <= set(records)
+
+
+def test_journal_of_version_1_is_folded(workdir):
+    new_book()
+    body = pack_version_1(("Carol", ["+380931112233"], None, None, None))
+    with open(JOURNAL, "wb") as f:
+        f.write(HEADER.pack(MAGIC, 1) + ENTRY.pack(PUT, len(body), zlib.crc32(body)) + body)
+
+    loaded = helper.load_data(SNAPSHOT)
+    assert loaded.find_address("Carol") is not None
+    assert not os.path.exists(JOURNAL)
+    loaded.add_contact("Dave", ["+380441112233"])
+    loaded.save_data()
+    reloaded = helper.load_data(SNAPSHOT)
+    assert reloaded.find_address("Carol") is not None
+    assert reloaded.find_address("Dave") is not None
+
+
+def test_a_contact_that_cannot_be_stored_does_not_block_the_others(workdir, capsys):
+    book = new_book()
+    book.add_contact("Bad", ["+380931112233"])
+    book.find_address("Bad").add_address("\ud800")  # cannot be encoded as UTF-8
+    assert "'Bad' cannot be saved" in capsys.readouterr().out
+    book.add_contact("Carol", ["+380441112233"])
+    book.save_data()
+
+    loaded = helper.load_data(SNAPSHOT)
+    assert loaded.find_address("Carol") is not None
+    assert loaded.find_address("Bad") is None
+
+
+def test_close_session_closes_the_notes_when_the_book_fails(workdir, monkeypatch):
+    book = new_book()
+    notes = helper.get_notes_manager()
+    notes.add_note("Shopping", "milk")
+
+    def fail():
+        raise OSError("disk full")
+
+    monkeypatch.setattr(book, "close", fail)
+    try:
+        helper.close_session(book)
+    except OSError:
+        pass
+    finally:
+        monkeypatch.setattr(helper, "notes_manager", None)
+    assert [note.title for note in NotesManager().notes] == ["Shopping"]
+    assert os.path.exists(notes.index_file)
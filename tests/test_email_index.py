@@ -0,0 +1,97 @@
+import pytest
+
+from contact_book import AddressBook, Email, Record, record_fields
+from record_store import open_record_store, write_store
+from sharded_store import open_sharded_book, write_shards
+
+
+def contacts():
+    return [
+        Record("Ann Lee", ["+380501112233"], email="Ann@Example.com"),
+        Record("Bob", ["+380671112233"], email="bob@example.com"),
+        Record("Carol", ["+380931112233"]),
+    ]
+
+
+def memory_book():
+    book = AddressBook()
+    book.add_addresses(contacts())
+    return book
+
+
+def lazy_book(new=True):
+    if new:
+        write_store("contact_book.rec", contacts())
+    return open_record_store("contact_book.rec", None)
+
+
+def sharded_book(new=True):
+    if new:
+        write_shards("contact_book.shards", map(record_fields, contacts()), 4)
+    return open_sharded_book("contact_book.shards")
+
+
+BOOKS = [memory_book, lazy_book, sharded_book]
+
+
+def names(records):
+    return [record.name.value for record in records]
+
+
+@pytest.fixture(params=BOOKS, ids=lambda factory: factory.__name__)
+def book(request, workdir):
+    book = request.param()
+    # The index is built by the first query, the changes below must update it
+    assert book.find_address("ann@example.com").name.value == "Ann Lee"
+    return book
+
+
+def test_lookups_ignore_case(book):
+    assert book.find_address(" ANN@example.COM").name.value == "Ann Lee"
+    assert names(book.find_by_domain("Example.com")) == ["Ann Lee", "Bob"]
+    assert book.find_by_domain("example.org") == []
+
+
+def test_add_email(book):
+    book.find_address("Carol").add_email("carol@example.org")
+    assert book.find_address("carol@example.org").name.value == "Carol"
+    assert names(book.find_by_domain("example.org")) == ["Carol"]
+
+
+def test_change_email(book):
+    book.find_address("Bob").change_email("bob@example.org")
+    assert book.find_address("bob@example.com") is None
+    assert book.find_address("bob@example.org").name.value == "Bob"
+    assert names(book.find_by_domain("example.com")) == ["Ann Lee"]
+    assert names(book.find_by_domain("example.org")) == ["Bob"]
+
+
+def test_remove_email(book):
+    assert Email.remove_email(book.find_address("Bob"))
+    assert book.find_address("bob@example.com") is None
+    assert names(book.find_by_domain("example.com")) == ["Ann Lee"]
+
+
+def test_rename(book):
+    book.change_name("Ann Lee", "Anna Lee")
+    assert book.find_address("ann@example.com").name.value == "Anna Lee"
+    assert names(book.find_by_domain("example.com")) == ["Anna Lee", "Bob"]
+
+
+def test_delete_and_add_contact(book):
+    book.delete_contact("Bob")
+    book.add_contact("Dave", ["+380441112233"], email="dave@example.com")
+    assert book.find_address("bob@example.com") is None
+    assert names(book.find_by_domain("example.com")) == ["Ann Lee", "Dave"]
+
+
+@pytest.mark.parametrize("factory", [lazy_book, sharded_book], ids=lambda factory: factory.__name__)
+def test_changes_are_found_after_a_reload(workdir, factory):
+    book = factory()
+    book.find_address("Bob").change_email("bob@example.org")
+    book.change_name("Ann Lee", "Anna Lee")
+    book.save_data()
+
+    reloaded = factory(new=False)
+    assert reloaded.find_address("bob@example.org").name.value == "Bob"
+    assert names(reloaded.find_by_domain("example.com")) == ["Anna Lee"]
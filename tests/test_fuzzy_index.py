@@ -0,0 +1,69 @@
+import pytest
+
+import fuzzy_index
+from fuzzy_index import TrigramIndex, fold
+
+
+@pytest.mark.parametrize("text", ["Олександр", "Oleksandr", "Ołeksandr", "OŁEKSANDR"])
+def test_fold(text):
+    assert fold(text) == "oleksandr"
+
+
+def search(index, fields, query, **kwargs):
+    return [key for key, _ in index.search(query, fields.get, **kwargs)]
+
+
+def test_ranking():
+    fields = {
+        "Олександр Петренко": ("Олександр Петренко", "Київ"),
+        "Oleh Petrov": ("Oleh Petrov", "Lviv"),
+        "Maria Shevchenko": ("Maria Shevchenko", "Odesa"),
+    }
+    index = TrigramIndex()
+    for key, value in fields.items():
+        index.add(key, value)
+
+    results = index.search("Olecsandr Petrenco", fields.get)
+    assert results[0][0] == "Олександр Петренко"
+    assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+    assert "Maria Shevchenko" not in [key for key, _ in results]
+    assert search(index, fields, "Shevcenko") == ["Maria Shevchenko"]
+
+
+def test_add_replace_and_remove_across_compaction(monkeypatch):
+    monkeypatch.setattr(fuzzy_index, "COMPACT_MIN", 2)
+    fields = {f"Contact {i}": (f"Contact {i}", f"Street {i}") for i in range(5)}
+    index = TrigramIndex()
+    for key, value in fields.items():
+        index.add(key, value)
+
+    # Replacing an entry leaves a dead slot; once dead slots outnumber the
+    # live ones _compact() drops them
+    fields["Contact 0"] = ("Contact 0", "Zelena")
+    index.add("Contact 0", fields["Contact 0"])
+    for key in ("Contact 1", "Contact 2"):
+        index.remove(key)
+        del fields[key]
+    assert index.dead == 3
+    index.remove("Contact 3")
+    del fields["Contact 3"]
+    assert index.dead == 0
+    assert len(index) == len(index.keys) == 2
+
+    assert search(index, fields, "Zelena") == ["Contact 0"]
+    assert search(index, fields, "Street") == ["Contact 4"]
+    assert "Contact 2" not in search(index, fields, "Contact 2")
+
+    index.add("Contact 5", ("Contact 5", "Zelena"))
+    fields["Contact 5"] = ("Contact 5", "Zelena")
+    assert search(index, fields, "Zelena") == ["Contact 0", "Contact 5"]
+    index.add("Contact 0", ("Contact 0", "Street 0"))
+    fields["Contact 0"] = ("Contact 0", "Street 0")
+    assert search(index, fields, "Zelena") == ["Contact 5"]
+
+def test_unchanged_fields_keep_their_slot():
+    index = TrigramIndex()
+    index.add("Ann", ("Ann", "Kyiv"))
+    index.add("Ann", ("Ann", "Kyiv"))
+    assert index.dead == 0
+    assert len(index.keys) == 1
@@ -0,0 +1,44 @@
+import pytest
+
+import helper
+from contact_book import AddressBook, Record
+
+
+@pytest.fixture
+def book(workdir, monkeypatch):
+    monkeypatch.setattr(helper, "notes_manager", None)
+    book = AddressBook()
+    book.add_address(Record("Ann Lee", ["+380501112233"], email="ann@example.com"))
+    return book
+
+
+@pytest.mark.parametrize(
+    "command, args",
+    [
+        ("show_all_notes", []),
+        ("find_note_by_tag", ["home"]),
+        ("search_notes", ["milk"]),
+        ("find_contact", ["Bob"]),
+        ("find_contact", ["--fuzzy", "Zzzzzz"]),
+        ("find_by_domain", ["example.org"]),
+    ],
+)
+def test_finding_nothing_is_not_an_error(book, command, args):
+    keep_going, status, output = helper.execute(book, command, args)
+    assert keep_going
+    assert status == "ok"
+    assert output.strip()
+
+
+@pytest.mark.parametrize(
+    "command, args",
+    [
+        ("del_contact", ["Bob"]),
+        ("add_contact", ["Bob", "12"]),
+        ("del_note", ["Shopping"]),
+        (None, []),
+    ],
+)
+def test_failed_commands_are_errors(book, command, args):
+    _, status, _ = helper.execute(book, command, args)
+    assert status == "error"
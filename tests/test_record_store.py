@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+from contact_book import Record, record_fields
+from record_store import HEADER, RecordStore, open_record_store, write_store
+
+STORE = "contact_book.rec"
+
+
+def contacts():
+    return [
+        Record("Ann Lee", ["+380501112233", "+380501112244"], "01.02.1990", "ann@example.com", "Kyiv"),
+        Record("Bob", ["+380671112233"]),
+        Record("Олена", ["+380931112233"], "15.08.1985", None, "Львів, вул. Зелена 1"),
+    ]
+
+
+def contents(book):
+    return sorted(map(record_fields, book.data.values()))
+
+
+def test_round_trip(workdir):
+    assert write_store(STORE, contacts()) == 3
+
+    book = open_record_store(STORE, None)
+    assert len(book) == 3
+    assert contents(book) == sorted(map(record_fields, contacts()))
+    assert book.find_address("олена").address == "Львів, вул. Зелена 1"
+    assert book.find_address("+380501112244").name.value == "Ann Lee"
+    assert book.find_address("Nobody") is None
+    store = RecordStore(STORE)
+    assert [store.read(number) for number in range(store.count)] == list(
+        map(record_fields, contacts())
+    )
+    store.close()
+
+
+def test_reload_after_rename_and_delete(workdir):
+    write_store(STORE, contacts())
+    book = open_record_store(STORE, None)
+    book.change_name("Ann Lee", "Anna Lee")
+    book.delete_contact("Bob")
+    book.add_contact("Carol", ["+380441112233"], "03.04.2000")
+    book.find_address("Олена").add_number(["+380501110000"])
+    expected = contents(book)
+    book.save_data()
+
+    reloaded = open_record_store(STORE, None)
+    assert contents(reloaded) == expected
+    assert reloaded.find_address("Ann Lee") is None
+    assert reloaded.find_address("Anna Lee").phones.value == ["+380501112233", "+380501112244"]
+    assert reloaded.find_address("Bob") is None
+    assert reloaded.find_address("+380671112233") is None
+    assert reloaded.find_address("+380501110000").name.value == "Олена"
+    assert not os.path.exists(STORE + ".tmp")
+
+
+def test_truncated_store_is_rejected(workdir):
+    write_store(STORE, contacts())
+    with open(STORE, "rb") as f:
+        data = f.read()
+    for size in (len(data) - 1, len(data) // 2, HEADER.size - 1, 0):
+        with open(STORE, "wb") as f:
+            f.write(data[:size])
+        with pytest.raises(ValueError):
+            RecordStore(STORE)
+
+
+def test_not_a_store(workdir):
+    with open(STORE, "wb") as f:
+        f.write(b"\x80\x04 a pickle".ljust(HEADER.size + 16, b"\x00"))
+    with pytest.raises(ValueError):
+        RecordStore(STORE)
@@ -0,0 +1,88 @@
+import os
+
+import helper
+from contact_book import AddressBook, Record, record_fields
+from sharded_store import (
+    ShardedAddressBook,
+    open_sharded_book,
+    shard_file,
+    shard_number,
+    write_shards,
+)
+from snapshot import read_snapshot
+from validators import normalize_name
+
+DIRECTORY = "contact_book.shards"
+SHARDS = 4
+
+
+def shard_of(name):
+    return shard_number(normalize_name(name), SHARDS)
+
+
+def new_book(count=40):
+    records = [(f"Contact {i}", [f"+38050{i:07d}"], None, None, None) for i in range(count)]
+    write_shards(DIRECTORY, records, SHARDS)
+    return ShardedAddressBook(DIRECTORY)
+
+
+def modified_times():
+    return {number: os.stat(shard_file(DIRECTORY, number)).st_mtime_ns for number in range(SHARDS)}
+
+
+def test_contacts_are_stored_in_the_shard_of_their_name(workdir):
+    new_book()
+    for number in range(SHARDS):
+        with open(shard_file(DIRECTORY, number), "rb") as f:
+            for fields in read_snapshot(f):
+                assert shard_of(fields[0]) == number
+
+
+def test_name_lookup_loads_one_shard(workdir):
+    book = new_book()
+    assert book.find_address("contact 7").name.value == "Contact 7"
+    assert sum(shard is not None for shard in book.data.shards) == 1
+
+
+def test_save_writes_only_the_changed_shard(workdir):
+    book = new_book()
+    before = modified_times()
+    record = book.find_address("Contact 7")
+    record.add_number(["+380931112233"])
+    book.save_data()
+
+    after = modified_times()
+    changed = [number for number in range(SHARDS) if after[number] != before[number]]
+    assert changed == [shard_of("Contact 7")]
+
+
+def test_rename_across_shards_survives_a_reload(workdir):
+    book = new_book()
+    new_name = next(
+        name for name in (f"Renamed {i}" for i in range(100)) if shard_of(name) != shard_of("Contact 7")
+    )
+    book.change_name("Contact 7", new_name)
+    book.save_data()
+
+    loaded = ShardedAddressBook(DIRECTORY)
+    assert loaded.find_address("Contact 7") is None
+    record = loaded.find_address(new_name)
+    assert record.name.value == new_name
+    assert list(record.phones) == ["+380500000007"]
+    assert loaded.find_address("+380500000007") is record
+    assert len(loaded) == 40
+
+
+def test_new_directory_takes_over_the_snapshot(workdir):
+    book = AddressBook()
+    book.add_address(Record("Ann Lee", ["+380501112233"]))
+    book.dirty = True
+    book.save_data("contact_book.snap")
+    journaled = helper.load_data("contact_book.snap")
+    journaled.add_contact("Bob", ["+380671112233"])
+    journaled.save_data()
+
+    sharded = open_sharded_book(DIRECTORY, ("contact_book.snap",), SHARDS)
+    assert sorted(map(record_fields, sharded.data.values())) == sorted(
+        map(record_fields, journaled.data.values())
+    )
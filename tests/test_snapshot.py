@@ -0,0 +1,135 @@
+import io
+import os
+
+import pytest
+
+import helper
+from contact_book import AddressBook, Record, record_fields
+from sharded_store import source_fields
+import struct
+
+from snapshot import (
+    HEADER,
+    LENGTH,
+    MAGIC,
+    RECORD_STRUCTS,
+    TEXT_PHONES,
+    TRAILER,
+    FIELDS,
+    read_snapshot,
+    write_snapshot,
+)
+
+RECORDS = [
+    ("Ann Lee", ["+380501112233", "+14155550100"], 738000, "ann@example.com", "Kyiv"),
+    ("Bob", [], None, None, None),
+    ("Олена", ["+380671112233"], None, "olena@приклад.укр", "Львів, вул. Зелена 1"),
+]
+
+
+def snapshot_bytes(records):
+    f = io.BytesIO()
+    write_snapshot(f, records)
+    return f.getvalue()
+
+
+def test_round_trip():
+    data = snapshot_bytes(RECORDS)
+    assert list(read_snapshot(io.BytesIO(data))) == RECORDS
+
+
+def test_empty_snapshot():
+    assert list(read_snapshot(io.BytesIO(snapshot_bytes([])))) == []
+
+
+@pytest.mark.parametrize(
+    "phones",
+    [
+        ["0501112233"],  # no "+"
+        ["+0501112233"],  # the leading zero would be lost in an integer
+        ["+12345678901234567890"],  # more digits than a uint64 holds
+        ["+380501112233", "ext. 12"],  # one odd number makes the whole list text
+    ],
+)
+def test_phones_that_are_not_integers_are_stored_as_text(phones):
+    data = snapshot_bytes([("Ann", phones, None, None, None)])
+    flags = FIELDS.unpack_from(data, HEADER.size + LENGTH.size)[0]
+    assert flags & TEXT_PHONES
+    assert list(read_snapshot(io.BytesIO(data))) == [("Ann", phones, None, None, None)]
+
+
+def test_fields_larger_than_64_kib():
+    # Version 1 stored these sizes as uint16
+    record = ("Я" * 40000, ["+380501112233"] * 70000, None, "a" * 70000 + "@example.com", None)
+    text = ("Ann", ["0" * 70000], None, None, None)
+    data = snapshot_bytes([record, text])
+    assert list(read_snapshot(io.BytesIO(data))) == [record, text]
+
+
+def pack_version_1(fields):
+    name, phones, ordinal, email, address = fields
+    name, email, address = name.encode(), (email or "").encode(), (address or "").encode()
+    record_fields, _ = RECORD_STRUCTS[1]
+    body = record_fields.pack(0, len(phones), ordinal or 0, len(name), len(email), len(address))
+    body += struct.pack(f"<{len(phones)}Q", *(int(phone[1:]) for phone in phones))
+    return body + name + email + address
+
+
+def test_version_1_is_still_read():
+    data = HEADER.pack(MAGIC, 1)
+    for fields in RECORDS:
+        body = pack_version_1(fields)
+        data += LENGTH.pack(len(body)) + body
+    data += LENGTH.pack(0) + TRAILER.pack(len(RECORDS))
+    assert list(read_snapshot(io.BytesIO(data))) == RECORDS
+
+
+def test_truncated_snapshot_is_rejected():
+    data = snapshot_bytes(RECORDS)
+    for size in (len(data) - 1, len(data) // 2, HEADER.size + 3):
+        with pytest.raises(ValueError):
+            list(read_snapshot(io.BytesIO(data[:size])))
+
+
+def test_not_a_snapshot():
+    with pytest.raises(ValueError):
+        list(read_snapshot(io.BytesIO(b"\x80\x04 a pickle")))
+
+
+def test_book_saves_and_loads_as_snapshot(workdir):
+    book = AddressBook()
+    book.add_address(Record("Ann Lee", ["+380501112233"], "01.02.1990", "ann@example.com", "Kyiv"))
+    book.add_address(Record("Bob", ["+380671112233"]))
+    book.dirty = True
+    book.save_data("contact_book.snap")
+
+    loaded = helper.load_data("contact_book.snap")
+    assert sorted(map(record_fields, loaded.data.values())) == sorted(
+        map(record_fields, book.data.values())
+    )
+    assert loaded.find_address("+380671112233").name.value == "Bob"
+    assert loaded.find_address("ann lee").birthday.value == "01.02.1990"
+
+
+def test_pickle_under_a_snapshot_name_is_not_unpickled(workdir, capsys):
+    book = AddressBook()
+    book.add_address(Record("Ann Lee", ["+380501112233"]))
+    book.dirty = True
+    book.save_data("contact_book.pkl")
+    os.replace("contact_book.pkl", "contact_book.snap")
+
+    assert helper.load_data("contact_book.snap", None) is None
+    assert "is not a contact book snapshot" in capsys.readouterr().out
+    with pytest.raises(ValueError):
+        source_fields("contact_book.snap")
+
+
+def test_pickle_file_is_still_read(workdir):
+    book = AddressBook()
+    book.add_address(Record("Ann Lee", ["+380501112233"]))
+    book.dirty = True
+    book.save_data("contact_book.pkl")
+
+    loaded = helper.load_data("contact_book.pkl", None)
+    assert list(map(record_fields, loaded.data.values())) == list(map(record_fields, book.data.values()))
+    assert source_fields("contact_book.pkl") == list(map(record_fields, book.data.values()))
@@ -0,0 +1,121 @@
+import json
+import os
+import shutil
+
+import notes_manager
+from notes_manager import NotesManager
+from storage import JOURNAL_FILE, NOTES_FILE, Storage
+
+ROTATED = JOURNAL_FILE + ".compacting"
+
+
+def titles(manager):
+    return [note.title for note in manager.notes]
+
+
+def test_changes_are_journaled_and_replayed(workdir):
+    manager = NotesManager()
+    manager.add_note("Shopping", "milk", ["home"])
+    manager.add_note("Work", "report")
+    manager.edit_note("Work", "title", "Office")
+    manager.add_note("Trip", "tickets")
+    manager.delete_note_by_title("Trip")
+    manager.flush()
+
+    loaded = NotesManager()
+    assert titles(loaded) == ["Shopping", "Office"]
+    assert loaded.notes[0].tags == ["home"]
+
+
+def test_torn_last_line_is_skipped(workdir):
+    manager = NotesManager()
+    manager.add_note("Shopping", "milk")
+    manager.flush()
+    with open(JOURNAL_FILE, "a", encoding="utf-8") as f:
+        f.write('{"seq": 2, "op": "add", "note": {"ti')  # the process died mid-append
+
+    assert titles(NotesManager()) == ["Shopping"]
+
+
+def test_compaction_folds_the_journal(workdir):
+    manager = NotesManager()
+    manager.add_note("Shopping", "milk")
+    manager.add_note("Нотатка", "зміст", ["тег"])
+    manager.compact(background=False)
+
+    assert not os.path.exists(JOURNAL_FILE)
+    assert titles(NotesManager()) == ["Shopping", "Нотатка"]
+
+
+def test_close_compacts_only_a_long_journal(workdir, monkeypatch):
+    manager = NotesManager()
+    manager.add_note("Shopping", "milk")
+    manager.close()
+    assert os.path.getsize(JOURNAL_FILE) > 0
+
+    monkeypatch.setattr(notes_manager, "COMPACT_THRESHOLD", 2)
+    manager = NotesManager()
+    manager.add_note("Work", "report")
+    manager.close()
+    assert not os.path.exists(JOURNAL_FILE)
+    assert titles(NotesManager()) == ["Shopping", "Work"]
+
+def test_crash_between_rotate_and_snapshot(workdir):
+    manager = NotesManager()
+    manager.add_note("Shopping", "milk")
+    manager.add_note("Work", "report")
+    manager.flush()
+    # compact() rotated the journal, then the process died
+    os.replace(JOURNAL_FILE, ROTATED)
+    os.utime(ROTATED, (1, 1))
+
+    loaded = NotesManager()
+    assert titles(loaded) == ["Shopping", "Work"]
+    assert not os.path.exists(ROTATED)
+    assert titles(NotesManager()) == ["Shopping", "Work"]
+
+
+def test_crash_between_snapshot_and_removing_the_rotated_journal(workdir):
+    manager = NotesManager()
+    manager.add_note("Shopping", "milk")
+    manager.add_note("Work", "report")
+    manager.edit_note("Work", "title", "Office")
+    manager.flush()
+    shutil.copy(JOURNAL_FILE, "saved.journal")
+    manager.compact(background=False)
+    # The snapshot holds these entries already: they must not be applied twice
+    shutil.copy("saved.journal", ROTATED)
+
+    loaded = NotesManager()
+    assert titles(loaded) == ["Shopping", "Office"]
+    assert not os.path.exists(ROTATED)
+
+
+def test_snapshot_of_an_older_version_is_a_plain_list(workdir):
+    with open(NOTES_FILE, "w", encoding="utf-8") as f:
+        json.dump([{"title": "Old", "content": "note", "tags": []}], f)
+    with open(JOURNAL_FILE, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"op": "add", "note": {"title": "Older", "content": "", "tags": []}}) + "\n")
+
+    notes, seq = Storage.load_state(NOTES_FILE, JOURNAL_FILE)
+    assert [note.title for note in notes] == ["Old", "Older"]
+    assert seq == 0
+
+
+def test_search_index_is_saved_only_when_it_changed(workdir):
+    manager = NotesManager()
+    manager.add_note("Shopping", "milk")
+    manager.close()
+    saved = os.path.getmtime(manager.index_file)
+    os.utime(manager.index_file, (saved - 10, saved - 10))
+
+    reopened = NotesManager()
+    assert not reopened.search_index.dirty
+    reopened.close()
+    assert os.path.getmtime(manager.index_file) == saved - 10
+
+    reopened = NotesManager()
+    reopened.add_note("Work", "report")
+    reopened.close()
+    assert [note.title for note, _ in NotesManager().search_index.search("report")] == ["Work"]
+    assert os.path.getmtime(manager.index_file) != saved - 10